@@ -0,0 +1,78 @@
+# Shared dedup through DedupDaemon: monitors racing on the same hashes and add throughput against local SQLite
+# Daemon runs in a thread of this process, racing monitors are separate processes with 8 worker threads each.
+# Usage: python -m benchmarks.dedup
+
+import hashlib
+import multiprocessing
+import threading
+import time
+
+from source import storage
+
+ADDRESS = '127.0.0.1:7711'
+MONITORS = 4
+THREADS = 8
+SHARED = 4000  # Hashes every monitor tries to announce
+ADDS = 20000  # Distinct hashes added for throughput
+
+
+def threads(func, *args) -> float:  # Runs func(thread index, *args) in THREADS threads, returns elapsed time
+    workers = [threading.Thread(target=func, args=(i, *args)) for i in range(THREADS)]
+    start = time.perf_counter()
+    for i in workers:
+        i.start()
+    for i in workers:
+        i.join()
+    return time.perf_counter() - start
+
+
+def monitor(results: multiprocessing.Queue) -> None:  # Announces all shared hashes, puts count it was first for
+    storage.cache = storage.cache._replace(backend='daemon', daemon=ADDRESS)
+    from source.cache import HashStorage, UniquenessError
+    lock = threading.Lock()
+    added = []
+
+    def announce(index: int) -> None:
+        for i in range(index, SHARED, THREADS):
+            try:
+                HashStorage.add_announced_item(hashlib.blake2s(str(i).encode()).digest())
+                with lock:
+                    added.append(i)
+            except UniquenessError:
+                pass
+
+    elapsed = threads(announce)
+    results.put((len(added), elapsed))
+
+
+def throughput(backend: str) -> float:  # Adds per second
+    storage.cache = storage.cache._replace(backend=backend, daemon=ADDRESS)
+    from source.cache import HashStorage
+    hashes = [hashlib.blake2s(f'{backend}-{i}'.encode()).digest() for i in range(ADDS)]
+
+    def add(index: int) -> None:
+        for i in hashes[index::THREADS]:
+            HashStorage.add_target(i)
+
+    return ADDS / threads(add)
+
+
+if __name__ == '__main__':
+    from source.cache import DedupDaemon
+    daemon = DedupDaemon(ADDRESS)
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+
+    queue_ = multiprocessing.Queue()
+    monitors = [multiprocessing.Process(target=monitor, args=(queue_,)) for _ in range(MONITORS)]
+    for i in monitors:
+        i.start()
+    results = [queue_.get() for _ in monitors]
+    for i in monitors:
+        i.join()
+    print(f'{MONITORS} monitors announced {SHARED} shared hashes: {sum(i[0] for i in results)} claimed in total, '
+          f'per monitor {", ".join(str(i[0]) for i in results)}')
+
+    for i in ('sqlite', 'daemon'):
+        print(f'{i:<8}{throughput(i):>8.0f} adds/s ({THREADS} threads)')
+    daemon.shutdown()
+    daemon.server_close()
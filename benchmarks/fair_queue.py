@@ -0,0 +1,61 @@
+# Per-script dispatch latency of CancellableQueue with and without fair mode
+# One big script (2000 targets) and one small script (20 targets) share overloaded target queue, reuse counters of
+# targets differ (as for targets created at different times), so priorities of one class are spread over 100 values.
+# Usage: python -m benchmarks.fair_queue
+
+import random
+
+from source import api
+from source import storage
+from source.library import CancellableQueue, PrioritizedItem
+
+TICKS = 3000
+INTERVAL = 100  # Ticks between executions of each target
+CAPACITY = 18  # Tasks executed per tick (arrivals are 20.2 per tick)
+SCRIPTS = {'big': 2000, 'small': 20}
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.
+
+
+def run(fair: bool, grouped: bool) -> dict:
+    storage.queues = storage.queues._replace(fair=fair)
+    random.seed(1)
+    targets = []
+    for script, count in SCRIPTS.items():
+        for i in range(count):
+            target = api.TInterval(f'{script}-{i}', script, i, INTERVAL)
+            target.reused = random.randint(0, 100)
+            targets.append((random.randrange(INTERVAL), target))
+
+    queue_ = CancellableQueue()
+    put = {}
+    latency = {i: [] for i in SCRIPTS}
+    for tick in range(TICKS):
+        for offset, target in targets:
+            if tick % INTERVAL == offset:
+                priority = storage.priority.TInterval[0] + target.reuse(storage.priority.TInterval[1])
+                queue_.put_nowait(PrioritizedItem(
+                    priority, target, 1., storage.priority.TInterval[0] if grouped else None
+                ))
+                put[id(target)] = tick
+        for _ in range(CAPACITY):
+            if queue_.empty():
+                break
+            target = queue_.get_nowait().content
+            latency[target.script].append(tick - put[id(target)])
+
+    return {k: (percentile(v, .5), percentile(v, .95), percentile(v, .99), len(v)) for k, v in latency.items()}
+
+
+if __name__ == '__main__':
+    print(f'{"mode":<26}{"script":<8}{"p50":>8}{"p95":>8}{"p99":>8}{"executed":>10}  (latency in ticks)')
+    for name, fair, grouped in (
+            ('fair off', False, False),
+            ('fair, tag by priority', True, False),
+            ('fair, tag by class group', True, True)
+    ):
+        for script, (p50, p95, p99, count) in run(fair, grouped).items():
+            print(f'{name:<26}{script:<8}{p50:>8.0f}{p95:>8.0f}{p99:>8.0f}{count:>10}')
@@ -0,0 +1,70 @@
+# HashStorage throughput in memory and WAL modes: check_target() over stored hashes with and without dump() running,
+# and mixed check + add load, for 1-8 worker threads. Cache files are kept in temporary directory.
+# Usage: python -m benchmarks.hash_storage
+
+import hashlib
+import tempfile
+import threading
+import time
+
+from source import storage
+from source.cache import HashStorage
+
+STORED = 200000
+CHECKS = 40000
+MIXED = 4000  # Targets checked and added (plus a missing one checked for each)
+WORKERS = (1, 2, 4, 8)
+
+
+def threads(workers: int, func, total: int) -> float:  # Splits range(total) between func(worker, range) calls
+    pool = [
+        threading.Thread(target=func, args=(i, range(total * i // workers, total * (i + 1) // workers)))
+        for i in range(workers)
+    ]
+    start = time.perf_counter()
+    for i in pool:
+        i.start()
+    for i in pool:
+        i.join()
+    return time.perf_counter() - start
+
+
+def run(wal: bool, path: str) -> None:
+    mode = 'wal' if wal else 'memory'
+    storage.cache = storage.cache._replace(path=path, wal=wal, filter=False)
+    HashStorage.load()
+    hashes = [hashlib.blake2s(str(i).encode()).digest() for i in range(STORED)]
+    HashStorage._write(lambda c: c.executemany('INSERT INTO Targets VALUES (?, ?)', ((i, time.time()) for i in hashes)))
+
+    def check(worker: int, part: range) -> None:
+        for i in part:
+            HashStorage.check_target(hashes[(worker * 7919 + i * 13) % STORED])
+
+    for dumping in (False, True):
+        for workers in WORKERS:
+            dump = threading.Thread(target=HashStorage.dump)
+            if dumping:
+                dump.start()
+            elapsed = threads(workers, check, CHECKS)
+            if dumping:
+                dump.join()
+            print(f'{mode:<8}{"check, dump" if dumping else "check":<13}{workers:>8}{CHECKS / elapsed:>10.0f}')
+
+    def mixed(worker: int, part: range) -> None:
+        for i in part:
+            target = hashlib.blake2s(f'new-{i}'.encode()).digest()
+            if HashStorage.check_target(target):
+                HashStorage.add_target(target)
+            HashStorage.check_target(hashlib.blake2s(f'missing-{i}'.encode()).digest())
+
+    for workers in WORKERS:
+        HashStorage.delete('Targets')
+        print(f'{mode:<8}{"check + add":<13}{workers:>8}{MIXED * 2 / threads(workers, mixed, MIXED):>10.0f}')
+    HashStorage.unload()
+
+
+if __name__ == '__main__':
+    print(f'{"mode":<8}{"load":<13}{"workers":>8}{"ops/s":>10}')
+    for wal in (False, True):
+        with tempfile.TemporaryDirectory() as path:
+            run(wal, path)
@@ -0,0 +1,44 @@
+# Hashing cost of one catalog run: targets hashed three times (insert, schedule index, TargetEnd), items at levels 3
+# and 4, both for objects which already exist (cached hashes are reused) and for fresh objects including construction.
+# Usage: python -m benchmarks.hashing
+
+import timeit
+
+from source import api
+
+TARGETS = 500
+ITEMS = 500
+REPEAT = 7
+
+
+def make() -> tuple:
+    targets = [
+        api.TInterval(f'n{i}', 'script', {'id': i, 'url': f'https://x/{i}', 'sku': [i, i + 1]}, 5.)
+        for i in range(TARGETS)
+    ]
+    items = [
+        api.IRelease(
+            f'https://x/{i}', 'c', f'name{i}', 'img', 'desc', api.Price(2, 10.), footer=[api.FooterItem('a', 'b')]
+        )
+        for i in range(ITEMS)
+    ]
+    return targets, items
+
+
+def run(targets: list, items: list) -> None:
+    for i in targets:
+        i.hash()
+        i.hash()
+        i.hash()
+    for i in items:
+        i.hash(3)
+        i.hash(4)
+
+
+if __name__ == '__main__':
+    existing = make()
+    repeated = min(timeit.repeat(lambda: run(*existing), number=50, repeat=REPEAT)) / 50
+    fresh = min(timeit.repeat(lambda: run(*make()), number=20, repeat=REPEAT)) / 20
+    print(f'{TARGETS} targets, {ITEMS} items per catalog run')
+    print(f'repeated hashing        {repeated * 1000:>7.2f} ms')
+    print(f'fresh objects           {fresh * 1000:>7.2f} ms (construction included)')
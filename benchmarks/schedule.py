@@ -0,0 +1,60 @@
+# Cost of one Pipe tick over Schedule: old scan of all keys (any()/loop/del slice) versus heap pop_due
+# Schedule holds N entries spread over an hour, a tick pops entries due since previous tick (none for idle tick).
+# Usage: python -m benchmarks.schedule
+
+import random
+import timeit
+
+from source.library import Schedule
+
+SIZES = (1000, 20000, 200000)
+DUE = 50  # Entries due on busy tick
+REPEAT = 7
+
+
+def scan_tick(schedule: dict, time_: float) -> list:  # Tick before heap: three walks over all keys
+    items = []
+    if any(k <= time_ for k in schedule):
+        items = [(k, v) for k, v in schedule.items() if k <= time_]
+        for i in [k for k in schedule if k <= time_]:
+            del schedule[i]
+    return items
+
+
+def measure(size: int, due: int, heap: bool) -> float:  # Microseconds per tick
+    random.seed(1)
+    times = [random.uniform(1000., 4600.) for _ in range(size)]
+
+    def setup():
+        if heap:
+            schedule = Schedule()
+            for i in times:
+                schedule[i] = object()
+        else:
+            schedule = {round(i, 7): object() for i in times}
+        # Busy tick pops `due` entries scheduled before all others
+        for i in range(due):
+            schedule[float(i)] = object()
+        return schedule
+
+    tick = (lambda schedule: schedule.pop_due(999.)) if heap else (lambda schedule: scan_tick(schedule, 999.))
+    if not due:  # Idle tick doesn't change schedule, so it's repeated on the same one
+        schedule = setup()
+        number = 10 if size > 10000 and not heap else 1000
+        return min(timeit.repeat(lambda: tick(schedule), number=number, repeat=REPEAT)) / number * 1e6
+
+    best = float('inf')
+    for _ in range(REPEAT):
+        schedule = setup()
+        start = timeit.default_timer()
+        items = tick(schedule)
+        best = min(best, timeit.default_timer() - start)
+        assert len(items) == due
+    return best * 1e6
+
+
+if __name__ == '__main__':
+    print(f'{"entries":>9}{"due":>6}{"scan, us":>12}{"heap, us":>12}')
+    for size in SIZES:
+        for due in (0, DUE):
+            print(f'{size:>9}{due:>6}{measure(size, due, False):>12.1f}{measure(size, due, True):>12.1f}')
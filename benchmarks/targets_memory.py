@@ -0,0 +1,38 @@
+# Memory per scheduled target measured by tracemalloc: target objects, their cached hashes and UniqueSchedule entries
+# (bytes per target, data string included).
+# Usage: python -m benchmarks.targets_memory
+
+import gc
+import time
+import tracemalloc
+
+from source import api
+from source.library import UniqueSchedule
+
+TARGETS = 100000
+
+
+if __name__ == '__main__':
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    targets = [api.RTInterval('restock-script', f'https://shop/item/{i}', 60.) for i in range(TARGETS)]
+    objects = tracemalloc.get_traced_memory()[0]
+    for i in targets:
+        i.hash()
+    hashes = tracemalloc.get_traced_memory()[0]
+    schedule = UniqueSchedule()
+    now = time.time()
+    for i, target in enumerate(targets):
+        schedule[now + i % 600] = target
+    scheduled = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f'{TARGETS} RTInterval targets, bytes per target:')
+    for name, size in (
+            ('objects', objects - start),
+            ('hash', hashes - objects),
+            ('schedule', scheduled - hashes),
+            ('total', scheduled - start)
+    ):
+        print(f'{name:<10}{size / TARGETS:>6.0f}')
@@ -5,7 +5,7 @@ from statistics import mean
 
 import ujson
 
-from . import storage, core, __version__
+from . import storage, cluster, core, __version__
 from .tools import ReportStorage
 
 
@@ -81,6 +81,212 @@ class Analytics:
         else:
             raise TypeError('id_ must be int')
 
+    @staticmethod
+    def _lateness(lateness: list) -> dict:
+        return {
+            'count': len(lateness),
+            'min': round(min(lateness), 6) if lateness else 0,
+            'avg': round(mean(lateness), 6) if lateness else 0,
+            'max': round(max(lateness), 6) if lateness else 0
+        }
+
+    @classmethod
+    def info_pipe(cls) -> dict:
+        with core.monitor.thread_manager.lock:
+            if pipe := core.monitor.thread_manager.pipe:
+                return {
+                    'state': pipe.state,
+                    'catalog_lateness': cls._lateness([i[1] for i in tuple(pipe.lateness[0])]),
+                    'target_lateness': cls._lateness([i[1] for i in tuple(pipe.lateness[1])]),
+                    'lane_lateness': cls._lateness([i[1] for i in tuple(pipe.lateness[2])]),
+                    'catalogs_deferred': pipe.deferred[0],
+                    'targets_deferred': pipe.deferred[1],
+                    'catalogs_shed': pipe.shed_count[0],
+                    'targets_shed': pipe.shed_count[1],
+                    'catalogs_limited': pipe.limited[0],
+                    'targets_limited': pipe.limited[1]
+                }
+            else:
+                return {}
+
+    @staticmethod
+    def info_lateness() -> dict:
+        with core.Resolver._histograms_lock:
+            return {k: {k2: v2.snapshot() for k2, v2 in v.items()} for k, v in core.Resolver.histograms.items()}
+
+    @staticmethod
+    def info_forecast(window: float = None, count: int = None) -> dict:
+        window = window or storage.analytics.forecast_window
+        count = count or storage.analytics.forecast_count
+        forecast = core.Resolver.forecast(window, count)
+        return {
+            'window': window,
+            'overdue': {k: v[0] for k, v in forecast.items()},
+            'windows': [
+                {
+                    'from': round(window * i, 3),
+                    'to': round(window * (i + 1), 3),
+                    'catalogs': forecast['catalogs'][i + 1],
+                    'targets': forecast['targets'][i + 1]
+                } for i in range(count)
+            ]
+        }
+
+    @staticmethod
+    def info_scaling() -> dict:
+        with core.monitor.thread_manager.lock:
+            manager = core.monitor.thread_manager
+            return {
+                'enabled': storage.thread_manager.autoscale,
+                'workers': {
+                    'count': len(manager.workers),
+                    'target': manager.workers_count,
+                    'min': storage.worker.min,
+                    'max': storage.worker.max
+                },
+                'catalog_workers': {
+                    'count': len(manager.catalog_workers),
+                    'target': manager.catalog_workers_count,
+                    'min': storage.catalog_worker.min,
+                    'max': storage.catalog_worker.max
+                },
+                'up': manager.scaled['up'],
+                'down': manager.scaled['down'],
+                'decisions': [
+                    {
+                        **i,
+                        'time': datetime.utcfromtimestamp(i['time']).strftime(storage.analytics.datetime_format)
+                        if storage.analytics.datetime else i['time']
+                    } for i in manager.scaling
+                ]
+            }
+
+    @staticmethod
+    def info_assist() -> dict:
+        with core.Worker.tasks_lock:
+            workers = core.Worker.tasks.copy()
+        with core.CatalogWorker.tasks_lock:
+            catalog_workers = core.CatalogWorker.tasks.copy()
+
+        return {
+            'workers': {
+                'enabled': storage.worker.assist,
+                'catalogs': workers[0],
+                'targets': workers[1],
+                'share': round(workers[0] / sum(workers), 3) if sum(workers) else 0
+            },
+            'catalog_workers': {
+                'enabled': storage.catalog_worker.assist,
+                'catalogs': catalog_workers[0],
+                'targets': catalog_workers[1],
+                'share': round(catalog_workers[1] / sum(catalog_workers), 3) if sum(catalog_workers) else 0
+            }
+        }
+
+    @staticmethod
+    def info_lane() -> dict:
+        with core.monitor.thread_manager.lock:
+            workers = list(core.monitor.thread_manager.lane_workers.values())
+        with core.LaneWorker.tasks_lock:
+            tasks = core.LaneWorker.tasks.copy()
+            borrowed = core.LaneWorker.borrowed
+            borrowing = core.LaneWorker.borrowing
+
+        return {
+            'enabled': storage.lane.enabled,
+            'queue': core.Resolver.lane_queue.qsize(),
+            'count': len(workers),
+            'speed': round(sum([i.speed for i in workers]), 3),
+            'catalogs': tasks[0],
+            'targets': tasks[1],
+            'borrowed': borrowed,
+            'borrowing': borrowing
+        }
+
+    @staticmethod
+    def info_engine() -> dict:
+        with core.monitor.thread_manager.lock:
+            if engine := core.monitor.thread_manager.engine:
+                return {
+                    'state': engine.state,
+                    'in_flight': engine.in_flight,
+                    'speed': engine.speed,
+                    'catalogs': engine.tasks[0],
+                    'targets': engine.tasks[1],
+                    'uptime': round(time.time() - engine.start_time, 3)
+                }
+            else:
+                return {}
+
+    @staticmethod
+    def info_limits() -> dict:
+        usage = core.Resolver.limiter.usage()
+        with core.script_manager.lock:
+            scripts = {k: (v['max-in-flight'], v['rate'], v['burst']) for k, v in core.script_manager.scripts.items()}
+
+        return {
+            i: {
+                'in_flight': usage[i][0] if i in usage else 0,
+                'tokens': round(usage[i][1], 3) if i in usage and usage[i][1] is not None else None,
+                'max_in_flight': scripts[i][0] if i in scripts else 0,
+                'rate': scripts[i][1] if i in scripts else 0.,
+                'burst': scripts[i][2] if i in scripts else 0
+            } for i in set(usage) | set(scripts)
+        }
+
+    @staticmethod
+    def info_retry() -> dict:
+        with core.Resolver._retry_lock:
+            return {
+                'failures': core.Resolver.failures.copy(),
+                'attempts': {k: len(v) for k, v in core.Resolver.attempts.items()},
+                'dead_letter': [
+                    {
+                        'time': datetime.utcfromtimestamp(i[0]).strftime(storage.analytics.datetime_format) if
+                        storage.analytics.datetime else i[0],
+                        'script': i[1].script,
+                        'target': str(i[1]),
+                        'reason': i[2]
+                    } for i in core.Resolver.dead_letter
+                ]
+            }
+
+    @staticmethod
+    def info_watchdog() -> dict:
+        with core.Resolver._watch_lock:
+            running = [(i[0], i[1], i[3]) for i in core.Resolver.running.values()]
+            hung = len(core.Resolver.abandoned)
+        return {
+            'enabled': storage.thread_manager.watchdog,
+            'deadline': storage.thread_manager.deadline,
+            'expired': core.Resolver.expired,
+            'replaced': core.monitor.thread_manager.replaced,
+            'hung': hung,  # Abandoned threads which are still executing their tasks
+            # Threads of AsyncEngine pool held by sync parsers after deadline, pool is replaced when they appear
+            'engine_hung': len(engine.hung) if (engine := core.monitor.thread_manager.engine) else 0,
+            'engine_replaced': engine.replaced if engine else 0,
+            'overdue': [
+                {
+                    'script': i[2].script,
+                    'task': str(i[2]),
+                    'elapsed': round(time.time() - i[0], 3)
+                } for i in running if 0 < i[1] < time.time() - i[0]
+            ]
+        }
+
+    @staticmethod
+    def info_cluster() -> dict:
+        with cluster.member.lock:
+            info = {
+                'enabled': storage.cluster.enabled,
+                'name': cluster.member.name,
+                'coordinator': bool(cluster.member.coordinator),
+                'epoch': cluster.member.epoch,
+                'members': list(cluster.member.members)
+            }
+        info['owned'] = [i['name'] for i in core.script_manager.index.index if cluster.member.owns(i['name'])]
+        return info
+
     @staticmethod
     def proxy(proxy: str) -> dict:
         with core.provider.lock:
@@ -130,6 +336,17 @@ class Analytics:
                 'parsers': core.script_manager.parsers.__len__(),
                 'event_executors': core.script_manager.event_handler.executors.__len__()
             },
+            'pipe': cls.info_pipe(),
+            'lateness': cls.info_lateness(),
+            'forecast': cls.info_forecast(),
+            'scaling': cls.info_scaling(),
+            'assist': cls.info_assist(),
+            'lane': cls.info_lane(),
+            'engine': cls.info_engine(),
+            'retry': cls.info_retry(),
+            'watchdog': cls.info_watchdog(),
+            'cluster': cls.info_cluster(),
+            'limits': cls.info_limits(),
             'workers': cls.info_workers(),
             'catalog_workers': cls.info_workers(),
             'system': {
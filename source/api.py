@@ -3,11 +3,11 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from time import time
 from types import GeneratorType
-from typing import TypeVar, List, Union, Dict, Generator, Optional
+from typing import TypeVar, List, Union, Dict, Generator, Optional, Any
 
 from . import codes
 from . import logger
-from .library import Interval, Scheduled, Smart, SubProvider, Keywords
+from .library import Interval, Scheduled, Smart, SubProvider, AsyncSubProvider, Keywords
 from .tools import ScriptStorage
 
 # Constants
@@ -48,6 +48,26 @@ SIZE_TYPES = {
 }
 
 
+# Functions
+
+
+def serialize(data: Any) -> bytes:
+    # Serialization of target data for hashes. Target hashes are kept by HashStorage (and dedup daemon) between
+    # restarts, so it must give the same bytes as before: str() for everything except str and bytes
+    if isinstance(data, bytes):
+        return data
+    elif isinstance(data, str):
+        return data.encode()
+    return str(data).encode()
+
+
+def _set_state(obj: Any, state: Any) -> None:  # Restores slots state, also accepts __dict__ state of old snapshots
+    for i in (state if isinstance(state, tuple) else (state,)):
+        if i:
+            for k, v in i.items():
+                setattr(obj, k, v)
+
+
 # Error classes
 
 
@@ -64,6 +84,7 @@ class EventsExecutorError(Exception):
 
 @dataclass
 class Catalog(ABC):
+    __slots__ = ()  # Leaf classes declare slots for all fields, so catalogs and targets have no __dict__
     script: str
 
     def __post_init__(self):
@@ -79,30 +100,42 @@ class Catalog(ABC):
         else:
             return False
 
-    def hash(self) -> bytes:
-        return hashlib.blake2s(self.script.encode()).digest()
+    def hash(self) -> bytes:  # Cached until script is replaced
+        if (cache := getattr(self, '_hash', None)) and cache[0] is self.script:
+            return cache[1]
+        hash_ = hashlib.blake2s(self.script.encode()).digest()
+        self._hash = (self.script, hash_)
+        return hash_
 
     def __hash__(self) -> int:
         return hash(self.hash())
 
+    __setstate__ = _set_state
+
 
 CatalogType = TypeVar('CatalogType', bound=Catalog)
 
 
 @dataclass
 class CInterval(Interval, Catalog):
+    __slots__ = ('script', 'interval', '_hash')
+
     def __eq__(self, other):
         return Catalog.__eq__(self, other)
 
 
 @dataclass
 class CScheduled(Scheduled, Catalog):
+    __slots__ = ('script', 'timestamp', '_hash')
+
     def __eq__(self, other):
         return Catalog.__eq__(self, other)
 
 
 @dataclass
 class CSmart(Smart, Catalog):
+    __slots__ = ('script', 'gen', 'expired', '_hash')
+
     def __eq__(self, other):
         return Catalog.__eq__(self, other)
 
@@ -112,10 +145,14 @@ class CSmart(Smart, Catalog):
 
 @dataclass
 class Target(ABC):
+    # Targets are plain slotted objects, not views of columnar store: parsers receive, mutate and return them and
+    # scripts subclass them, while interval/timestamp/reused are small or shared objects which columns barely shrink
+    __slots__ = ()
     name: str
     script: str
     data: Union[str, bytes, int, float, list, tuple, dict] = field(repr=False)
-    reused: int = field(init=False, compare=False, default=-1)
+    # Factories, as class attribute defaults of init=False fields are shadowed by slots and never set by __init__
+    reused: int = field(init=False, compare=False, default_factory=lambda: -1)
 
     def __post_init__(self):
         if not isinstance(self.name, str):
@@ -142,34 +179,43 @@ class Target(ABC):
                 self.reused += 1
         return self.reused
 
-    def hash(self) -> bytes:
-        return hashlib.blake2s(
-            self.name.encode() +
-            (self.data.encode() if isinstance(self.data, (str, bytes)) else str(self.data).encode()) +
-            self.script.encode()
-        ).digest()
+    def hash(self) -> bytes:  # Cached until one of fields is replaced (changes inside data are not tracked)
+        if (cache := getattr(self, '_hash', None)) and \
+                cache[0] is self.name and cache[1] is self.script and cache[2] is self.data:
+            return cache[3]
+        hash_ = hashlib.blake2s(self.name.encode() + serialize(self.data) + self.script.encode()).digest()
+        self._hash = (self.name, self.script, self.data, hash_)
+        return hash_
 
     def __hash__(self) -> int:
         return hash(self.hash())
 
+    __setstate__ = _set_state
+
 
 TargetType = TypeVar('TargetType', bound=Target)
 
 
 @dataclass
 class TInterval(Interval, Target):
+    __slots__ = ('name', 'script', 'data', 'reused', 'interval', '_hash')
+
     def __eq__(self, other):
         return Target.__eq__(self, other)
 
 
 @dataclass
 class TScheduled(Scheduled, Target):
+    __slots__ = ('name', 'script', 'data', 'reused', 'timestamp', '_hash')
+
     def __eq__(self, other):
         return Target.__eq__(self, other)
 
 
 @dataclass
 class TSmart(Smart, Target):
+    __slots__ = ('name', 'script', 'data', 'reused', 'gen', 'expired', '_hash')
+
     def __eq__(self, other):
         return Target.__eq__(self, other)
 
@@ -179,10 +225,11 @@ class TSmart(Smart, Target):
 
 @dataclass
 class RestockTarget(ABC):
+    __slots__ = ()
     script: str
     data: Union[str, bytes, int, float, list, tuple, dict] = field(repr=False)
-    item: int = field(init=False, default=-1)
-    reused: int = field(init=False, default=-1)
+    item: int = field(init=False, default_factory=lambda: -1)
+    reused: int = field(init=False, default_factory=lambda: -1)
 
     def __post_init__(self):
         if not isinstance(self.script, str):
@@ -207,34 +254,43 @@ class RestockTarget(ABC):
                 self.reused += 1
         return self.reused
 
-    def hash(self) -> bytes:
-        return hashlib.blake2s(
-            self.script.encode() +
-            (self.data.encode() if isinstance(self.data, (str, bytes)) else str(self.data).encode()) +
-            str(self.item).encode()
-        ).digest()
+    def hash(self) -> bytes:  # Cached until one of fields is replaced (changes inside data are not tracked)
+        if (cache := getattr(self, '_hash', None)) and \
+                cache[0] is self.script and cache[1] is self.data and cache[2] == self.item:
+            return cache[3]
+        hash_ = hashlib.blake2s(self.script.encode() + serialize(self.data) + str(self.item).encode()).digest()
+        self._hash = (self.script, self.data, self.item, hash_)
+        return hash_
 
     def __hash__(self):
         return hash(self.hash())
 
+    __setstate__ = _set_state
+
 
 RestockTargetType = TypeVar('RestockTargetType', bound=RestockTarget)
 
 
 @dataclass
 class RTInterval(Interval, RestockTarget):
+    __slots__ = ('script', 'data', 'item', 'reused', 'interval', '_hash')
+
     def __eq__(self, other):
         return RestockTarget.__eq__(self, other)
 
 
 @dataclass
 class RTScheduled(Scheduled, RestockTarget):
+    __slots__ = ('script', 'data', 'item', 'reused', 'timestamp', '_hash')
+
     def __eq__(self, other):
         return RestockTarget.__eq__(self, other)
 
 
 @dataclass
 class RTSmart(Smart, RestockTarget):
+    __slots__ = ('script', 'data', 'item', 'reused', 'gen', 'expired', '_hash')
+
     def __eq__(self, other):
         return RestockTarget.__eq__(self, other)
 
@@ -482,6 +538,25 @@ class Item(ABC):
     def __repr__(self):
         return f'Item({self.url=}, {self.channel=}, {self.name=})'
 
+    def hashes(self) -> List[bytes]:
+        # Hashes of all levels, computed in one pass and cached until one of fields is replaced (changes inside price
+        # and footer are not tracked)
+        key = (self.url, self.channel, self.name, self.image, self.description, self.price, self.footer)
+        if (cache := self.__dict__.get('_hashes')) and all(i is j for i, j in zip(cache[0], key)):
+            return cache[1]
+
+        hash_ = hashlib.blake2s(self.url.encode() + self.channel.encode())
+        hashes = [hash_.digest()]
+        for i in (self.name.encode(), self.image.encode(), self.description.encode(), self.price.hash()):
+            hash_.update(i)
+            hashes.append(hash_.digest())
+        for i in self.footer:
+            hash_.update(i.hash())
+        hashes.extend((hash_.digest(), hash_.digest()))
+
+        self.__dict__['_hashes'] = (key, hashes)
+        return hashes
+
     def hash(self, level: int = 2) -> bytes:
         if isinstance(level, int):
             if not 0 <= level <= 6:
@@ -489,20 +564,7 @@ class Item(ABC):
         else:
             raise TypeError('level must be int')
 
-        hash_ = hashlib.blake2s(self.url.encode() + self.channel.encode())
-
-        if level > 0:
-            hash_.update(self.name.encode())
-            if level > 1:
-                hash_.update(self.image.encode())
-                if level > 2:
-                    hash_.update(self.description.encode())
-                    if level > 3:
-                        hash_.update(self.price.hash())
-                        if level > 4:
-                            for i in self.footer:
-                                hash_.update(i.hash())
-        return hash_.digest()
+        return self.hashes()[level]
 
 
 ItemType = TypeVar('ItemType', bound=Item)
@@ -621,6 +683,28 @@ class Parser(ABC):  # Class to implement by scripts with parser
         raise NotImplementedError
 
 
+class AsyncParser(Parser):  # Parser which execute() is coroutine (executed by async engine)
+    provider: AsyncSubProvider
+
+    def __init__(
+            self,
+            name: str,
+            log: logger.Logger,
+            provider: AsyncSubProvider,
+            storage: ScriptStorage,
+            kw: Keywords
+    ):
+        super().__init__(name, log, provider, storage, kw)
+
+    @abstractmethod
+    async def execute(
+            self,
+            mode: int,
+            content: Union[CatalogType, TargetType]
+    ) -> List[Union[CatalogType, TargetType, ItemType, TargetEndType, MessageType]]:
+        raise NotImplementedError
+
+
 class EventsExecutor(ABC):
     name: str
     log: logger.Logger
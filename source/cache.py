@@ -4,16 +4,26 @@
 
 """
 
+import collections
+import contextlib
+import math
 import os
+import queue
+import socket
+import socketserver
 import sqlite3
+import sys
 import threading
 import time
-from typing import Optional
+from concurrent.futures import Future
+from typing import Optional, Dict, List, Tuple, Set, Iterable, Iterator, Callable, Any
 
 import ujson
 
+from . import codes
+from . import logger
 from . import storage
-from .api import Size, Sizes, Item, ItemType
+from .api import Size, Sizes, Item, ItemType, IAnnounce, IRestock
 from .tools import get_time, CacheStorage
 
 
@@ -31,11 +41,601 @@ def check() -> None:
         os.makedirs(storage.cache.path)
 
 
+def _address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class CountingBloomFilter:
+    """Counting Bloom filter of hashes (supports deletion)
+
+    Each counter takes one byte, saturated counters (255) are never decremented, so deletion can't cause false
+    negatives. Indexes are derived from hash itself (hashes are already uniformly distributed).
+    """
+    size: int
+    hashes: int
+    count: int
+    counters: bytearray
+
+    def __init__(self, size: int, hashes: int):
+        self.size = size
+        self.hashes = hashes
+        self.count = 0
+        self.counters = bytearray(size)
+
+    def _indexes(self, hash_: bytes) -> List[int]:
+        h1, h2 = int.from_bytes(hash_[:8], 'little'), int.from_bytes(hash_[8:16], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, hash_: bytes) -> None:
+        """Add hash
+
+        Args:
+            hash_: Hash
+
+        Returns:
+            None
+        """
+        for i in self._indexes(hash_):
+            if self.counters[i] < 255:
+                self.counters[i] += 1
+        self.count += 1
+
+    def remove(self, hash_: bytes) -> None:
+        """Remove hash (it must be added before)
+
+        Args:
+            hash_: Hash
+
+        Returns:
+            None
+        """
+        for i in self._indexes(hash_):
+            if 0 < self.counters[i] < 255:
+                self.counters[i] -= 1
+        self.count -= 1
+
+    def __contains__(self, hash_: bytes) -> bool:
+        return all(self.counters[i] for i in self._indexes(hash_))
+
+    def stats(self) -> dict:
+        """Get size, count of hashes, estimated false positive rate and memory usage of filter
+
+        Returns:
+            :obj:`dict`
+        """
+        return {
+            'size': self.size,
+            'hashes': self.hashes,
+            'count': self.count,
+            'fpr': round((1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes, 6),
+            'memory': self.counters.__sizeof__()
+        }
+
+
+class DedupDaemon(socketserver.ThreadingTCPServer):
+    """Shared storage of hashes with atomic check-and-add for several monitors
+
+    Protocol is line based, each request is ``<op> <kind> <hex hash>`` and each reply is ``1`` or ``0``. Clients can
+    pipeline requests, replies are sent in the same order. Ops:
+
+    * ``A`` - add hash, reply ``1`` if hash was added (was not seen before), otherwise ``0``
+    * ``C`` - check hash, reply ``1`` if hash not exists, otherwise ``0``
+    * ``D`` - delete hash, always reply ``1``
+
+    Kinds are ``t`` (targets), ``a`` (announced items) and ``i`` (items). Hashes expire after
+    ``storage.cache.target_time`` or ``storage.cache.item_time``.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    lock: threading.Lock
+    hashes: Dict[str, Dict[bytes, float]]
+    last_cleanup: float
+
+    def __init__(self, address: str):
+        super().__init__(_address(address), _DedupHandler)
+        self.lock = threading.Lock()
+        self.hashes = {'t': {}, 'a': {}, 'i': {}}
+        self.last_cleanup = time.time()
+
+    def cleanup(self) -> None:
+        """Delete expired hashes (at most once per minute)
+
+        Returns:
+            None
+        """
+        if time.time() - self.last_cleanup > 60:
+            self.last_cleanup = time.time()
+            for k, v in self.hashes.items():
+                expired = time.time() - (storage.cache.target_time if k == 't' else storage.cache.item_time)
+                for i in [k2 for k2, v2 in v.items() if v2 <= expired]:
+                    del v[i]
+
+    def execute(self, op: str, kind: str, hash_: bytes) -> bool:
+        """Execute one request
+
+        Args:
+            op: ``A``, ``C`` or ``D``
+            kind: ``t``, ``a`` or ``i``
+            hash_: Hash
+
+        Returns:
+            :obj:`bool`: Reply of request
+
+        Raises:
+            KeyError: If ``kind`` is unknown
+            ValueError: If ``op`` is unknown
+        """
+        with self.lock:
+            self.cleanup()
+            hashes = self.hashes[kind]
+            if op == 'A':
+                if hash_ in hashes:
+                    return False
+                hashes[hash_] = time.time()
+                return True
+            elif op == 'C':
+                return hash_ not in hashes
+            elif op == 'D':
+                hashes.pop(hash_, None)
+                return True
+            else:
+                raise ValueError(f'Unknown op ({op})')
+
+
+class _DedupHandler(socketserver.BaseRequestHandler):
+    server: DedupDaemon
+
+    def handle(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buffer = b''
+        while chunk := self.request.recv(65536):  # Replies to all received requests are sent at once
+            *lines, buffer = (buffer + chunk).split(b'\n')
+            replies = []
+            for i in lines:
+                try:
+                    op, kind, hash_ = i.split()
+                    replies.append(self.server.execute(op.decode(), kind.decode(), bytes.fromhex(hash_.decode())))
+                except (ValueError, KeyError):
+                    return  # Broken request, close connection
+            self.request.sendall(b''.join(b'1\n' if i else b'0\n' for i in replies))
+
+
+class DedupClient:
+    """Client of :class:`DedupDaemon`
+
+    Requests of all threads are sent through one connection in batches (up to ``storage.cache.daemon_batch``
+    requests per write) without waiting for replies of previous batch. Hashes confirmed by daemon are kept in
+    local LRU cache (``storage.cache.daemon_cache`` hashes) and are never requested again. While daemon is
+    unavailable, replies are decided by ``storage.cache.daemon_fail_open``, outage is logged once.
+    """
+    log: logger.Logger
+    lock: threading.Lock
+    requests: queue.Queue
+    cache: collections.OrderedDict
+    thread: Optional[threading.Thread]
+    failed: float  # Time of last connection error
+    down: bool  # Daemon is unavailable since last connection error
+
+    def __init__(self):
+        self.log = logger.Logger('DC')
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.cache = collections.OrderedDict()
+        self.thread = None
+        self.failed = 0.
+        self.down = False
+
+    def _cached(self, kind: str, hash_: bytes) -> bool:
+        with self.lock:
+            if (kind, hash_) in self.cache:
+                self.cache.move_to_end((kind, hash_))
+                return True
+            return False
+
+    def _confirm(self, kind: str, hash_: bytes) -> None:
+        with self.lock:
+            self.cache[(kind, hash_)] = None
+            self.cache.move_to_end((kind, hash_))
+            while len(self.cache) > storage.cache.daemon_cache:
+                self.cache.popitem(False)
+
+    def _run(self) -> None:
+        connection: Optional[socket.socket] = None
+        while True:
+            batch: List[Tuple[bytes, Future]] = [self.requests.get()]
+            while len(batch) < storage.cache.daemon_batch:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if connection is None:
+                    connection = socket.create_connection(
+                        _address(storage.cache.daemon), storage.cache.daemon_timeout)
+                    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    reader = connection.makefile('rb')
+                connection.sendall(b''.join(i[0] for i in batch))
+                for i in batch:
+                    if not (reply := reader.readline()):
+                        raise ConnectionError('Connection closed by daemon')
+                    i[1].set_result(reply == b'1\n')
+                if self.down:
+                    self.down = False
+                    self.log.info(codes.Code(21901))
+            except OSError as e:
+                self.failed = time.time()
+                if not self.down:
+                    self.down = True
+                    mode = 'local dedup only' if storage.cache.daemon_fail_open else 'nothing is announced'
+                    self.log.warn(codes.Code(31901, f'{e.__class__.__name__}: {e!s} ({mode})'))
+                if connection:
+                    connection.close()
+                connection = None
+                for i in batch:
+                    if not i[1].done():
+                        i[1].set_exception(e)
+
+    def request(self, op: str, kind: str, hashes: List[bytes]) -> List[Optional[bool]]:
+        """Send requests to daemon (all at once) and wait for replies
+
+        Args:
+            op: ``A``, ``C`` or ``D``
+            kind: ``t``, ``a`` or ``i``
+            hashes: Hashes
+
+        Returns:
+            :obj:`list` of :obj:`bool`: Replies of daemon or ``None`` for each hash if daemon is unavailable
+        """
+        if time.time() - self.failed < storage.cache.daemon_timeout:  # Don't wait for broken daemon on every request
+            return [None] * len(hashes)
+
+        with self.lock:
+            if not self.thread:
+                self.thread = threading.Thread(target=self._run, name='DC', daemon=True)
+                self.thread.start()
+
+        futures = []
+        for i in hashes:
+            futures.append(Future())
+            self.requests.put((f'{op} {kind} {i.hex()}\n'.encode(), futures[-1]))
+
+        replies = []
+        for i in futures:
+            try:
+                replies.append(i.result())
+            except OSError:
+                replies.append(None)
+        return replies
+
+    def add(self, kind: str, hashes: List[bytes]) -> List[bool]:
+        """Atomic check-and-add of hashes
+
+        Args:
+            kind: ``t``, ``a`` or ``i``
+            hashes: Hashes
+
+        Returns:
+            :obj:`list` of :obj:`bool`: ``True`` if hash was added, ``False`` if hash already exists (if daemon is
+            unavailable ``storage.cache.daemon_fail_open``)
+        """
+        added = [not self._cached(kind, i) for i in hashes]
+        replies = iter(self.request('A', kind, [i for i, j in zip(hashes, added) if j]))
+        for n, i in enumerate(hashes):
+            if added[n]:
+                if (reply := next(replies)) is not None:
+                    self._confirm(kind, i)
+                added[n] = storage.cache.daemon_fail_open if reply is None else reply
+        return added
+
+    def check(self, kind: str, hashes: List[bytes]) -> List[bool]:
+        """Check hashes
+
+        Args:
+            kind: ``t``, ``a`` or ``i``
+            hashes: Hashes
+
+        Returns:
+            :obj:`list` of :obj:`bool`: ``True`` if hash not exists, otherwise ``False`` (if daemon is unavailable
+            ``storage.cache.daemon_fail_open``)
+        """
+        new = [not self._cached(kind, i) for i in hashes]
+        replies = iter(self.request('C', kind, [i for i, j in zip(hashes, new) if j]))
+        for n, i in enumerate(hashes):
+            if new[n]:
+                if (reply := next(replies)) is False:
+                    self._confirm(kind, i)
+                new[n] = storage.cache.daemon_fail_open if reply is None else reply
+        return new
+
+    def delete(self, kind: str, hashes: List[bytes]) -> None:
+        """Delete hashes
+
+        Args:
+            kind: ``t``, ``a`` or ``i``
+            hashes: Hashes
+
+        Returns:
+            None
+        """
+        with self.lock:
+            for i in hashes:
+                self.cache.pop((kind, i), None)
+        self.request('D', kind, hashes)
+
+
+class HashWriter:
+    """Single writer of file-backed hash database (WAL mode)
+
+    Writes of all threads are executed by one thread in batches, up to ``storage.cache.wal_batch`` writes per
+    transaction. Each write has its own savepoint, so failed write doesn't roll back other writes of batch.
+    """
+    path: str
+    connection: sqlite3.Connection
+    lock: threading.Lock
+    requests: queue.Queue
+    stopped: bool  # Set by stop(), no writes are queued after stop request
+    thread: threading.Thread
+    batches: int  # Committed transactions
+    writes: int  # Executed writes
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, 10, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')  # Only last commits can be lost on power failure
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.stopped = False
+        self.batches = 0
+        self.writes = 0
+        self.thread = threading.Thread(target=self._run, name='HW', daemon=True)
+        self.thread.start()
+
+    def _execute(self, batch: List[Tuple[Optional[Callable], bool, Future]]) -> None:
+        c, results = self.connection, []
+        try:
+            if batch[0][1]:
+                c.execute('BEGIN IMMEDIATE')
+            for func, transaction, future in batch:
+                if transaction:
+                    c.execute('SAVEPOINT write')
+                try:
+                    results.append((future, func(c), None))
+                    if transaction:
+                        c.execute('RELEASE write')
+                except Exception as e:
+                    if transaction:
+                        c.execute('ROLLBACK TO write')
+                        c.execute('RELEASE write')
+                    results.append((future, None, e))
+            if batch[0][1]:
+                c.execute('COMMIT')
+                self.batches += 1
+        except sqlite3.Error as e:  # Transaction failed, none of writes is saved
+            if c.in_transaction:
+                c.execute('ROLLBACK')
+            results = [(i[2], None, e) for i in batch]
+
+        self.writes += len(batch)
+        for future, result, e in results:
+            if e is None:
+                future.set_result(result)
+            else:
+                future.set_exception(e)
+
+    def _run(self) -> None:
+        next_ = None
+        while True:
+            batch = [next_ or self.requests.get()]
+            next_ = None
+            while batch[0][1] and len(batch) < storage.cache.wal_batch:  # Writes outside transaction are executed alone
+                try:
+                    write = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if write[1]:
+                    batch.append(write)
+                else:
+                    next_ = write
+                    break
+
+            if batch[0][0] is None:  # Stop
+                break
+            self._execute(batch)
+
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.connection.close()
+        batch[0][2].set_result(None)
+
+    def execute(self, func: Callable[[sqlite3.Connection], Any], transaction: bool = True) -> Any:
+        """Execute write by writer thread and wait for it
+
+        Args:
+            func: Function which gets writer connection
+            transaction: Optional bool, defaults to ``True``. If ``False`` write will be executed outside of
+                transaction (for ``VACUUM``)
+
+        Returns:
+            Result of ``func`` (exception raised by ``func`` is raised again)
+
+        Raises:
+            sqlite3.ProgrammingError: If writer is stopped
+        """
+        future = Future()
+        with self.lock:
+            if self.stopped:
+                raise sqlite3.ProgrammingError('Writer is stopped')
+            self.requests.put((func, transaction, future))
+        return future.result()
+
+    def stop(self) -> None:
+        """Execute queued writes, checkpoint WAL to database file and close connection
+
+        Returns:
+            None
+        """
+        future = Future()
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.requests.put((None, False, future))
+        future.result()
+        self.thread.join()
+
+
 class HashStorage:
     __db: sqlite3.Connection = sqlite3.connect(':memory:', 1, check_same_thread=False)
     __db.execute('PRAGMA foreign_keys = ON')
 
     _lock: threading.Lock = threading.RLock()
+    _writer: Optional[HashWriter] = None  # Writer of WAL mode, reads are made by connections of threads without lock
+    _readers: threading.local = threading.local()
+    _epoch: int = 0  # Incremented on each change of database, so threads reopen their connections
+    _dedup: DedupClient = DedupClient()
+    _filters: Dict[str, CountingBloomFilter] = {}  # By table (Targets, AnnouncedItems and Items)
+    _skipped: int = 0  # Checks answered by filters without query
+
+    @staticmethod
+    def _schema(c: sqlite3.Connection) -> None:
+        for i in (
+                'CREATE TABLE IF NOT EXISTS Targets (hash BLOB NOT NULL PRIMARY KEY, time REAL NOT NULL)',
+                'CREATE TABLE IF NOT EXISTS AnnouncedItems (hash BLOB NOT NULL PRIMARY KEY, time REAL NOT NULL)',
+                'CREATE TABLE IF NOT EXISTS Items (id INTEGER PRIMARY KEY, hash BLOB NOT NULL UNIQUE , '
+                'time REAL NOT NULL)',
+                'CREATE TABLE IF NOT EXISTS RestockItems (id INTEGER PRIMARY KEY REFERENCES Items(id) '
+                'ON DELETE CASCADE)',
+                'CREATE TABLE IF NOT EXISTS Sizes (item INTEGER PRIMARY KEY NOT NULL REFERENCES RestockItems(id) '
+                'ON DELETE CASCADE, type INTEGER NOT NULL, list TEXT NOT NULL)'
+        ):
+            c.execute(i)
+
+    @classmethod
+    @contextlib.contextmanager
+    def _read(cls) -> Iterator[sqlite3.Connection]:
+        """Get connection for reading (connection of current thread in WAL mode, otherwise locked shared connection)
+
+        Returns:
+            :obj:`sqlite3.Connection`
+        """
+        if writer := cls._writer:
+            if getattr(cls._readers, 'epoch', None) != cls._epoch:
+                cls._readers.connection = sqlite3.connect(writer.path, 10, check_same_thread=False)
+                cls._readers.connection.execute('PRAGMA query_only = ON')
+                cls._readers.epoch = cls._epoch
+            yield cls._readers.connection
+        else:
+            with cls._lock, cls.__db as c:
+                cls._schema(c)
+                yield c
+
+    @classmethod
+    def _write(cls, func: Callable[[sqlite3.Connection], Any], transaction: bool = True) -> Any:
+        """Execute write (by writer in WAL mode, otherwise by locked shared connection)
+
+        Args:
+            func: Function which gets connection
+            transaction: Optional bool, defaults to ``True``. If ``False`` write will be executed outside of
+                transaction (WAL mode only)
+
+        Returns:
+            Result of ``func``
+        """
+        if writer := cls._writer:
+            return writer.execute(func, transaction)
+        else:
+            with cls._lock, cls.__db as c:
+                cls._schema(c)
+                return func(c)
+
+    @classmethod
+    def _rebuild(cls) -> None:
+        """Rebuild filters from tables
+
+        Returns:
+            None
+        """
+        def rebuild(c: sqlite3.Connection) -> None:
+            filters = {}  # Checks run without lock, so filters are replaced only when all of them are filled
+            if storage.cache.filter:
+                for i in ('Targets', 'AnnouncedItems', 'Items'):
+                    filters[i] = CountingBloomFilter(storage.cache.filter_size, storage.cache.filter_hashes)
+                    for j in c.execute(f'SELECT hash FROM {i}'):
+                        filters[i].add(j[0])
+            cls._filters = filters
+
+        cls._write(rebuild)
+
+    @classmethod
+    def _maybe(cls, table: str, hash_: bytes) -> bool:
+        """Check hash by filter of table
+
+        Args:
+            table: Table name
+            hash_: Hash
+
+        Returns:
+            :obj:`bool`: ``False`` if hash definitely not in table, otherwise ``True``
+        """
+        if (filter_ := cls._filters.get(table)) is None or hash_ in filter_:
+            return True
+        cls._skipped += 1
+        return False
+
+    @classmethod
+    def _added(cls, table: str, hash_: bytes) -> None:
+        if table in cls._filters:
+            cls._filters[table].add(hash_)
+
+    @staticmethod
+    def _removed(filters: Dict[str, CountingBloomFilter], table: str, hashes: Iterable[bytes]) -> None:
+        """Remove deleted hashes from filters
+
+        Note:
+            Must be called only after delete is committed, otherwise rolled back delete leaves hashes in table which
+            filter reports as missing. ``filters`` must be taken by write which deleted hashes (filters could be
+            rebuilt after it)
+
+        Args:
+            filters: Filters at the time of delete
+            table: Table name
+            hashes: Deleted hashes
+
+        Returns:
+            None
+        """
+        if table in filters:
+            for i in hashes:
+                filters[table].remove(i)
+
+    @classmethod
+    def _shared(cls) -> Optional[DedupClient]:
+        return cls._dedup if storage.cache.backend == 'daemon' else None
+
+    @staticmethod
+    def _select(c: sqlite3.Connection, table: str, column: str, values: Iterable) -> set:
+        """Get values which exist in column of table (one query per 512 values)
+
+        Args:
+            c: Connection
+            table: Table name
+            column: Column name
+            values: Values to check
+
+        Returns:
+            :obj:`set`: Found values
+        """
+        values, found = list(values), set()
+        for i in range(0, len(values), 512):
+            found.update(j[0] for j in c.execute(
+                f'SELECT {column} FROM {table} WHERE {column} IN ({",".join("?" * len(values[i:i + 512]))})',
+                values[i:i + 512]
+            ))
+        return found
 
     @classmethod
     def check(cls) -> None:
@@ -44,13 +644,7 @@ class HashStorage:
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
-            c.executescript('''CREATE TABLE IF NOT EXISTS Targets (hash BLOB NOT NULL PRIMARY KEY, time REAL NOT NULL);
-CREATE TABLE IF NOT EXISTS AnnouncedItems (hash BLOB NOT NULL PRIMARY KEY, time REAL NOT NULL);
-CREATE TABLE IF NOT EXISTS Items (id INTEGER PRIMARY KEY, hash BLOB NOT NULL UNIQUE , time REAL NOT NULL);
-CREATE TABLE IF NOT EXISTS RestockItems (id INTEGER PRIMARY KEY REFERENCES Items(id) ON DELETE CASCADE);
-CREATE TABLE IF NOT EXISTS Sizes (item INTEGER PRIMARY KEY NOT NULL REFERENCES RestockItems(id) ON DELETE CASCADE,
-type INTEGER NOT NULL, list TEXT NOT NULL);''')
+        cls._write(cls._schema)
 
     @classmethod
     def _clear(cls) -> None:
@@ -59,10 +653,12 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
+        def clear(c: sqlite3.Connection) -> None:
             for i in c.execute('SELECT name FROM sqlite_master WHERE type="table"').fetchall():
                 c.execute(f'DROP TABLE {i[0]}')
 
+        cls._write(clear)
+
     @classmethod
     def defrag(cls) -> None:
         """Free space from database
@@ -70,11 +666,21 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
-            c.execute('VACUUM')
+        cls._write(lambda c: c.execute('VACUUM'), False)
 
     @classmethod
     def unload(cls) -> None:
+        """Save database to ``cache/hash.db`` (in WAL mode stop writer and checkpoint WAL)
+
+        Returns:
+            None
+        """
+        if writer := cls._writer:
+            cls._writer = None
+            cls._epoch += 1
+            writer.stop()
+            return
+
         with cls._lock, cls.__db as c:
             check()
             c.backup(sqlite3.connect(f'{storage.cache.path}/hash.db'))
@@ -83,17 +689,33 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
     def load(cls) -> bool:
         """Load database from ``cache/hash.db``
 
+        Note:
+            In WAL mode (``storage.cache.wal``) database isn't loaded to memory, ``cache/hash.db`` is used directly
+
         Returns:
             :obj:`bool`: ``True`` if successful load, otherwise ``False`` if ``cache/hash.db`` not exists
         """
+        if storage.cache.wal:
+            check()
+            exists = os.path.isfile(f'{storage.cache.path}/hash.db')
+            if writer := cls._writer:
+                writer.stop()
+            cls._writer = HashWriter(f'{storage.cache.path}/hash.db')
+            cls._epoch += 1
+            cls.check()
+            cls._rebuild()
+            return exists
+
         with cls._lock, cls.__db as c:
             check()
             if os.path.isfile(f'{storage.cache.path}/hash.db'):
                 cls._clear()
 
                 sqlite3.connect(f'{storage.cache.path}/hash.db').backup(c)
+                cls._rebuild()
                 return True
             else:
+                cls._rebuild()
                 return False
 
     @classmethod
@@ -103,7 +725,7 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
+        with cls._read() as c:
             check()
             f = CacheStorage().file(f'hash_{get_time(name=True)}.sql', 'w+')
             for i in c.iterdump():
@@ -117,7 +739,7 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
+        with cls._read() as c:
             check()
             c.backup(sqlite3.connect(f'{storage.cache.path}/hash_{get_time(name=True)}.db.backup'))
 
@@ -135,11 +757,15 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
             TypeError: If ``table`` type not int
         """
         if isinstance(table, str):
-            with cls._lock, cls.__db as c:
+            def drop(c: sqlite3.Connection) -> None:
                 try:
                     c.execute(f'DROP TABLE {table}')
                 except sqlite3.OperationalError:
                     pass
+                cls._schema(c)
+
+            cls._write(drop)
+            cls._rebuild()
         else:
             raise TypeError('table must be str')
 
@@ -150,11 +776,21 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         Returns:
             None
         """
-        with cls._lock, cls.__db as c:
-            cls.check()
-            c.execute('DELETE FROM Targets WHERE time<=?', (time.time() - storage.cache.target_time,))
-            c.execute('DELETE FROM AnnouncedItems WHERE time<=?', (time.time() - storage.cache.item_time,))
-            c.execute('DELETE FROM Items WHERE time<=?', (time.time() - storage.cache.item_time,))
+        def cleanup(c: sqlite3.Connection) -> Tuple[Dict[str, CountingBloomFilter], Dict[str, List[bytes]]]:
+            filters, deleted = cls._filters, {}
+            for table, time_ in (
+                    ('Targets', time.time() - storage.cache.target_time),
+                    ('AnnouncedItems', time.time() - storage.cache.item_time),
+                    ('Items', time.time() - storage.cache.item_time)
+            ):
+                if table in filters:
+                    deleted[table] = [i[0] for i in c.execute(f'SELECT hash FROM {table} WHERE time<=?', (time_,))]
+                c.execute(f'DELETE FROM {table} WHERE time<=?', (time_,))
+            return filters, deleted
+
+        filters, deleted = cls._write(cleanup)
+        for k, v in deleted.items():
+            cls._removed(filters, k, v)
 
     @classmethod
     def add_target(cls, hash_: bytes) -> None:
@@ -172,17 +808,21 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(hash_, bytes):
             raise TypeError('hash_ must be bytes')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
+        def insert(c: sqlite3.Connection) -> None:
             try:
                 c.execute('INSERT INTO Targets VALUES (?, ?)', (hash_, time.time()))
+                cls._added('Targets', hash_)
             except sqlite3.IntegrityError as e:
                 if str(e).startswith('UNIQUE'):
                     raise UniquenessError
                 else:
                     raise e
 
+        cls._write(insert)
+
+        if (dedup := cls._shared()) and not dedup.add('t', [hash_])[0]:  # Already added by other monitor
+            raise UniquenessError
+
     @classmethod
     def check_target(cls, hash_: bytes) -> bool:
         """Check :class:`source.api.Target` (only for subclasses) existence at database by its hash
@@ -199,10 +839,29 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(hash_, bytes):
             raise TypeError('hash_ must be bytes')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
+        if cls._maybe('Targets', hash_):
+            with cls._read() as c:
+                if c.execute('SELECT time FROM Targets WHERE hash=?', (hash_,)).fetchone():
+                    return False
+
+        return not (dedup := cls._shared()) or dedup.check('t', [hash_])[0]
+
+    @classmethod
+    def check_targets(cls, hashes: List[bytes]) -> Set[bytes]:
+        """Batched :func:`check_target`
+
+        Args:
+            hashes: Target hashes
+
+        Returns:
+            :obj:`set`: Hashes of targets which not found
+        """
+        with cls._read() as c:
+            new = set(hashes) - cls._select(c, 'Targets', 'hash', {i for i in hashes if cls._maybe('Targets', i)})
 
-            return not c.execute('SELECT time FROM Targets WHERE hash=?', (hash_,)).fetchone()
+        if (dedup := cls._shared()) and new:
+            new = {i for i, j in zip(list(new), dedup.check('t', list(new))) if j}
+        return new
 
     @classmethod
     def add_announced_item(cls, hash_: bytes) -> None:
@@ -220,17 +879,21 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(hash_, bytes):
             raise TypeError('hash_ must be bytes')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
+        def insert(c: sqlite3.Connection) -> None:
             try:
                 c.execute('INSERT INTO AnnouncedItems VALUES (?, ?)', (hash_, time.time()))
+                cls._added('AnnouncedItems', hash_)
             except sqlite3.IntegrityError as e:
                 if str(e).startswith('UNIQUE'):
                     raise UniquenessError
                 else:
                     raise e
 
+        cls._write(insert)
+
+        if (dedup := cls._shared()) and not dedup.add('a', [hash_])[0]:
+            raise UniquenessError
+
     @classmethod
     def add_item(cls, item: ItemType, restock: bool = False) -> int:
         """Add :class:`source.api.IRelease` or :class:`source.api.IRestock` hash to database
@@ -257,11 +920,13 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(restock, bool):
             raise TypeError('restock must be bool')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
+        if (dedup := cls._shared()) and not restock and not dedup.add('i', [item.hash(4)])[0]:
+            raise UniquenessError  # Restocks are checked by id, so only releases are claimed
 
+        def insert(c: sqlite3.Connection) -> int:
             try:
                 id_ = c.execute('INSERT INTO Items VALUES (NULL, ?, ?)', (item.hash(4), time.time())).lastrowid
+                cls._added('Items', item.hash(4))
                 if restock:
                     c.execute(f'INSERT INTO RestockItems VALUES ({id_})')
                     c.execute(
@@ -275,6 +940,85 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
                 else:
                     raise e
 
+        return cls._write(insert)
+
+    @classmethod
+    def add_items(cls, items: List[ItemType]) -> List[Tuple[ItemType, Optional[int]]]:
+        """Check and add items at once (one query for each table and one transaction)
+
+        Note:
+            Each item is handled the same way as :func:`check_item` + :func:`add_announced_item` for
+            :class:`source.api.IAnnounce`, :func:`check_item` + :func:`add_item` for :class:`source.api.IRelease` and
+            :func:`check_item_id` + :func:`add_item` with ``restock=True`` for :class:`source.api.IRestock`. Items
+            which duplicate previous items of the batch are skipped
+
+        Args:
+            items: Items from result of parser
+
+        Returns:
+            :obj:`list`: Added items (in order of ``items``) with their ids (``None`` for announced items)
+        """
+        if not all(issubclass(type(i), Item) for i in items):
+            raise TypeError('items must be list of Item')
+
+        with cls._read() as c:
+            announced = cls._select(c, 'AnnouncedItems', 'hash', {
+                i.hash(3) for i in items if isinstance(i, IAnnounce) and cls._maybe('AnnouncedItems', i.hash(3))
+            })
+            known = cls._select(c, 'Items', 'hash', {
+                i.hash(4) for i in items if not isinstance(i, IAnnounce) and cls._maybe('Items', i.hash(4))
+            })
+            restocked = cls._select(c, 'RestockItems', 'id', {i.id for i in items if isinstance(i, IRestock)})
+
+        new: List[Tuple[ItemType, bytes]] = []
+        for i in items:
+            if isinstance(i, IAnnounce):
+                if (hash_ := i.hash(3)) not in announced:
+                    announced.add(hash_)
+                    new.append((i, hash_))
+            elif isinstance(i, IRestock):
+                if i.id not in restocked and (hash_ := i.hash(4)) not in known:
+                    restocked.add(i.id)
+                    known.add(hash_)
+                    new.append((i, hash_))
+            elif (hash_ := i.hash(4)) not in known:
+                known.add(hash_)
+                new.append((i, hash_))
+
+        if dedup := cls._shared():  # Claim hashes at daemon (restocks are checked by id, so they are not claimed)
+            for kind in ('a', 'i'):
+                claimed = [(n, i) for n, i in enumerate(new) if
+                           isinstance(i[0], IAnnounce) == (kind == 'a') and not isinstance(i[0], IRestock)]
+                rejected = {claimed[n][0] for n, j in enumerate(dedup.add(kind, [i[1][1] for i in claimed])) if not j}
+                new = [i for n, i in enumerate(new) if n not in rejected]
+
+        def insert(c: sqlite3.Connection) -> List[Tuple[ItemType, Optional[int]]]:
+            added: List[Tuple[ItemType, Optional[int]]] = []
+            for i, hash_ in new:
+                if isinstance(i, IAnnounce):
+                    if c.execute('INSERT OR IGNORE INTO AnnouncedItems VALUES (?, ?)', (hash_, time.time())).rowcount:
+                        cls._added('AnnouncedItems', hash_)
+                        added.append((i, None))
+                elif isinstance(i, IRestock):
+                    if c.execute(f'SELECT id FROM RestockItems WHERE id={i.id}').fetchone():
+                        continue
+                    if (cursor := c.execute('INSERT OR IGNORE INTO Items VALUES (NULL, ?, ?)',
+                                            (hash_, time.time()))).rowcount:
+                        cls._added('Items', hash_)
+                        c.execute(f'INSERT INTO RestockItems VALUES ({cursor.lastrowid})')
+                        c.execute(
+                            f'INSERT INTO Sizes VALUES ({cursor.lastrowid}, ?, ?)',
+                            (i.sizes.type, ujson.dumps(i.sizes.export(), separators=(',', ':')))
+                        )
+                        added.append((i, cursor.lastrowid))
+                elif (cursor := c.execute('INSERT OR IGNORE INTO Items VALUES (NULL, ?, ?)',
+                                          (hash_, time.time()))).rowcount:
+                    cls._added('Items', hash_)
+                    added.append((i, cursor.lastrowid))
+            return added
+
+        return cls._write(insert)
+
     @classmethod
     def remove_item(cls, hash_: bytes) -> None:
         """Remove :class:`source.api.IRelease` hash from database
@@ -294,10 +1038,15 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(hash_, bytes):
             raise TypeError('hash_ must be bytes')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
+        def delete(c: sqlite3.Connection) -> Optional[Dict[str, CountingBloomFilter]]:
+            if c.execute('DELETE FROM Items WHERE hash=?', (hash_,)).rowcount:
+                return cls._filters
 
-            c.execute('DELETE FROM Items WHERE hash=?', (hash_,))
+        if filters := cls._write(delete):
+            cls._removed(filters, 'Items', [hash_])
+
+        if dedup := cls._shared():
+            dedup.delete('i', [hash_])
 
     @classmethod
     def check_item(cls, hash_: bytes, announced: bool = False) -> bool:
@@ -320,14 +1069,13 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(announced, bool):
             raise TypeError('announced must be bool')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
+        if cls._maybe('AnnouncedItems' if announced else 'Items', hash_):
+            with cls._read() as c:
+                if c.execute(f'SELECT time FROM {"AnnouncedItems" if announced else "Items"} WHERE hash=?',
+                             (hash_,)).fetchone():
+                    return False
 
-            if c.execute(f'SELECT time FROM {"AnnouncedItems" if announced else "Items"} WHERE hash=?',
-                         (hash_,)).fetchone():
-                return False
-            else:
-                return True
+        return not (dedup := cls._shared()) or dedup.check('a' if announced else 'i', [hash_])[0]
 
     @classmethod
     def check_item_id(cls, id_: int, restock: bool = True) -> bool:
@@ -350,9 +1098,7 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(restock, bool):
             raise TypeError('restock must be bool')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
+        with cls._read() as c:
             return not c.execute(f'SELECT id FROM {"RestockItems" if restock else "Items"} WHERE id={id_}').fetchone()
 
     @classmethod
@@ -379,9 +1125,7 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(sizes, Sizes):
             raise TypeError('sizes must be api.Sizes')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
+        def update(c: sqlite3.Connection) -> None:
             if c.execute(f'SELECT item FROM sizes WHERE item={id_}').fetchone():
                 c.execute(
                     f'UPDATE sizes SET type=?, list=? WHERE item={id_}',
@@ -390,6 +1134,8 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
             else:
                 raise IndexError(f'Sizes for this item ({id_}) not found')
 
+        cls._write(update)
+
     @classmethod
     def get_size(cls, id_: int) -> Optional[Sizes]:
         """Get sizes of item
@@ -407,9 +1153,7 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
         if not isinstance(id_, int):
             raise TypeError('id_ must be int')
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
+        with cls._read() as c:
             if sizes := c.execute(f'SELECT type, list FROM sizes WHERE item={id_}').fetchone():
                 return Sizes(sizes[0], (Size(*i) for i in ujson.loads(sizes[1])))
             else:
@@ -429,16 +1173,35 @@ type INTEGER NOT NULL, list TEXT NOT NULL);''')
                     'announced_items': 3,
                     'items': 6,
                     'restock_items': 0,
-                    'sizes': 0
+                    'sizes': 0,
+                    'filters': {
+                        'targets': {'size': 1048576, 'hashes': 4, 'count': 8, 'fpr': 0.0, 'memory': 1048633},
+                        'announced_items': {...},
+                        'items': {...},
+                        'skipped': 42
+                    },
+                    'wal': {'batches': 120, 'writes': 1830, 'queue': 0}  # Only in WAL mode
                 }
         """
 
-        with cls._lock, cls.__db as c:
-            cls.check()
-
-            return dict(zip(
+        with cls._read() as c:
+            stats = dict(zip(
                 ('targets', 'announced_items', 'items', 'restock_items', 'sizes'),
                 c.execute('SELECT (SELECT COUNT(hash) FROM Targets), (SELECT COUNT(hash) FROM AnnouncedItems),'
                           '(SELECT COUNT(id) FROM Items), (SELECT COUNT(id) FROM RestockItems),'
                           '(SELECT COUNT(item) FROM Sizes)').fetchone())
             )
+            stats['filters'] = {
+                k: cls._filters[v].stats() for k, v in
+                (('targets', 'Targets'), ('announced_items', 'AnnouncedItems'), ('items', 'Items')) if v in cls._filters
+            }
+            stats['filters']['skipped'] = cls._skipped  # Checks answered without query
+            if writer := cls._writer:
+                stats['wal'] = {'batches': writer.batches, 'writes': writer.writes, 'queue': writer.requests.qsize()}
+            return stats
+
+
+if __name__ == '__main__':  # Run dedup daemon: python -m source.cache [host:port]
+    storage.config_load()
+    with DedupDaemon(sys.argv[1] if len(sys.argv) > 1 else storage.cache.daemon) as daemon:
+        daemon.serve_forever()
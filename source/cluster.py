@@ -0,0 +1,209 @@
+import bisect
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from . import codes
+from . import logger
+from . import storage
+
+
+class ClusterError(Exception):
+    pass
+
+
+def _address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class HashRing:  # Consistent hash ring, each member has "replicas" virtual nodes
+    replicas: int
+    members: Tuple[str, ...]
+    _keys: List[int]
+    _nodes: List[str]
+
+    def __init__(self, members: Iterable[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self.members = tuple(sorted(set(members)))
+        nodes = sorted((self.hash(f'{i}#{j}'), i) for i in self.members for j in range(replicas))
+        self._keys = [i[0] for i in nodes]
+        self._nodes = [i[1] for i in nodes]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], 'big')
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        return self._nodes[bisect.bisect(self._keys, self.hash(key)) % len(self._keys)]
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    server: 'Coordinator'
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = self.server.request(
+                str(request['member']), bool(request.get('leave')), [str(i) for i in request.get('pinned', ())]
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {'error': f'{e.__class__.__name__}: {e!s}'}
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class Coordinator(socketserver.ThreadingTCPServer):
+    # Keeps membership of cluster, members send heartbeats and receive list of alive members (one JSON line each way)
+    daemon_threads = True
+    allow_reuse_address = True
+
+    _log: logger.Logger
+    lock: threading.Lock
+    members: Dict[str, float]  # Member name: last heartbeat time
+    pinned: Dict[str, str]  # Script: member (scripts which can't be unloaded stay on member which loaded them first)
+    epoch: int  # Incremented on each membership change
+    thread: Optional[threading.Thread]
+
+    def __init__(self, address: str):
+        super().__init__(_address(address), _CoordinatorHandler, False)
+        self._log = logger.Logger('CC')
+        self.lock = threading.Lock()
+        self.members = {}
+        self.pinned = {}
+        self.epoch = 0
+        self.thread = None
+
+    def request(self, member: str, leave: bool = False, pinned: Iterable[str] = ()) -> dict:
+        with self.lock:
+            changed = self.expire()
+            if leave:
+                changed = self.members.pop(member, None) is not None or changed
+            else:
+                changed = member not in self.members or changed
+                self.members[member] = time.time()
+
+            pins = {k: v for k, v in self.pinned.items() if v in self.members and (v != member or k in pinned)}
+            if not leave:
+                for i in pinned:
+                    pins.setdefault(i, member)
+            changed = pins != self.pinned or changed
+            self.pinned = pins
+
+            if changed:
+                self.epoch += 1
+                self._log.info(codes.Code(21804, f'{self.epoch}: {", ".join(sorted(self.members))}'))
+            return {'epoch': self.epoch, 'members': sorted(self.members), 'pinned': self.pinned}
+
+    def expire(self) -> bool:  # Drop members without heartbeat for timeout
+        expired = [k for k, v in self.members.items() if time.time() - v > storage.cluster.timeout]
+        for i in expired:
+            del self.members[i]
+        return bool(expired)
+
+    def start(self) -> None:
+        self.server_bind()
+        self.server_activate()
+        self.thread = threading.Thread(target=self.serve_forever, args=(.5,), name='CC', daemon=True)
+        self.thread.start()
+        self._log.info(codes.Code(21801, '%s:%d' % self.server_address[:2]))
+
+    def stop(self) -> None:
+        if self.thread:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+        self._log.info(codes.Code(21802))
+
+
+class Member:
+    # Cluster member, owns scripts which are mapped to it by hash ring built from members list of coordinator. Until
+    # the first answer of coordinator ring is empty and member owns nothing, otherwise restarted members (which can't
+    # reach coordinator yet) would run every script at once
+    _log: logger.Logger
+    lock: threading.Lock
+    name: str
+    epoch: int
+    ring: HashRing
+    pinned: Dict[str, str]  # Script: member, overrides ring for scripts which can't be unloaded
+    last_heartbeat: float
+    coordinator: Optional[Coordinator]
+
+    def __init__(self):
+        self._log = logger.Logger('CM')
+        self.lock = threading.Lock()
+        self.name = ''
+        self.epoch = -1
+        self.ring = HashRing()
+        self.pinned = {}
+        self.last_heartbeat = 0.
+        self.coordinator = None
+
+    @property
+    def members(self) -> Tuple[str, ...]:
+        return self.ring.members
+
+    def _request(self, leave: bool = False, pinned: Iterable[str] = ()) -> dict:
+        with socket.create_connection(_address(storage.cluster.coordinator), storage.cluster.connect_timeout) as s:
+            s.sendall(json.dumps({'member': self.name, 'leave': leave, 'pinned': list(pinned)}).encode() + b'\n')
+            reply = json.loads(s.makefile('rb').readline())
+        if 'error' in reply:
+            raise ClusterError(reply['error'])
+        return reply
+
+    def join(self) -> None:
+        self.name = storage.cluster.name or f'{socket.gethostname()}:{os.getpid()}'
+        if storage.cluster.serve:
+            self.coordinator = Coordinator(storage.cluster.coordinator)
+            self.coordinator.start()
+        with self.lock:  # Own nothing until coordinator answers
+            self.epoch = -1
+            self.ring = HashRing()
+            self.pinned = {}
+        self.heartbeat()
+        self._log.info(codes.Code(21803, f'{self.name} ({len(self.members)} members)'))
+
+    def leave(self) -> None:
+        try:
+            self._request(True)
+        except (OSError, ValueError, ClusterError) as e:
+            self._log.warn(codes.Code(31801, f'{e.__class__.__name__}: {e!s}'))
+        if self.coordinator:
+            self.coordinator.stop()
+            self.coordinator = None
+        self._log.info(codes.Code(21805, self.name))
+
+    def heartbeat(self, pinned: Iterable[str] = ()) -> bool:  # Returns True if membership or pins were changed
+        self.last_heartbeat = time.time()
+        try:
+            reply = self._request(pinned=pinned)
+        except (OSError, ValueError, ClusterError) as e:  # Keep last known membership
+            self._log.warn(codes.Code(31801, f'{e.__class__.__name__}: {e!s}'))
+            return False
+
+        with self.lock:
+            if reply['epoch'] == self.epoch and tuple(reply['members']) == self.members:
+                return False
+            self.epoch = reply['epoch']
+            self.ring = HashRing((*reply['members'], self.name), storage.cluster.replicas)
+            self.pinned = reply.get('pinned', {})
+        self._log.info(codes.Code(21804, f'{self.epoch}: {", ".join(self.members)}'))
+        return True
+
+    def owns(self, script: str) -> bool:
+        if not storage.cluster.enabled:
+            return True
+        with self.lock:
+            if (owner := self.pinned.get(script)) is not None:
+                return owner == self.name
+            return self.ring.owner(script) == self.name
+
+
+member: Member = Member()
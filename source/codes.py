@@ -41,6 +41,11 @@ _codes: Dict[int, str] = {
     20204: 'Worker started',
     20205: 'CatalogWorker initialized',
     20206: 'CatalogWorker started',
+    20207: 'Workers count scaled',
+    20208: 'LaneWorker initialized',
+    20209: 'LaneWorker started',
+    20210: 'AsyncEngine initialized',
+    20211: 'AsyncEngine started',
 
     # Pipe (203xx)
     20301: 'Reindexing parsers started',
@@ -57,6 +62,8 @@ _codes: Dict[int, str] = {
     20507: 'Unloading all scripts complete',
     20508: 'Reloading all scripts',
     20509: 'Reloading all scripts complete',
+    20510: 'Scripts of other cluster members skipped',
+    20511: 'Scripts rebalanced',
 
     # ScriptIndex (206xx)
     20601: 'Config loaded',
@@ -85,6 +92,8 @@ _codes: Dict[int, str] = {
     # Resolver (209xx)
     20901: 'Successful target execution',
     20902: 'Catalog updated',
+    20903: 'Schedule snapshot saved',
+    20904: 'Schedule snapshot restored',
 
     # Commands (211xx)
     21101: 'Command executing',
@@ -106,6 +115,16 @@ _codes: Dict[int, str] = {
     21507: 'Loading keywords(started)',
     21508: 'Loading keywords(complete)',
 
+    # Cluster (218xx)
+    21801: 'Coordinator started',
+    21802: 'Coordinator stopped',
+    21803: 'Joined cluster',
+    21804: 'Cluster membership changed',
+    21805: 'Left cluster',
+
+    # DedupClient (219xx)
+    21901: 'Dedup daemon is available again',
+
     # Warning (3xxxx)
     # System (300xx)
     30000: 'Test warning',
@@ -115,11 +134,16 @@ _codes: Dict[int, str] = {
     30202: 'Worker was stopped',
     30203: 'CatalogWorker was stopped',
     30204: 'Lock forced released',
+    30205: 'LaneWorker was stopped',
+    30206: 'AsyncEngine was stopped',
+    30207: 'Hung worker replaced',
+    30208: 'AsyncEngine thread pool replaced (threads hung by sync parsers)',
 
     # Pipe (303xx)
     30301: 'Parser reindexing failed',
-    30302: 'Catalog lost while sending (queue full)',
-    30303: 'Target lost while sending (queue full)',
+    30302: 'Catalog deferred while sending (queue full)',
+    30303: 'Target deferred while sending (queue full)',
+    30304: 'Interval task shed while sending (queue overloaded)',
 
     # ScriptManager (305xx)
     30501: 'Module not loaded',
@@ -146,12 +170,18 @@ _codes: Dict[int, str] = {
     30904: 'Target lost while retrieving (script has no Parser)',
     30905: 'Catalog lost while executing (script unloaded)',
     30906: 'Catalog lost while executing (script has no parser)',
-    30907: 'Catalog lost while executing (bad result)',
+    30907: 'Catalog failed while executing (bad result)',
     30908: 'Target lost while executing (script unloaded)',
     30909: 'Target lost while executing (script has no parser)',
-    30910: 'Target lost while executing (bad result)',
+    30910: 'Target failed while executing (bad result)',
     30911: 'Smart catalog expired',
     30912: 'Smart target expired',
+    30913: 'Catalog retry scheduled',
+    30914: 'Target retry scheduled',
+    30915: 'Target moved to dead-letter list',
+    30916: 'Task skipped while restoring schedule snapshot',
+    30917: 'Schedule snapshot is broken',
+    30918: 'Result of expired task discarded',
 
     # Provider (312xx)
     31201: 'Proxy added',
@@ -169,6 +199,12 @@ _codes: Dict[int, str] = {
     31531: 'Negative keyword not loaded (TypeError)',
     31532: 'Negative keyword not loaded (UniquenessError)',
 
+    # Cluster (318xx)
+    31801: 'Coordinator is unreachable',
+
+    # DedupClient (319xx)
+    31901: 'Dedup daemon is unavailable',
+
     # Error (4xxxx)
     # System (400xx)
     40000: 'Unknown error',
@@ -177,14 +213,18 @@ _codes: Dict[int, str] = {
     40201: 'Pipe was unexpectedly stopped',
     40202: 'Worker was unexpectedly stopped',
     40203: 'CatalogWorker was unexpectedly stopped',
+    40204: 'LaneWorker was unexpectedly stopped',
+    40205: 'AsyncEngine was unexpectedly stopped',
 
     # Pipe (403xx)
     40301: 'Wrong catalog received from script',
+    40302: 'Schedule snapshot failed',
 
     # Worker (404xx)
     40401: 'Unknown status received while executing',
     40402: 'Parser execution failed',
     40403: 'Target lost in pipeline (script unloaded)',
+    40404: 'Task execution failed in async engine',
 
     # ScriptsManager (405xx)
     40501: 'Can\'t load script (ImportError)',
@@ -206,6 +246,7 @@ _codes: Dict[int, str] = {
     40902: 'Unknown target type (while inserting)',
     40903: 'Catalog execution failed',
     40904: 'Target execution failed',
+    40905: 'Task deadline exceeded',
 
     # Provider (412xx)
     41201: 'Bad proxy',
@@ -237,7 +278,13 @@ _codes: Dict[int, str] = {
     51001: 'Unexpectedly has turned off',
 
     # RemoteThread (514xx)
-    51401: 'Unknown fatal error'
+    51401: 'Unknown fatal error',
+
+    # LaneWorker (516xx)
+    51601: 'Unexpectedly has turned off',
+
+    # AsyncEngine (517xx)
+    51701: 'Unexpectedly has turned off'
 }
 
 
@@ -16,10 +16,18 @@ class Commands:
     def __init__(self):
         self.log = logger.Logger('C')
 
+        core.server.commands.add_(self.analytics_assist)
         core.server.commands.add_(self.analytics_dump)
         core.server.commands.add_(self.analytics_snapshot)
         core.server.commands.add_(self.analytics_proxy)
         core.server.commands.add_(self.analytics_proxies)
+        core.server.commands.add_(self.analytics_pipe)
+        core.server.commands.add_(self.analytics_lateness)
+        core.server.commands.add_(self.analytics_forecast)
+        core.server.commands.add_(self.analytics_lane)
+        core.server.commands.add_(self.analytics_scaling)
+        core.server.commands.add_(self.analytics_watchdog)
+        core.server.commands.add_(self.analytics_cluster)
         core.server.commands.add_(self.analytics_worker)
         core.server.commands.add_(self.analytics_index_worker)
         core.server.commands.add_(self.config)
@@ -28,6 +36,9 @@ class Commands:
         core.server.commands.add_(self.config_load)
         core.server.commands.add_(self.config_get)
         core.server.commands.add_(self.config_set)
+        core.server.commands.add_(self.dead_letter)
+        core.server.commands.add_(self.dead_letter_revive)
+        core.server.commands.add_(self.dead_letter_clear)
         core.server.commands.add_(self.hash_storage_defrag)
         core.server.commands.add_(self.hash_storage_dump)
         core.server.commands.add_(self.hash_storage_backup)
@@ -77,10 +88,18 @@ class Commands:
         core.server.commands.add_(self.worker_resume)
         core.server.commands.add_(self.stop)
 
+        core.server.commands.alias('a-assist', 'analytics_assist')
         core.server.commands.alias('a-dump', 'analytics_dump')
         core.server.commands.alias('a-snapshot', 'analytics_snapshot')
         core.server.commands.alias('a-proxy', 'analytics_proxy')
         core.server.commands.alias('a-proxies', 'analytics_proxies')
+        core.server.commands.alias('a-pipe', 'analytics_pipe')
+        core.server.commands.alias('a-lateness', 'analytics_lateness')
+        core.server.commands.alias('a-forecast', 'analytics_forecast')
+        core.server.commands.alias('a-lane', 'analytics_lane')
+        core.server.commands.alias('a-scaling', 'analytics_scaling')
+        core.server.commands.alias('a-watchdog', 'analytics_watchdog')
+        core.server.commands.alias('a-cluster', 'analytics_cluster')
         core.server.commands.alias('a-worker', 'analytics_worker')
         core.server.commands.alias('a-i-worker', 'analytics_index_worker')
         core.server.commands.alias('c-cat', 'config_categories')
@@ -88,6 +107,9 @@ class Commands:
         core.server.commands.alias('c-load', 'config_load')
         core.server.commands.alias('c-get', 'config_get')
         core.server.commands.alias('c-set', 'config_set')
+        core.server.commands.alias('dl', 'dead_letter')
+        core.server.commands.alias('dl-revive', 'dead_letter_revive')
+        core.server.commands.alias('dl-clear', 'dead_letter_clear')
         core.server.commands.alias('hs-defrag', 'hash_storage_defrag')
         core.server.commands.alias('hs-dump', 'hash_storage_dump')
         core.server.commands.alias('hs-backup', 'hash_storage_backup')
@@ -131,6 +153,10 @@ class Commands:
         core.server.commands.alias('w-pause', 'worker_pause')
         core.server.commands.alias('w-resume', 'worker_resume')
 
+    def analytics_assist(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_assist()
+
     def analytics_dump(self, peer: Peer) -> bool:
         self.log.info(Code(21101, f'{peer.name}: {inspect.stack()[0][3]}'))
         core.analytic.dump()
@@ -149,6 +175,38 @@ class Commands:
         self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
         return core.analytic.proxies()
 
+    def analytics_pipe(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_pipe()
+
+    def analytics_lateness(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_lateness()
+
+    def analytics_forecast(self, peer: Peer, window: float = 0., count: int = 0) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        if not isinstance(window, (int, float)) or window < 0:
+            raise TypeError('window must be positive float')
+        elif not isinstance(count, int) or count < 0:
+            raise TypeError('count must be positive int')
+        return core.analytic.info_forecast(window, count)
+
+    def analytics_lane(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_lane()
+
+    def analytics_scaling(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_scaling()
+
+    def analytics_watchdog(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_watchdog()
+
+    def analytics_cluster(self, peer: Peer) -> dict:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_cluster()
+
     def analytics_worker(self, peer: Peer, id_: int) -> dict:
         self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
         return core.analytic.info_worker(id_)
@@ -214,6 +272,22 @@ class Commands:
         else:
             raise IndexError(f'Namespace "{namespace}" not found')
 
+    def dead_letter(self, peer: Peer) -> list:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return core.analytic.info_retry()['dead_letter']
+
+    def dead_letter_revive(self, peer: Peer, index: int = -1) -> int:
+        self.log.info(Code(21103, f'{peer.name}: {inspect.stack()[0][3]}'))
+        if not isinstance(index, int):
+            raise TypeError('index must be int')
+        return core.Resolver.revive(index)
+
+    def dead_letter_clear(self, peer: Peer) -> int:
+        self.log.info(Code(21101, f'{peer.name}: {inspect.stack()[0][3]}'))
+        count = core.Resolver.clear_dead_letters()
+        self.log.info(Code(21102, f'{peer.name}: {inspect.stack()[0][3]}'))
+        return count
+
     def hash_storage_defrag(self, peer: Peer) -> bool:
         self.log.info(Code(21101, f'{peer.name}: {inspect.stack()[0][3]}'))
         HashStorage.defrag()
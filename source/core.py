@@ -1,9 +1,14 @@
+import asyncio
+import collections
+import os
+import pickle
 import queue
 import random
 import threading
 import time
 import traceback
-from typing import Tuple, Dict, Type, List, Union, Optional
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Tuple, Dict, Type, List, Union, Optional, Set
 
 import uctp
 import yaml
@@ -11,13 +16,15 @@ from Crypto.PublicKey import RSA
 
 from . import analytics
 from . import api
+from . import cluster
 from . import codes
 from . import commands
 from . import logger
 from . import scripts
 from . import storage
 from .cache import UniquenessError, HashStorage
-from .library import PrioritizedItem, UniqueSchedule, Provider, MainStorage
+from .library import PrioritizedItem, CancellableQueue, UniqueSchedule, Limiter, Histogram, Interval, Scheduled, \
+    Smart, Provider, MainStorage
 
 
 # TODO: throw() for state setters
@@ -51,6 +58,14 @@ class CatalogWorkerError(Exception):
     pass
 
 
+class LaneWorkerError(Exception):
+    pass
+
+
+class AsyncEngineError(Exception):
+    pass
+
+
 class StateError(Exception):
     pass
 
@@ -102,13 +117,35 @@ class Resolver:
     _log: logger.Logger = logger.Logger('R')
     _catalog_lock: threading.RLock = threading.RLock()
     _target_lock: threading.RLock = threading.RLock()
+    _wakeup: threading.Condition = threading.Condition()
+    _deadline: float = 0.
 
-    catalog_queue: queue.PriorityQueue = queue.PriorityQueue(storage.queues.catalog_queue_size)
-    target_queue: queue.PriorityQueue = queue.PriorityQueue(storage.queues.target_queue_size)
+    catalog_queue: CancellableQueue = CancellableQueue(storage.queues.catalog_queue_size)
+    target_queue: CancellableQueue = CancellableQueue(storage.queues.target_queue_size)
+    lane_queue: CancellableQueue = CancellableQueue(storage.lane.queue_size)  # Time-critical catalogs and targets
 
     catalogs: UniqueSchedule = UniqueSchedule()
     targets: UniqueSchedule = UniqueSchedule()
 
+    limiter: Limiter = Limiter(lambda script: Resolver.freed(script))
+
+    _held_lock: threading.Lock = threading.Lock()
+    held: Dict[str, collections.deque] = {}  # Tasks over limits of script, (due time, task) in order of due time
+    held_until: Dict[str, float] = {}  # When limits of script are checked again (inf - when slot is released)
+
+    _histograms_lock: threading.Lock = threading.Lock()
+    histograms: Dict[str, Dict[str, Histogram]] = {'classes': {}, 'scripts': {}}  # Dispatch lateness
+
+    _retry_lock: threading.RLock = threading.RLock()
+    failures: Dict[str, int] = {}  # Consecutive failures of scripts
+    attempts: Dict[str, Dict[bytes, int]] = {}  # Failed attempts of targets (by script)
+    dead_letter: collections.deque = collections.deque(maxlen=storage.retry.dead_letter_size)
+
+    _watch_lock: threading.Lock = threading.Lock()
+    running: Dict[int, Tuple[float, float, int, Union[api.CatalogType, api.TargetType]]] = {}  # By thread ident
+    abandoned: Set[int] = set()  # Threads given up by watchdog (results of their tasks will be discarded)
+    expired: int = 0  # Tasks which exceeded deadline
+
     @staticmethod
     def catalog_priority(catalog: api.CatalogType) -> int:
         if isinstance(catalog, api.CSmart):
@@ -121,29 +158,73 @@ class Resolver:
             return storage.priority.catalog_default
 
     @staticmethod
-    def target_priority(target: Union[api.TargetType, api.RestockTargetType]) -> int:
+    def target_class_priority(target: Union[api.TargetType, api.RestockTargetType]) -> Optional[List[int]]:
+        # Base priority and reuse range of target class (None for unknown class)
         if isinstance(target, api.TSmart):
-            return storage.priority.TSmart[0] + target.reuse(storage.priority.TSmart[1])
+            return storage.priority.TSmart
         elif isinstance(target, api.TScheduled):
-            return storage.priority.TScheduled[0] + target.reuse(storage.priority.TScheduled[1])
+            return storage.priority.TScheduled
         elif isinstance(target, api.TInterval):
-            return storage.priority.TInterval[0] + target.reuse(storage.priority.TInterval[1])
+            return storage.priority.TInterval
         elif isinstance(target, api.RTSmart):
-            return storage.priority.RTSmart[0] + target.reuse(storage.priority.RTSmart[1])
+            return storage.priority.RTSmart
         elif isinstance(target, api.RTScheduled):
-            return storage.priority.RTScheduled[0] + target.reuse(storage.priority.RTScheduled[1])
+            return storage.priority.RTScheduled
         elif isinstance(target, api.RTInterval):
-            return storage.priority.RTInterval[0] + target.reuse(storage.priority.RTInterval[1])
+            return storage.priority.RTInterval
         else:
+            return None
+
+    @classmethod
+    def target_priority(cls, target: Union[api.TargetType, api.RestockTargetType]) -> int:
+        if (priority := cls.target_class_priority(target)) is None:
             return storage.priority.target_default
+        return priority[0] + target.reuse(priority[1])
+
+    @classmethod
+    def group(cls, task: Union[api.CatalogType, api.TargetType]) -> int:  # Priority of task class without reuse
+        if issubclass(type(task), api.Catalog):
+            return cls.catalog_priority(task)
+        elif (priority := cls.target_class_priority(task)) is None:
+            return storage.priority.target_default
+        return priority[0]
+
+    @staticmethod
+    def lane(task: Union[api.CatalogType, api.TargetType]) -> bool:  # Task must be sent to lane_queue
+        return storage.lane.enabled and isinstance(task, (Smart, Scheduled))
+
+    @staticmethod
+    def mode(task: Union[api.CatalogType, api.TargetType]) -> int:
+        return 0 if issubclass(type(task), api.Catalog) else 1
+
+    @classmethod
+    def queue(cls, lane: int) -> CancellableQueue:  # 0 - catalogs, 1 - targets, 2 - lane
+        return (cls.catalog_queue, cls.target_queue, cls.lane_queue)[lane]
+
+    @staticmethod
+    def deadline(task: Union[api.CatalogType, api.TargetType]) -> float:
+        # Max execution time of task (0 - unlimited), script without "deadline" inherits one of thread manager
+        if (script := script_manager.scripts.get(task.script)) and script['deadline'] is not None:
+            return script['deadline']
+        return storage.thread_manager.deadline
+
+    @staticmethod
+    def weight(task: Union[api.CatalogType, api.TargetType]) -> float:
+        if script := script_manager.scripts.get(task.script):
+            return script['weight']
+        else:
+            return 1.
 
     @classmethod
     def insert_catalog(cls, catalog: api.CatalogType, force: bool = False) -> None:
+        time_: Optional[float] = None
         with cls._catalog_lock:
             try:
                 if issubclass(type(catalog), api.Catalog):
                     if force:
-                        cls.catalogs[time.time()] = catalog
+                        cls.catalogs.discard(catalog)
+                        time_ = time.time()
+                        cls.catalogs[time_] = catalog
                     else:
                         if isinstance(catalog, api.CSmart):
                             if catalog.expired:
@@ -152,21 +233,13 @@ class Resolver:
                                 if (time_ := catalog.gen.extract()) == catalog.gen.time:
                                     catalog.expired = True
 
-                                for i in range(100):  # TODO: Optimize
-                                    if time_ in cls.catalogs:
-                                        time_ += .0001
-                                    else:
-                                        cls.catalogs[time_] = catalog
-                                        break
-                                else:
-                                    cls._log.error(
-                                        f'Smart catalog lost (calibration not passed): {catalog}',
-                                        threading.current_thread().name
-                                    )
+                                cls.catalogs[time_] = catalog
                         elif isinstance(catalog, api.CScheduled):
-                            cls.catalogs[catalog.timestamp] = catalog
+                            time_ = catalog.timestamp
+                            cls.catalogs[time_] = catalog
                         elif isinstance(catalog, api.CInterval):
-                            cls.catalogs[time.time() + catalog.interval] = catalog
+                            time_ = time.time() + catalog.interval
+                            cls.catalogs[time_] = catalog
                 else:
                     if storage.main.production:
                         cls._log.error(codes.Code(40901, catalog), threading.current_thread().name)
@@ -175,11 +248,25 @@ class Resolver:
                                        parent=threading.current_thread().name)
             except IndexError:
                 cls._log.test(f'Inserting non-unique catalog', threading.current_thread().name)
+                return
+
+        if time_ is not None:
+            cls.wake(time_)
 
     @classmethod
     def insert_target(cls, target: api.TargetType) -> None:
+        cls.insert_targets([target])
+
+    @classmethod
+    def insert_targets(cls, targets: List[api.TargetType]) -> None:  # One hash query and one wake for all targets
+        earliest: Optional[float] = None
         with cls._target_lock:
-            if HashStorage.check_target(target.hash()):
+            new = HashStorage.check_targets([i.hash() for i in targets])
+            for target in targets:
+                if target.hash() not in new:
+                    continue
+
+                time_: Optional[float] = None
                 try:
                     if isinstance(target, api.TSmart):
                         if target.expired:
@@ -188,138 +275,511 @@ class Resolver:
                             if (time_ := target.gen.extract()) == target.gen.time:
                                 target.expired = True
 
-                            for i in range(100):  # TODO: Optimize
-                                if time_ in cls.targets:
-                                    time_ += .0001
-                                else:
-                                    cls.targets[time_] = target
-                                    break
-                            else:
-                                cls._log.error(f'Smart target lost (calibration not passed): {target}')
+                            cls.targets[time_] = target
                     elif isinstance(target, api.TScheduled):
-                        cls.targets[target.timestamp] = target
+                        time_ = target.timestamp
+                        cls.targets[time_] = target
                     elif isinstance(target, api.TInterval):
-                        cls.targets[time.time() + target.interval] = target
+                        time_ = time.time() + target.interval
+                        cls.targets[time_] = target
                     else:
                         cls._log.error(codes.Code(40902, target), threading.current_thread().name)
                 except IndexError:
                     cls._log.test(f'Inserting non-unique target', threading.current_thread().name)
+                    continue
+
+                if time_ is not None and (earliest is None or time_ < earliest):
+                    earliest = time_
+
+        if earliest is not None:
+            cls.wake(earliest)
+
+    @classmethod
+    def defer(cls, task: Union[api.CatalogType, api.TargetType], time_: float) -> None:
+        if issubclass(type(task), api.Catalog):
+            lock, schedule = cls._catalog_lock, cls.catalogs
+        else:
+            lock, schedule = cls._target_lock, cls.targets
+
+        with lock:
+            try:
+                schedule[time_] = task
+            except IndexError:
+                cls._log.test(f'Deferring non-unique task', threading.current_thread().name)
+                return
+
+        cls.wake(time_)
+
+    @classmethod
+    def limit(cls, task: Union[api.CatalogType, api.TargetType]) -> Optional[float]:
+        # Take in-flight slot and token of script, returns delay if rate is exceeded, None if in-flight limit reached
+        if script := script_manager.scripts.get(task.script):
+            return cls.limiter.acquire(task.script, script['max-in-flight'], script['rate'], script['burst'])
+        else:
+            return cls.limiter.acquire(task.script)
+
+    @classmethod
+    def hold(cls, time_: float, task: Union[api.CatalogType, api.TargetType], delay: Optional[float]) -> None:
+        # Park task over limits of script until limiter frees slot or token (due time is kept for lateness)
+        with cls._held_lock:
+            if task.script not in cls.held:
+                cls.held[task.script] = collections.deque()
+                cls.held_until[task.script] = float('inf') if delay is None else time.time() + delay
+            cls.held[task.script].append((time_, task))
+
+    @classmethod
+    def unhold(cls, script: str) -> Optional[Tuple[float, Union[api.CatalogType, api.TargetType]]]:
+        # Take the first held task of script if limits allow it (slot and token are acquired)
+        with cls._held_lock:
+            if not (tasks := cls.held.get(script)):
+                return None
+            if (delay := cls.limit(tasks[0][1])) == 0:
+                entry = tasks.popleft()
+                if not tasks:
+                    del cls.held[script]
+                    del cls.held_until[script]
+                return entry
+            cls.held_until[script] = float('inf') if delay is None else time.time() + delay
+            return None
+
+    @classmethod
+    def releasable(cls) -> List[str]:  # Scripts with held tasks which limits must be checked now
+        now = time.time()
+        with cls._held_lock:
+            return [k for k, v in cls.held_until.items() if v <= now]
+
+    @classmethod
+    def freed(cls, script: str) -> None:  # Slot or token of script is freed, its held tasks can be sent
+        if script in cls.held:
+            with cls._held_lock:
+                if script in cls.held_until:
+                    cls.held_until[script] = time.time()
+            cls.wake(time.time())
+
+    @classmethod
+    def drop_held(cls, script: str, catalogs: bool) -> None:
+        with cls._held_lock:
+            if tasks := cls.held.get(script):
+                cls.held[script] = collections.deque(i for i in tasks if cls.mode(i[1]) != (0 if catalogs else 1))
+                if not cls.held[script]:
+                    del cls.held[script]
+                    del cls.held_until[script]
+
+    @classmethod
+    def backoff(cls, script: str) -> float:
+        with cls._retry_lock:
+            failures = cls.failures[script] = cls.failures.get(script, 0) + 1
+
+        delay = min(storage.retry.delay * storage.retry.factor ** (failures - 1), storage.retry.max_delay)
+        return delay * (1 + random.uniform(-storage.retry.jitter, storage.retry.jitter))
+
+    @classmethod
+    def retry(cls, task: Union[api.CatalogType, api.TargetType], reason: str) -> None:
+        delay = cls.backoff(task.script)
+
+        if issubclass(type(task), api.Catalog):  # Catalog must always come back to schedule
+            cls._log.warn(codes.Code(30913, f'{task} (in {delay:.3f}s)'), threading.current_thread().name)
+        else:
+            with cls._retry_lock:
+                attempts = cls.attempts.setdefault(task.script, {})
+                attempts[task.hash()] = attempts.get(task.hash(), 0) + 1
+
+                if attempts[task.hash()] > storage.retry.attempts:
+                    del attempts[task.hash()]
+                    if cls.dead_letter.maxlen != storage.retry.dead_letter_size:
+                        cls.dead_letter = collections.deque(cls.dead_letter, maxlen=storage.retry.dead_letter_size)
+                    cls.dead_letter.append((time.time(), task, reason))
+                    cls._log.warn(codes.Code(30915, task), threading.current_thread().name)
+                    return
+
+            cls._log.warn(codes.Code(30914, f'{task} (in {delay:.3f}s)'), threading.current_thread().name)
+
+        cls.defer(task, time.time() + delay)
+
+    @classmethod
+    def succeed(cls, task: Union[api.CatalogType, api.TargetType]) -> None:
+        with cls._retry_lock:
+            cls.failures.pop(task.script, None)
+            if not issubclass(type(task), api.Catalog) and task.script in cls.attempts:
+                cls.attempts[task.script].pop(task.hash(), None)
+                if not cls.attempts[task.script]:
+                    del cls.attempts[task.script]
+
+    @classmethod
+    def revive(cls, index: int = -1) -> int:  # Move targets from dead-letter list back to schedule
+        with cls._retry_lock:
+            if index < 0:
+                revived = [i[1] for i in cls.dead_letter]
+                cls.dead_letter.clear()
+            else:
+                revived = [cls.dead_letter[index][1]]
+                del cls.dead_letter[index]
+
+        for i in revived:
+            cls.defer(i, time.time())
+        return len(revived)
+
+    @classmethod
+    def clear_dead_letters(cls) -> int:  # Drop all targets from dead-letter list, returns their count
+        with cls._retry_lock:
+            count = len(cls.dead_letter)
+            cls.dead_letter.clear()
+        return count
+
+    @classmethod
+    def measure(cls, task: Union[api.CatalogType, api.TargetType], lateness: float) -> None:
+        with cls._histograms_lock:
+            for k, v in (('classes', type(task).__name__), ('scripts', task.script)):
+                if v not in cls.histograms[k]:
+                    cls.histograms[k][v] = Histogram()
+                cls.histograms[k][v].add(lateness)
+
+    @classmethod
+    def forecast(cls, window: float, count: int) -> Dict[str, List[int]]:
+        # Count of catalogs and targets which will be due in each of next count windows (first is overdue tasks)
+        now = time.time()
+        result = {'catalogs': [0] * (count + 1), 'targets': [0] * (count + 1)}
+        for k, lock, schedule in (
+                ('catalogs', cls._catalog_lock, cls.catalogs),
+                ('targets', cls._target_lock, cls.targets)
+        ):
+            with lock:
+                times = [i[0] for i in schedule]
+            for i in times:
+                if i <= now:
+                    result[k][0] += 1
+                elif (index := int((i - now) // window) + 1) <= count:
+                    result[k][index] += 1
+        return result
+
+    @classmethod
+    def dump(cls) -> int:  # Save schedules and queues to cache/schedule.pickle
+        now = time.time()
+        with cls._catalog_lock:
+            catalogs = list(cls.catalogs.items())
+        with cls._target_lock:
+            targets = list(cls.targets.items())
+        with cls._held_lock:
+            for i in cls.held.values():
+                for time_, task in i:
+                    (catalogs if cls.mode(task) == 0 else targets).append(((time_, 0), task))
+        for i in (*cls.catalog_queue.items(), *cls.target_queue.items(), *cls.lane_queue.items()):
+            (catalogs if cls.mode(i.content) == 0 else targets).append(((now, 0), i.content))
+
+        snapshot = {
+            'time': now,
+            'hashes': script_manager.hash(),
+            'catalogs': [],
+            'targets': []
+        }
+        for k, v in (('catalogs', catalogs), ('targets', targets)):
+            for (time_, _), task in v:
+                try:
+                    snapshot[k].append((time_, task.script, pickle.dumps(task, pickle.HIGHEST_PROTOCOL)))
+                except Exception as e:
+                    cls._log.warn(codes.Code(30916, f'{task}: {e.__class__.__name__}: {e!s}'))
+
+        if not os.path.isdir(storage.cache.path):
+            os.makedirs(storage.cache.path)
+        with open(f'{storage.cache.path}/schedule.pickle.tmp', 'wb') as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{storage.cache.path}/schedule.pickle.tmp', f'{storage.cache.path}/schedule.pickle')
+
+        cls._log.info(codes.Code(
+            20903, f'{len(snapshot["catalogs"])} catalog(s), {len(snapshot["targets"])} target(s)'
+        ))
+        return len(snapshot['catalogs']) + len(snapshot['targets'])
+
+    @staticmethod
+    def rebase(task: Union[api.CatalogType, api.TargetType], time_: float, delta: float) -> Optional[float]:
+        # New due time of restored task (None if task expired)
+        now = time.time()
+        if isinstance(task, Scheduled):
+            return task.timestamp if task.timestamp > now else None
+        elif isinstance(task, Smart):
+            if task.expired:  # Final slot (gen.time) was scheduled, task waits for it
+                return task.gen.time if task.gen.time > now else None
+            if (next_ := task.gen.extract()) <= now:
+                return None
+            if next_ == task.gen.time:
+                task.expired = True
+            return max(min(time_, next_), now)
+        elif isinstance(task, Interval):  # Keep time left to execution
+            return max(min(time_ + delta, now + task.interval), now)
+        else:
+            return now
+
+    @classmethod
+    def load(cls) -> Dict[str, str]:  # Restore schedules from cache/schedule.pickle, returns restored scripts hashes
+        try:
+            with open(f'{storage.cache.path}/schedule.pickle', 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            cls._log.warn(codes.Code(30917, f'{e.__class__.__name__}: {e!s}'))
+            return {}
+
+        hashes = script_manager.hash()
+        delta = time.time() - snapshot['time']
+        restored = {}
+        count = 0
+
+        for k, (time_, script, blob) in [(0, i) for i in snapshot['catalogs']] + [(1, i) for i in snapshot['targets']]:
+            if script not in hashes or (k == 0 and snapshot['hashes'].get(script) != hashes[script]):
+                continue  # Script not loaded or catalog of changed script
+
+            try:
+                task = pickle.loads(blob)
+            except Exception as e:
+                cls._log.warn(codes.Code(30916, f'{script}: {e.__class__.__name__}: {e!s}'))
+                continue
+
+            if (new := cls.rebase(task, time_, delta)) is None:
+                if k == 0:  # Catalog must always come back to schedule
+                    new = time.time()
+                else:
+                    continue
+
+            if k == 0:
+                restored[script] = hashes[script]
+            cls.defer(task, new)
+            count += 1
+
+        cls._log.info(codes.Code(20904, f'{count} task(s)'))
+        return restored
 
     @classmethod
     def remove_catalog(cls, script: str):
         if not isinstance(script, str):
             raise TypeError('script must be str')
 
-        with cls._catalog_lock, cls.catalog_queue.mutex:
-            schedule_id = -1
-            queue_id = -1
-
-            for k, v in cls.catalogs.items():
-                if v.script == script:
-                    schedule_id = k
-
-            for i, v in enumerate(cls.catalog_queue.queue):
-                if v.content.script == script:
-                    queue_id = i
+        with cls._catalog_lock:
+            cls.catalogs.pop_script(script)
+            cancelled = cls.catalog_queue.cancel(script)
+            cancelled += cls.lane_queue.cancel(script, lambda i: issubclass(type(i), api.Catalog))
+        cls.drop_held(script, True)
+        cls.limiter.release(script, cancelled)  # Outside of lock, release wakes pipe which takes schedule locks
 
-            cls.catalogs.pop(schedule_id) if schedule_id > -1 else ...
-            cls.catalog_queue.queue.pop(queue_id) if queue_id > -1 else ...
+        with cls._retry_lock:
+            cls.failures.pop(script, None)
 
     @classmethod
     def remove_targets(cls, script: str):  # TODO: Check from core
         if not isinstance(script, str):
             raise TypeError('script must be str')
 
-        with cls._target_lock, cls.target_queue.mutex:
-            schedule_ids = []
-            queue_ids = []
-
-            for k, v in cls.targets.items():
-                if v.script == script:
-                    schedule_ids.append(k)
+        with cls._target_lock:
+            cls.targets.pop_script(script)
+            cancelled = cls.target_queue.cancel(script)
+            cancelled += cls.lane_queue.cancel(script, lambda i: not issubclass(type(i), api.Catalog))
+        cls.drop_held(script, False)
+        cls.limiter.release(script, cancelled)  # Outside of lock, release wakes pipe which takes schedule locks
 
-            for i, v in enumerate(cls.target_queue.queue):
-                if v.content.script == script:
-                    queue_ids.append(i)
+        with cls._retry_lock:
+            cls.attempts.pop(script, None)
 
-            for i in schedule_ids:
-                cls.targets.pop(i)
+    @classmethod
+    def wake(cls, time_: float) -> None:
+        with cls._wakeup:
+            if time_ < cls._deadline:  # Pipe sleeps longer than needed
+                cls._deadline = time_
+                cls._wakeup.notify_all()
 
-            for i in queue_ids:
-                cls.target_queue.queue.pop(i)
+    @classmethod
+    def wait(cls, timeout: float) -> None:
+        with cls._wakeup:
+            with cls._catalog_lock:
+                catalog = cls.catalogs.next_time()
+            with cls._target_lock:
+                target = cls.targets.next_time()
+            with cls._held_lock:
+                held = min(cls.held_until.values(), default=None)
+
+            cls._deadline = min(i for i in (catalog, target, held, time.time() + timeout) if i is not None)
+
+            while (delta := cls._deadline - time.time()) > 0:
+                if not cls._wakeup.wait(delta):
+                    break
+            cls._deadline = 0.
 
     @classmethod
-    def get_catalogs(cls) -> List[api.CatalogType]:
+    def get_catalogs(cls) -> List[Tuple[float, api.CatalogType]]:
         with cls._catalog_lock:
-            time_ = time.time()
             catalogs = []
-            if any(cls.catalogs[:time_]):
-                for k, v in cls.catalogs[:time_]:
-                    if v.script in script_manager.scripts and v.script in script_manager.parsers:
-                        catalogs.append(v)
-                    elif v.script not in script_manager.scripts:
-                        cls._log.warn(codes.Code(30901, v), threading.current_thread().name)
-                    elif v.script not in script_manager.parsers:
-                        cls._log.warn(codes.Code(30902, v), threading.current_thread().name)
-                del cls.catalogs[:time_]
+            for k, v in cls.catalogs.pop_due(time.time()):
+                if v.script in script_manager.scripts and v.script in script_manager.parsers:
+                    catalogs.append((k, v))
+                elif v.script not in script_manager.scripts:
+                    cls._log.warn(codes.Code(30901, v), threading.current_thread().name)
+                elif v.script not in script_manager.parsers:
+                    cls._log.warn(codes.Code(30902, v), threading.current_thread().name)
             return catalogs
 
     @classmethod
-    def get_targets(cls) -> List[Union[api.TargetType, api.RestockTargetType]]:
+    def get_targets(cls) -> List[Tuple[float, Union[api.TargetType, api.RestockTargetType]]]:
         with cls._target_lock:
-            time_ = time.time()
             targets = []
-            if any(cls.targets[:time_]):
-                for k, v in cls.targets[:time_]:
-                    if v.script in script_manager.scripts and v.script in script_manager.parsers:
-                        targets.append(v)
-                    elif v.script not in script_manager.scripts:
-                        cls._log.warn(codes.Code(30903, v), threading.current_thread().name)
-                    elif v.script not in script_manager.parsers:
-                        cls._log.warn(codes.Code(30904, v), threading.current_thread().name)
-                del cls.targets[:time_]
+            for k, v in cls.targets.pop_due(time.time()):
+                if v.script in script_manager.scripts and v.script in script_manager.parsers:
+                    targets.append((k, v))
+                elif v.script not in script_manager.scripts:
+                    cls._log.warn(codes.Code(30903, v), threading.current_thread().name)
+                elif v.script not in script_manager.parsers:
+                    cls._log.warn(codes.Code(30904, v), threading.current_thread().name)
             return targets
 
     @classmethod
-    def execute(cls, mode: int = 0) -> Tuple[int, str]:
+    def choose(cls, mode: int, assist: bool, weight: float) -> int:
+        if not assist:
+            return mode
+
+        own = (cls.catalog_queue if mode == 0 else cls.target_queue).head()
+        other = (cls.target_queue if mode == 0 else cls.catalog_queue).head()
+
+        if other is None:
+            return mode
+        elif own is None:
+            return 1 - mode
+        else:
+            # Urgency of queue is the age of its next task weighted by task priority (lower value is more urgent)
+            now = time.time()
+            if weight * (now - other[1]) / max(other[0], 1) > (now - own[1]) / max(own[0], 1):
+                return 1 - mode
+            else:
+                return mode
+
+    @classmethod
+    def acquire(cls, mode: int = 0, timeout: float = 0.) -> Union[api.CatalogType, api.TargetType, None]:
         try:
             if mode == 0:
-                task: api.CatalogType = cls.catalog_queue.get_nowait().content
+                return cls.catalog_queue.get(timeout > 0, timeout if timeout > 0 else None).content
             elif mode == 1:
-                task: api.TargetType = cls.target_queue.get_nowait().content
+                return cls.target_queue.get(timeout > 0, timeout if timeout > 0 else None).content
+            elif mode == 2:
+                return cls.lane_queue.get(timeout > 0, timeout if timeout > 0 else None).content
             else:
                 raise ValueError(f'Unknown mode ({mode})')
         except queue.Empty:
+            return None
+
+    @classmethod
+    def execute(cls, mode: int = 0, timeout: float = 0.) -> Tuple[int, str]:
+        if (task := cls.acquire(mode, timeout)) is not None:
+            return cls.process(cls.mode(task) if mode == 2 else mode, task)
+        else:
             return 0, ''
 
+    @classmethod
+    def process(cls, mode: int, task: Union[api.CatalogType, api.TargetType]) -> Tuple[int, str]:
+        with cls._watch_lock:
+            cls.running[threading.get_ident()] = (time.time(), cls.deadline(task), mode, task)
+        try:
+            return cls._process(mode, task)
+        finally:
+            with cls._watch_lock:
+                cls.running.pop(threading.get_ident(), None)
+                abandoned = threading.get_ident() in cls.abandoned
+                cls.abandoned.discard(threading.get_ident())
+            if not abandoned:  # Otherwise slot was already released by watchdog
+                cls.limiter.release(task.script)
+
+    @classmethod
+    def overdue(cls) -> List[int]:  # Idents of threads executing task longer than its deadline
+        with cls._watch_lock:
+            return [k for k, v in cls.running.items() if 0 < v[1] < time.time() - v[0] and k not in cls.abandoned]
+
+    @classmethod
+    def abandon(cls, ident: int) -> bool:  # Fail task of hung thread, late result of task will be discarded
+        with cls._watch_lock:
+            if ident not in cls.running or ident in cls.abandoned:
+                return False
+            start, _, mode, task = cls.running[ident]
+            cls.abandoned.add(ident)
+
+        cls.limiter.release(task.script)
+        cls._expired(mode, task, time.time() - start)
+        return True
+
+    @classmethod
+    def _expired(cls, mode: int, task: Union[api.CatalogType, api.TargetType], elapsed: float) -> None:
+        cls.expired += 1
+        code = codes.Code(40905, f'{task.script}: {task} ({elapsed:.3f}s)')
+        cls._log.error(code, threading.current_thread().name)
+        script_manager.event_handler.alert(code, threading.current_thread().name)
+        try:
+            script_manager.parser_error(task.script)
+        except scripts.ScriptNotFound:
+            return
+        cls.retry(task, f'Deadline exceeded ({elapsed:.3f}s)')
+
+    @classmethod
+    async def process_async(
+            cls,
+            mode: int,
+            task: Union[api.CatalogType, api.TargetType],
+            executor: Executor = None
+    ) -> Tuple[int, str]:
+        try:
+            cls._executing(mode, task)
+            start = time.time()
+            try:
+                result = await asyncio.wait_for(
+                    script_manager.execute_parser_async(task.script, 'execute', (mode, task), executor),
+                    cls.deadline(task) or None
+                )
+            except asyncio.TimeoutError:
+                cls._expired(mode, task, time.time() - start)
+                return 6, task.script
+            except Exception as e:
+                return cls._failed(mode, task, e)
+            return cls._result(mode, task, result)
+        finally:
+            cls.limiter.release(task.script)
+
+    @classmethod
+    def _process(cls, mode: int, task: Union[api.CatalogType, api.TargetType]) -> Tuple[int, str]:
+        cls._executing(mode, task)
+        try:
+            result = script_manager.execute_parser(task.script, 'execute', (mode, task))
+        except Exception as e:
+            if cls._finish():
+                return cls._failed(mode, task, e)
+        else:
+            if cls._finish():
+                return cls._result(mode, task, result)
+
+        cls._log.warn(codes.Code(30918, task), threading.current_thread().name)  # Task was already failed by watchdog
+        return 6, task.script
+
+    @classmethod
+    def _finish(cls) -> bool:  # Stop watching task of current thread, returns False if thread was abandoned
+        with cls._watch_lock:
+            cls.running.pop(threading.get_ident(), None)
+            return threading.get_ident() not in cls.abandoned
+
+    @classmethod
+    def _executing(cls, mode: int, task: Union[api.CatalogType, api.TargetType]) -> None:
         if mode == 0:
             cls._log.debug(codes.Code(10901, task), threading.current_thread().name)
         elif mode == 1:
             cls._log.debug(codes.Code(10902, task), threading.current_thread().name)
 
-        try:
-            result: list = script_manager.execute_parser(task.script, 'execute', (mode, task))
-
-            if not isinstance(result, list):
-                if mode == 0:
-                    cls._log.error(codes.Code(30907, task), threading.current_thread().name)
-                elif mode == 1:
-                    cls._log.error(codes.Code(30910, task), threading.current_thread().name)
-                script_manager.parser_error(task.script)
-                return 1, task.script
-        except scripts.ScriptNotFound:
+    @classmethod
+    def _failed(cls, mode: int, task: Union[api.CatalogType, api.TargetType], e: Exception) -> Tuple[int, str]:
+        if isinstance(e, scripts.ScriptNotFound):
             if mode == 0:
                 cls._log.warn(codes.Code(30905, task), threading.current_thread().name)
             elif mode == 1:
                 cls._log.warn(codes.Code(30908, task), threading.current_thread().name)
             return 2, task.script
-        except scripts.ParserImplementationError:
+        elif isinstance(e, scripts.ParserImplementationError):
             if mode == 0:
                 cls._log.warn(codes.Code(30906, task), threading.current_thread().name)
             elif mode == 1:
                 cls._log.warn(codes.Code(30909, task), threading.current_thread().name)
             return 3, task.script
-        except Exception as e:
+        else:
             if mode == 0:
                 code = 40903
             elif mode == 1:
@@ -329,34 +789,46 @@ class Resolver:
 
             cls._log.fatal_msg(
                 codes.Code(code, f'{task.script}: {e.__class__.__name__}: {e!s}'),
-                traceback.format_exc(),
+                ''.join(traceback.format_exception(type(e), e, e.__traceback__)),
                 threading.current_thread().name
             )
             script_manager.event_handler.alert(codes.Code(code, f'{task.script}: {e.__class__.__name__}: {e!s}'),
                                                threading.current_thread().name)
+            cls.retry(task, f'{e.__class__.__name__}: {e!s}')
             return 4, task.script
 
+    @classmethod
+    def _result(cls, mode: int, task: Union[api.CatalogType, api.TargetType], result: list) -> Tuple[int, str]:
+        if not isinstance(result, list):
+            if mode == 0:
+                cls._log.error(codes.Code(30907, task), threading.current_thread().name)
+            elif mode == 1:
+                cls._log.error(codes.Code(30910, task), threading.current_thread().name)
+            try:
+                script_manager.parser_error(task.script)
+            except scripts.ScriptNotFound as e:
+                return cls._failed(mode, task, e)
+            cls.retry(task, f'Bad result ({type(result).__name__})')
+            return 1, task.script
+
+        cls.succeed(task)
+
         catalog: Optional[api.CatalogType] = None
         targets: List[api.TargetType] = []
 
+        # New items of result are checked and added at once, events are still sent in order of result
+        added: Dict[int, Optional[int]] = {
+            id(i[0]): i[1] for i in HashStorage.add_items([i for i in result if issubclass(type(i), api.Item)])
+        }
+
         for i in result:
             if issubclass(type(i), api.Item):
-                if isinstance(i, api.IAnnounce):
-                    if HashStorage.check_item(i.hash(3), True):
-                        HashStorage.add_announced_item(i.hash(3))
-                        script_manager.event_handler.item(i)
-                elif isinstance(i, api.IRelease):
-                    if HashStorage.check_item(i.hash(4)):
-                        id_ = HashStorage.add_item(i)
-                        script_manager.event_handler.item(i)
-
-                        if i.restock:
-                            i.restock.id = id_
-                            targets.append(i.restock)
-                elif isinstance(i, api.IRestock):
-                    if HashStorage.check_item_id(i.id):
-                        HashStorage.add_item(i, True)
-                        script_manager.event_handler.item(i)
+                if id(i) in added:
+                    script_manager.event_handler.item(i)
+
+                    if isinstance(i, api.IRelease) and i.restock:
+                        i.restock.item = added[id(i)]
+                        targets.append(i.restock)
             elif issubclass(type(i), api.Catalog):
                 if not catalog:
                     catalog = i
@@ -376,8 +848,8 @@ class Resolver:
             cls.remove_catalog(catalog.script)
             cls.insert_catalog(catalog)
 
-        for i in targets:
-            cls.insert_target(i)
+        if targets:
+            cls.insert_targets(targets)
 
         if mode == 0:
             cls._log.debug(codes.Code(10903), threading.current_thread().name)
@@ -389,10 +861,34 @@ class Resolver:
 
 class Pipe(ThreadClass):
     parsers_hashes: Dict[str, str]
+    last_check: float
+    last_snapshot: float
+    lateness: Tuple[collections.deque, collections.deque, collections.deque]
+    overload: List[float]
+    deferred: List[int]
+    shed_count: List[int]
+    limited: List[int]
 
     def __init__(self):
         super().__init__('P', PipeError)
         self.parsers_hashes = {}
+        self.last_check = 0.
+        self.last_snapshot = time.time()
+        # (time, lateness) pairs for catalogs, targets and lane
+        self.lateness = (collections.deque(maxlen=1024), collections.deque(maxlen=1024), collections.deque(maxlen=1024))
+        self.overload = [0., 0., 0.]  # Time since queues are full
+        self.deferred = [0, 0]
+        self.shed_count = [0, 0]
+        self.limited = [0, 0]
+
+    def measure(self, lane: int, time_: float, task: Union[api.CatalogType, api.TargetType]) -> None:
+        self.lateness[lane].append((time.time(), time.time() - time_))
+        resolver.measure(task, time.time() - time_)
+
+    def recent_lateness(self, mode: int, period: float) -> float:  # Average dispatch lateness for last period
+        now = time.time()
+        recent = [i[1] for i in tuple(self.lateness[mode]) if i[0] >= now - period]
+        return sum(recent) / len(recent) if recent else 0.
 
     @staticmethod
     def _compare_parsers(old: Dict[str, str], new: Dict[str, str]):
@@ -405,50 +901,118 @@ class Pipe(ThreadClass):
                 different.append(i)
         return different
 
+    def check(self) -> None:
+        HashStorage.cleanup()  # Cleanup expired hashes
+
+        if 0 < storage.cache.snapshot <= time.time() - self.last_snapshot:  # Periodic schedule snapshot
+            self.last_snapshot = time.time()
+            try:
+                resolver.dump()
+            except Exception as e:
+                self._log.error(codes.Code(40302, f'{e.__class__.__name__}: {e!s}'))
+
+        if different := self._compare_parsers(
+                self.parsers_hashes, script_manager.hash()):  # Check for scripts (loaded/unloaded)
+            with script_manager.lock:
+                self._log.info(codes.Code(20301))
+                for i in different:
+                    self._log.debug(codes.Code(10301, i))
+                    try:
+                        if issubclass(type(catalog := script_manager.parsers[i].catalog), api.Catalog):
+                            resolver.insert_catalog(catalog, True)
+                            self._log.info(codes.Code(20303, i))
+                        else:
+                            self._log.error(codes.Code(40301, i))
+                    except Exception as e:
+                        self._log.warn(codes.Code(30301, f'{i}: {e.__class__.__name__}: {e!s}'))
+                self.parsers_hashes = script_manager.hash()
+                self._log.info(codes.Code(20302))
+        elif self.parsers_hashes != script_manager.hash():
+            self.parsers_hashes = script_manager.hash()
+
+    def overloaded(self, lane: int) -> bool:  # Queue is full for longer than shed_after
+        if resolver.queue(lane).full():
+            if not self.overload[lane]:
+                self.overload[lane] = time.time()
+            return time.time() - self.overload[lane] >= storage.pipe.shed_after
+        else:
+            self.overload[lane] = 0.
+            return False
+
+    def shed(self, mode: int, task: Union[api.CatalogType, api.TargetType]) -> None:
+        # Skip current execution of Interval task, it will be executed on next interval
+        resolver.defer(task, time.time() + task.interval)
+        self.shed_count[mode] += 1
+        self._log.warn(codes.Code(30304, task))
+
+    def dispatch(self, mode: int, time_: float, task: Union[api.CatalogType, api.TargetType],
+                 acquired: bool = False) -> bool:  # Returns False if task is deferred because queue is full
+        if not acquired:
+            if task.script in resolver.held:  # Keep order of due time behind held tasks of script
+                resolver.hold(time_, task, None)
+                self.limited[mode] += 1
+                return True
+            elif (delay := resolver.limit(task)) != 0:  # Script limits exceeded
+                resolver.hold(time_, task, delay)
+                self.limited[mode] += 1
+                return True
+
+        lane = 2 if resolver.lane(task) else mode
+        queue_ = resolver.queue(lane)
+        item = PrioritizedItem(
+            resolver.catalog_priority(task) if mode == 0 else resolver.target_priority(task),
+            task,
+            resolver.weight(task),
+            resolver.group(task)
+        )
+
+        try:
+            queue_.put_nowait(item)  # Pipe never blocks on full queue
+        except queue.Full:
+            if self.overloaded(lane):  # Sustained overload, shed the lowest-priority Interval work first
+                if isinstance(task, Interval):
+                    resolver.limiter.release(task.script, refund=True)
+                    self.shed(mode, task)
+                    return True
+                elif (evicted := queue_.pop_last(lambda i: isinstance(i, Interval))) is not None:
+                    resolver.limiter.release(evicted.content.script, refund=True)
+                    self.shed(mode, evicted.content)
+                    try:
+                        queue_.put_nowait(item)
+                    except queue.Full:
+                        pass
+                    else:
+                        self.measure(lane, time_, task)
+                        return True
+
+            resolver.limiter.release(task.script, refund=True)
+            resolver.defer(task, time.time() + storage.pipe.defer)
+            self.deferred[mode] += 1
+            self._log.debug(codes.Code(30302 if mode == 0 else 30303, task))
+            return False
+        else:
+            self.overload[lane] = 0.
+            self.measure(lane, time_, task)
+            return True
+
     def run(self) -> None:
         self.state = 1
         while True:
-            start: float = time.time()
             if self.state == 1:  # Active state
                 try:
-                    HashStorage.cleanup()  # Cleanup expired hashes
-
-                    if different := self._compare_parsers(
-                            self.parsers_hashes, script_manager.hash()):  # Check for scripts (loaded/unloaded)
-                        with script_manager.lock:
-                            self._log.info(codes.Code(20301))
-                            for i in different:
-                                self._log.debug(codes.Code(10301, i))
-                                try:
-                                    if issubclass(type(catalog := script_manager.parsers[i].catalog), api.Catalog):
-                                        resolver.insert_catalog(catalog, True)
-                                        self._log.info(codes.Code(20303, i))
-                                    else:
-                                        self._log.error(codes.Code(40301, i))
-                                except Exception as e:
-                                    self._log.warn(codes.Code(30301, f'{i}: {e.__class__.__name__}: {e!s}'))
-                            self.parsers_hashes = script_manager.hash()
-                            self._log.info(codes.Code(20302))
-                    elif self.parsers_hashes != script_manager.hash():
-                        self.parsers_hashes = script_manager.hash()
-
-                    for i in resolver.get_catalogs():  # Send catalogs
-                        try:
-                            resolver.catalog_queue.put(
-                                PrioritizedItem(resolver.catalog_priority(i), i),
-                                timeout=storage.queues.catalog_queue_size
-                            )
-                        except queue.Full:  # TODO: Fix (catalog can't be lost)
-                            self._log.warn(codes.Code(30302, i))
-
-                    for i in resolver.get_targets():  # Send targets
-                        try:
-                            resolver.target_queue.put(
-                                PrioritizedItem(resolver.target_priority(i), i),
-                                timeout=storage.queues.target_queue_put_wait
-                            )
-                        except queue.Full:
-                            self._log.warn(codes.Code(30303, i))
+                    if time.time() - self.last_check >= storage.pipe.tick:
+                        self.last_check = time.time()
+                        self.check()
+
+                    for k, i in resolver.get_catalogs():  # Send catalogs
+                        self.dispatch(0, k, i)
+
+                    for k, i in resolver.get_targets():  # Send targets
+                        self.dispatch(1, k, i)
+
+                    for i in resolver.releasable():  # Send held tasks while limits of their scripts allow it
+                        while (entry := resolver.unhold(i)) and self.dispatch(resolver.mode(entry[1]), *entry, True):
+                            pass
 
                 except Exception as e:
                     self.throw(codes.Code(50301, f'While working: {e.__class__.__name__}: {e!s}'))
@@ -464,8 +1028,11 @@ class Pipe(ThreadClass):
             elif self.state == 5:  # Stopping state
                 self._log.info(codes.Code(20005))
                 break
-            delta: float = time.time() - start
-            time.sleep(storage.pipe.tick - delta if storage.pipe.tick - delta > 0 else 0)
+
+            if self.state == 1:  # Sleep until the earliest deadline (or insertion of earlier one)
+                resolver.wait(storage.pipe.tick - (time.time() - self.last_check))
+            else:
+                time.sleep(storage.pipe.tick)
 
 
 class Worker(ThreadClass):
@@ -474,6 +1041,12 @@ class Worker(ThreadClass):
     speed: float
     idle: bool
     last_tick: float
+    done: collections.deque
+    busy: float
+    task_start: float  # Start time of current task (0 if worker waits for task)
+
+    tasks: List[int] = [0, 0]  # Executed catalogs and targets by all workers
+    tasks_lock: threading.Lock = threading.Lock()
 
     def __init__(self, id_: int):
         super().__init__(f'W-{id_}', WorkerError)
@@ -482,6 +1055,29 @@ class Worker(ThreadClass):
         self.idle = True
         self.start_time = time.time()
         self.last_tick = 0
+        self.done = collections.deque()
+        self.busy = 0.
+        self.task_start = 0.
+
+    def execute(self, mode: int, timeout: float = 0.) -> int:
+        if (task := resolver.acquire(mode, timeout)) is not None:
+            start = self.task_start = time.time()
+            try:
+                return resolver.process(mode, task)[0]
+            finally:
+                self.busy += time.time() - start  # Time spent on execution (without waiting)
+                self.task_start = 0.
+                with self.tasks_lock:
+                    self.tasks[mode] += 1
+        else:
+            return 0
+
+    def measure(self, executed: bool) -> None:  # Tasks per second for the last speed_window seconds
+        if executed:
+            self.done.append(self.last_tick)
+        while self.done and self.done[0] < self.last_tick - storage.worker.speed_window:
+            self.done.popleft()
+        self.speed = round(len(self.done) / storage.worker.speed_window, 3)
 
     def run(self) -> None:
         self.state = 1
@@ -489,10 +1085,18 @@ class Worker(ThreadClass):
             start = self.last_tick = time.time()
             if self.state == 1:
                 try:
-                    if resolver.execute(1)[0] > 1:
+                    if (code := self.execute(
+                            resolver.choose(1, storage.worker.assist, storage.worker.assist_weight)
+                    )) < 1 and storage.worker.blocking:
+                        # Nothing to do, wait for task up to tick, so state changes are still handled in time
+                        code = self.execute(1, storage.worker.tick)
+
+                    if code > 1:
                         self.idle = False
                     else:
                         self.idle = True
+                    self.last_tick = time.time()
+                    self.measure(code > 0)
                 except Exception as e:
                     self.throw(codes.Code(50401, f'While working: {e.__class__.__name__}: {e!s}'))
                     break
@@ -507,9 +1111,10 @@ class Worker(ThreadClass):
             elif self.state == 5:  # Stopping state
                 self._log.info(codes.Code(20005))
                 break
-            delta: float = time.time() - start
-            self.speed = 0 if self.idle else round(1 / delta, 3)
-            time.sleep(storage.worker.tick - delta if storage.worker.tick - delta > 0 else 0)
+
+            if self.state != 1 or not storage.worker.blocking:
+                delta: float = time.time() - start
+                time.sleep(storage.worker.tick - delta if storage.worker.tick - delta > 0 else 0)
 
 
 class CatalogWorker(ThreadClass):
@@ -518,6 +1123,12 @@ class CatalogWorker(ThreadClass):
     speed: float
     idle: bool
     last_tick: float
+    done: collections.deque
+    busy: float
+    task_start: float  # Start time of current task (0 if worker waits for task)
+
+    tasks: List[int] = [0, 0]  # Executed catalogs and targets by all catalog workers
+    tasks_lock: threading.Lock = threading.Lock()
 
     def __init__(self, id_: int):
         super().__init__(f'CW-{id_}', CatalogWorkerError)
@@ -526,6 +1137,29 @@ class CatalogWorker(ThreadClass):
         self.idle = True
         self.start_time = time.time()
         self.last_tick = 0
+        self.done = collections.deque()
+        self.busy = 0.
+        self.task_start = 0.
+
+    def execute(self, mode: int, timeout: float = 0.) -> int:
+        if (task := resolver.acquire(mode, timeout)) is not None:
+            start = self.task_start = time.time()
+            try:
+                return resolver.process(mode, task)[0]
+            finally:
+                self.busy += time.time() - start
+                self.task_start = 0.
+                with self.tasks_lock:
+                    self.tasks[mode] += 1
+        else:
+            return 0
+
+    def measure(self, executed: bool) -> None:  # Tasks per second for the last speed_window seconds
+        if executed:
+            self.done.append(self.last_tick)
+        while self.done and self.done[0] < self.last_tick - storage.catalog_worker.speed_window:
+            self.done.popleft()
+        self.speed = round(len(self.done) / storage.catalog_worker.speed_window, 3)
 
     def run(self):
         self._state = 1
@@ -533,13 +1167,18 @@ class CatalogWorker(ThreadClass):
             start = self.last_tick = time.time()
             if self.state == 1:
                 try:
-                    if resolver.execute()[0] < 1:
-                        if resolver.execute(1)[0] > 1:  # TODO: Switcher for assistance
-                            self.idle = False
-                        else:
-                            self.idle = True
-                    else:
+                    if (code := self.execute(
+                            resolver.choose(0, storage.catalog_worker.assist, storage.catalog_worker.assist_weight)
+                    )) < 1 and storage.catalog_worker.blocking:
+                        # Nothing to do, wait for catalog up to tick
+                        code = self.execute(0, storage.catalog_worker.tick)
+
+                    if code > 1:
                         self.idle = False
+                    else:
+                        self.idle = True
+                    self.last_tick = time.time()
+                    self.measure(code > 0)
                 except Exception as e:
                     self.throw(codes.Code(51001, f'While working: {e.__class__.__name__}: {e!s}'))
                     break
@@ -554,9 +1193,229 @@ class CatalogWorker(ThreadClass):
             elif self.state == 5:  # Stopping state
                 self._log.info(codes.Code(20005))
                 break
-            delta: float = time.time() - start
-            self.speed = 0 if self.idle else round(1 / delta, 3)
-            time.sleep(storage.catalog_worker.tick - delta if storage.catalog_worker.tick - delta > 0 else 0)
+
+            if self.state != 1 or not storage.catalog_worker.blocking:
+                delta: float = time.time() - start
+                time.sleep(storage.catalog_worker.tick - delta if storage.catalog_worker.tick - delta > 0 else 0)
+
+
+class LaneWorker(ThreadClass):
+    id: int
+    start_time: float
+    speed: float
+    idle: bool
+    last_tick: float
+    done: collections.deque
+    busy: float
+    task_start: float  # Start time of current task (0 if worker waits for task)
+
+    tasks: List[int] = [0, 0]  # Executed catalogs and targets by all lane workers
+    borrowed: int = 0  # Executed tasks from other queues by all lane workers
+    borrowing: int = 0  # Lane workers which are executing tasks from other queues now
+    tasks_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, id_: int):
+        super().__init__(f'LW-{id_}', LaneWorkerError)
+        self.id = id_
+        self.speed = .0
+        self.idle = True
+        self.start_time = time.time()
+        self.last_tick = 0
+        self.done = collections.deque()
+        self.busy = 0.
+        self.task_start = 0.
+
+    def execute(self, mode: int, timeout: float = 0.) -> int:
+        if (task := resolver.acquire(mode, timeout)) is not None:
+            start = self.task_start = time.time()
+            try:
+                return resolver.process(resolver.mode(task), task)[0]
+            finally:
+                self.busy += time.time() - start
+                self.task_start = 0.
+                with self.tasks_lock:
+                    self.tasks[resolver.mode(task)] += 1
+                    if mode != 2:
+                        LaneWorker.borrowed += 1
+        else:
+            return 0
+
+    def borrow(self) -> int:  # Execute task from other queue if lane is idle and reserve is kept
+        with self.tasks_lock:
+            if not storage.lane.borrow or LaneWorker.borrowing >= max(storage.lane.count, 1) - storage.lane.reserve:
+                return 0
+            LaneWorker.borrowing += 1
+
+        try:
+            return self.execute(resolver.choose(1, True, 1.))
+        finally:
+            with self.tasks_lock:
+                LaneWorker.borrowing -= 1
+
+    def measure(self, executed: bool) -> None:  # Tasks per second for the last speed_window seconds
+        if executed:
+            self.done.append(self.last_tick)
+        while self.done and self.done[0] < self.last_tick - storage.lane.speed_window:
+            self.done.popleft()
+        self.speed = round(len(self.done) / storage.lane.speed_window, 3)
+
+    def run(self):
+        self._state = 1
+        while True:
+            start = self.last_tick = time.time()
+            if self.state == 1:
+                try:
+                    if (code := self.execute(2)) < 1 and (code := self.borrow()) < 1:
+                        # Nothing to do, wait for time-critical task up to tick
+                        code = self.execute(2, storage.lane.tick)
+
+                    if code > 1:
+                        self.idle = False
+                    else:
+                        self.idle = True
+                    self.last_tick = time.time()
+                    self.measure(code > 0)
+                except Exception as e:
+                    self.throw(codes.Code(51601, f'While working: {e.__class__.__name__}: {e!s}'))
+                    break
+            elif self.state == 2:  # Pausing state
+                self._log.info(codes.Code(20002))
+                self._state = 3
+            elif self.state == 3:  # Paused state
+                pass
+            elif self.state == 4:  # Resuming state
+                self._log.info(codes.Code(20003))
+                self._state = 1
+            elif self.state == 5:  # Stopping state
+                self._log.info(codes.Code(20005))
+                break
+
+            if self.state != 1:
+                delta: float = time.time() - start
+                time.sleep(storage.lane.tick - delta if storage.lane.tick - delta > 0 else 0)
+
+
+class WatchedExecutor(Executor):
+    # Submits sync parser of one task to thread pool of AsyncEngine and keeps its future, so engine can find out that
+    # parser still holds pool thread after deadline (thread can't be stopped)
+    executor: ThreadPoolExecutor
+    future: Optional[Future]
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self.executor = executor
+        self.future = None
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self.future = self.executor.submit(fn, *args, **kwargs)
+        return self.future
+
+
+class AsyncEngine(ThreadClass):
+    # Executes tasks from Resolver queues in one asyncio event loop, AsyncParser coroutines are awaited in loop,
+    # sync parsers are executed by thread pool
+    start_time: float
+    speed: float
+    in_flight: int
+    done: collections.deque
+    tasks: List[int]
+    loop: Optional[asyncio.AbstractEventLoop]
+    executor: Optional[ThreadPoolExecutor]
+    hung: Dict[Future, ThreadPoolExecutor]  # Sync parsers which exceeded deadline and still hold thread of pool
+    replaced: int  # Thread pools replaced because of hung threads
+
+    def __init__(self):
+        super().__init__('AE', AsyncEngineError)
+        self.start_time = time.time()
+        self.speed = .0
+        self.in_flight = 0
+        self.done = collections.deque()
+        self.tasks = [0, 0]
+        self.loop = None
+        self.executor = None
+        self.hung = {}
+        self.replaced = 0
+
+    @staticmethod
+    def acquire() -> Tuple[int, Union[api.CatalogType, api.TargetType, None]]:
+        if storage.lane.enabled and (task := resolver.acquire(2)) is not None:
+            return resolver.mode(task), task
+
+        mode = resolver.choose(1, True, 1.)
+        if (task := resolver.acquire(mode)) is None:
+            mode = 1 - mode
+            task = resolver.acquire(mode)
+        return mode, task
+
+    async def process(self, mode: int, task: Union[api.CatalogType, api.TargetType]) -> None:
+        self.in_flight += 1
+        executor = WatchedExecutor(self.executor)
+        try:
+            await resolver.process_async(mode, task, executor)
+        except Exception as e:
+            self._log.error(codes.Code(40404, f'{task.script}: {e.__class__.__name__}: {e!s}'))
+        finally:
+            if executor.future and not executor.future.done():  # Deadline exceeded, parser keeps running in thread
+                self.hung[executor.future] = executor.executor
+            self.in_flight -= 1
+            self.tasks[mode] += 1
+            self.done.append(time.time())
+
+    def measure(self) -> None:  # Tasks per second for the last speed_window seconds
+        while self.done and self.done[0] < time.time() - storage.async_engine.speed_window:
+            self.done.popleft()
+        self.speed = round(len(self.done) / storage.async_engine.speed_window, 3)
+
+    def check_executor(self) -> None:  # Replace thread pool if its threads are held by hung sync parsers
+        self.hung = {k: v for k, v in self.hung.items() if not k.done()}
+        if any(i is self.executor for i in self.hung.values()):
+            self.executor.shutdown(False)  # Idle threads of old pool stop, hung ones stop when parser returns
+            self.executor = ThreadPoolExecutor(storage.async_engine.threads, 'AE')
+            self.replaced += 1
+            self._log.warn(codes.Code(30208, f'{len(self.hung)} hung thread(s)'))
+
+    async def main(self) -> None:
+        running = set()
+        while True:
+            if self.state == 1:
+                while len(running) < storage.async_engine.concurrency:
+                    mode, task = self.acquire()
+                    if task is None:
+                        break
+                    running.add(asyncio.ensure_future(self.process(mode, task)))
+            elif self.state == 2:  # Pausing state
+                self._log.info(codes.Code(20002))
+                self._state = 3
+            elif self.state == 3:  # Paused state
+                pass
+            elif self.state == 4:  # Resuming state
+                self._log.info(codes.Code(20003))
+                self._state = 1
+            elif self.state == 5:  # Stopping state
+                if running:
+                    await asyncio.wait(running, timeout=storage.async_engine.wait)
+                self._log.info(codes.Code(20005))
+                break
+
+            if running:  # Wait for any task up to tick, then fill free slots
+                running = (await asyncio.wait(
+                    running, timeout=storage.async_engine.tick, return_when=asyncio.FIRST_COMPLETED
+                ))[1]
+            else:
+                await asyncio.sleep(storage.async_engine.tick)
+            self.measure()
+            self.check_executor()
+
+    def run(self) -> None:
+        self._state = 1
+        self.executor = ThreadPoolExecutor(storage.async_engine.threads, 'AE')
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.main())
+        except Exception as e:
+            self.throw(codes.Code(51701, f'While working: {e.__class__.__name__}: {e!s}'))
+        finally:
+            self.executor.shutdown(False)
+            self.loop.close()
 
 
 class ThreadManager(ThreadClass):
@@ -567,7 +1426,18 @@ class ThreadManager(ThreadClass):
     catalog_workers: Dict[int, CatalogWorker]
     workers_increment_id: int
     workers: Dict[int, Worker]
+    lane_workers_increment_id: int
+    lane_workers: Dict[int, LaneWorker]
     pipe: Optional[Pipe]
+    engine: Optional[AsyncEngine]
+    workers_count: int
+    catalog_workers_count: int
+    scaling: collections.deque
+    scaled: Dict[str, int]
+    _scale_time: float
+    _votes: Dict[str, int]
+    _busy: Dict[str, float]
+    replaced: int
 
     def __init__(self) -> None:
         super().__init__('TM', ThreadManagerError)
@@ -578,7 +1448,19 @@ class ThreadManager(ThreadClass):
         self.catalog_workers = {}
         self.workers_increment_id = 0
         self.workers = {}
+        self.lane_workers_increment_id = 0
+        self.lane_workers = {}
         self.pipe = Pipe()
+        self.engine = None
+
+        self.workers_count = storage.worker.count
+        self.catalog_workers_count = storage.catalog_worker.count
+        self.scaling = collections.deque(maxlen=64)
+        self.scaled = {'up': 0, 'down': 0}
+        self._scale_time = time.time()
+        self._votes = {'workers': 0, 'catalog_workers': 0}
+        self._busy = {}
+        self.replaced = 0
 
     def check_pipe(self) -> None:
         with self.lock:
@@ -594,13 +1476,43 @@ class ThreadManager(ThreadClass):
                     self.pipe = Pipe()
                     self._log.info(codes.Code(20201))
 
+    def check_engine(self) -> None:
+        with self.lock:
+            if storage.async_engine.enabled:
+                if not self.engine:
+                    self.engine = AsyncEngine()
+                    self._log.info(codes.Code(20210))
+                if not self.engine.is_alive():
+                    try:
+                        self.engine.start()
+                        self._log.info(codes.Code(20211))
+                    except RuntimeError:
+                        if self.engine.state == 5:
+                            self._log.warn(codes.Code(30206))
+                        else:
+                            self._log.error(codes.Code(40205))
+                        self.engine = None
+            elif self.engine:
+                try:
+                    self.engine.state = 5
+                except StateError:
+                    pass
+                if not self.engine.is_alive():
+                    self.engine = None
+
     def check_workers(self) -> None:
         with self.lock:
-            if len(self.workers) < storage.worker.count:
-                self.workers[self.workers_increment_id] = Worker(self.workers_increment_id)
-                self._log.info(codes.Code(20203, f'W-{self.workers_increment_id}'))
-                self.workers_increment_id += 1
-            elif len(self.workers) > storage.worker.count:
+            if storage.async_engine.enabled:  # Workers are replaced by engine
+                count = 0
+            else:
+                count = self.workers_count if storage.thread_manager.autoscale else storage.worker.count
+
+            if len(self.workers) < count:
+                while len(self.workers) < count:
+                    self.workers[self.workers_increment_id] = Worker(self.workers_increment_id)
+                    self._log.info(codes.Code(20203, f'W-{self.workers_increment_id}'))
+                    self.workers_increment_id += 1
+            elif len(self.workers) > count:
                 try:
                     self.stop_worker()
                 except StateError:
@@ -620,13 +1532,19 @@ class ThreadManager(ThreadClass):
 
     def check_catalog_workers(self) -> None:
         with self.lock:
-            if len(self.catalog_workers) < storage.catalog_worker.count:
-                self.catalog_workers[self.catalog_workers_increment_id] = CatalogWorker(
-                    self.catalog_workers_increment_id
-                )
-                self._log.info(codes.Code(20205, f'CW-{self.catalog_workers_increment_id}'))
-                self.catalog_workers_increment_id += 1
-            elif len(self.catalog_workers) > storage.catalog_worker.count:
+            if storage.async_engine.enabled:
+                count = 0
+            else:
+                count = self.catalog_workers_count if storage.thread_manager.autoscale else storage.catalog_worker.count
+
+            if len(self.catalog_workers) < count:
+                while len(self.catalog_workers) < count:
+                    self.catalog_workers[self.catalog_workers_increment_id] = CatalogWorker(
+                        self.catalog_workers_increment_id
+                    )
+                    self._log.info(codes.Code(20205, f'CW-{self.catalog_workers_increment_id}'))
+                    self.catalog_workers_increment_id += 1
+            elif len(self.catalog_workers) > count:
                 try:
                     self.stop_catalog_worker()
                 except StateError:
@@ -644,6 +1562,121 @@ class ThreadManager(ThreadClass):
                             self._log.error(codes.Code(40203, str(v.id)))
                         del self.catalog_workers[v.id]
 
+    def check_lane_workers(self) -> None:
+        with self.lock:
+            count = max(storage.lane.count, 1) if storage.lane.enabled else 0
+
+            if len(self.lane_workers) < count:
+                while len(self.lane_workers) < count:
+                    self.lane_workers[self.lane_workers_increment_id] = LaneWorker(self.lane_workers_increment_id)
+                    self._log.info(codes.Code(20208, f'LW-{self.lane_workers_increment_id}'))
+                    self.lane_workers_increment_id += 1
+            elif len(self.lane_workers) > count:
+                try:
+                    self.stop_lane_worker()
+                except StateError:
+                    pass
+
+            for v in list(self.lane_workers.values()):
+                if not v.is_alive():
+                    try:
+                        v.start()
+                        self._log.info(codes.Code(20209, str(v.id)))
+                    except RuntimeError:
+                        if v.state == 5:
+                            self._log.warn(codes.Code(30205, str(v.id)))
+                        else:
+                            self._log.error(codes.Code(40204, str(v.id)))
+                        del self.lane_workers[v.id]
+
+    def check_cluster(self) -> None:  # Send heartbeat to coordinator, rebalance scripts if membership was changed
+        if storage.cluster.enabled and time.time() - cluster.member.last_heartbeat >= storage.cluster.heartbeat:
+            if cluster.member.heartbeat(script_manager.pinned()):
+                for i in script_manager.rebalance():  # Scripts of other members
+                    resolver.remove_catalog(i)
+                    resolver.remove_targets(i)
+
+    def check_watchdog(self) -> None:  # Replace workers stuck on task longer than its deadline
+        with self.lock:
+            if not storage.thread_manager.watchdog or not (idents := resolver.overdue()):
+                return
+
+            for pool in (self.workers, self.catalog_workers, self.lane_workers):
+                for id_, worker in list(pool.items()):
+                    if worker.ident in idents and resolver.abandon(worker.ident):
+                        worker._state = 5  # Thread will stop as soon as task returns (state can be locked)
+                        del pool[id_]  # Replacement will be started by check_*workers
+                        self.replaced += 1
+                        self._log.warn(codes.Code(30207, worker.name))
+
+    def _idle(self, workers: Dict[int, Union[Worker, CatalogWorker]], delta: float) -> float:
+        # Busy time since last tick, worker which holds a task is busy until now (rest is counted when task ends)
+        busy, now = 0., time.time()
+        for i in workers.values():
+            total = i.busy + (now - start if (start := i.task_start) else 0.)
+            busy += max(total - self._busy.get(i.name, 0.), 0.)
+            self._busy[i.name] = total
+        return max(1 - busy / (delta * len(workers)), 0.) if workers and delta > 0 else 1.
+
+    def _scale(self, pool: str, count: int, depth: int, lateness: float, idle: float, min_: int, max_: int) -> int:
+        if depth > storage.thread_manager.scale_queue * count or lateness > storage.thread_manager.scale_lateness:
+            self._votes[pool] = max(self._votes[pool], 0) + 1  # Overloaded
+        elif idle > storage.thread_manager.scale_idle:
+            self._votes[pool] = min(self._votes[pool], 0) - 1  # Underloaded
+        else:
+            self._votes[pool] = 0
+
+        # Hysteresis: decision is made only after several ticks in a row with the same load condition
+        if self._votes[pool] >= storage.thread_manager.scale_up_ticks:
+            new = min(count + max(count // 2, 1), max_)
+        elif -self._votes[pool] >= storage.thread_manager.scale_down_ticks:
+            new = max(count - 1, min_)
+        else:
+            new = count
+        new = min(max(new, min_), max_)
+
+        if new != count:
+            self._votes[pool] = 0
+            self.scaled['up' if new > count else 'down'] += 1
+            self.scaling.append({
+                'time': time.time(),
+                'pool': pool,
+                'from': count,
+                'to': new,
+                'queue': depth,
+                'lateness': round(lateness, 6),
+                'idle': round(idle, 3)
+            })
+            self._log.info(codes.Code(20207, f'{pool}: {count} -> {new}'))
+        return new
+
+    def autoscale(self) -> None:
+        with self.lock:
+            delta = time.time() - self._scale_time
+            self._scale_time = time.time()
+
+            self.workers_count = self._scale(
+                'workers',
+                self.workers_count,
+                resolver.target_queue.qsize(),
+                self.pipe.recent_lateness(1, delta) if self.pipe else 0.,
+                self._idle(self.workers, delta),
+                storage.worker.min,
+                storage.worker.max
+            )
+            self.catalog_workers_count = self._scale(
+                'catalog_workers',
+                self.catalog_workers_count,
+                resolver.catalog_queue.qsize(),
+                self.pipe.recent_lateness(0, delta) if self.pipe else 0.,
+                self._idle(self.catalog_workers, delta),
+                storage.catalog_worker.min,
+                storage.catalog_worker.max
+            )
+
+            names = {i.name for i in (*self.workers.values(), *self.catalog_workers.values())}
+            self._busy = {k: v for k, v in self._busy.items() if k in names}
+
     def stop_worker(self, id_: int = -1, blocking: bool = False) -> int:
         with self.lock:
             if id_ < 0:
@@ -666,6 +1699,17 @@ class ThreadManager(ThreadClass):
 
             return id_
 
+    def stop_lane_worker(self, id_: int = -1, blocking: bool = False) -> int:
+        with self.lock:
+            if id_ < 0:
+                id_ = random.choice(list(self.lane_workers))
+            self.lane_workers[id_].state = 5
+
+            if blocking:
+                self.lane_workers[id_].join(storage.lane.wait)
+
+            return id_
+
     def stop_threads(self) -> None:
         with self.lock:
             for i in self.workers.values():
@@ -686,6 +1730,23 @@ class ThreadManager(ThreadClass):
                 self.catalog_workers[i].join(storage.catalog_worker.wait)
                 del self.catalog_workers[i]
 
+            for i in self.lane_workers.values():
+                try:
+                    i.state = 5
+                except StateError:
+                    continue
+            for i in tuple(self.lane_workers):
+                self.lane_workers[i].join(storage.lane.wait)
+                del self.lane_workers[i]
+
+            if self.engine:
+                try:
+                    self.engine.state = 5
+                except StateError:
+                    pass
+                self.engine.join(storage.async_engine.wait + 1)
+                self.engine = None
+
             try:
                 self.pipe.state = 5
             except StateError:
@@ -694,6 +1755,10 @@ class ThreadManager(ThreadClass):
             self.pipe = None
 
     def run(self) -> None:
+        with self.lock:  # Thread manager is created before config is loaded, autoscaling starts from configured counts
+            self.workers_count = storage.worker.count
+            self.catalog_workers_count = storage.catalog_worker.count
+            self._scale_time = time.time()
         self.state = 1
         while True:
             try:
@@ -701,8 +1766,14 @@ class ThreadManager(ThreadClass):
                 if self.state == 1:
                     if self.lock.acquire(False):
                         self.check_pipe()
+                        self.check_cluster()
+                        if storage.thread_manager.autoscale:
+                            self.autoscale()
+                        self.check_watchdog()
                         self.check_workers()
                         self.check_catalog_workers()
+                        self.check_lane_workers()
+                        self.check_engine()
                         try:
                             self._lock_ticks = 0
                             self.lock.release()
@@ -742,7 +1813,8 @@ class ThreadManager(ThreadClass):
     def close(self) -> float:
         self.state = 5
         return storage.pipe.wait + len(self.workers) * (
-                storage.worker.wait + 1) + len(self.catalog_workers) * (storage.catalog_worker.wait + 1)
+                storage.worker.wait + 1) + len(self.catalog_workers) * (storage.catalog_worker.wait + 1) + \
+            len(self.lane_workers) * (storage.lane.wait + 1) + (storage.async_engine.wait + 1 if self.engine else 0)
 
 
 class RemoteThreadHandler(uctp.peer.ErrorHandler):
@@ -782,6 +1854,8 @@ class Core:
         script_manager.index.config_load()  # Load scripts.yaml
         script_manager.event_handler.start()  # Start event loop
         script_manager.index.reindex()  # Index scripts
+        if storage.cluster.enabled:
+            cluster.member.join()  # Join cluster (and run coordinator if needed) to know owned scripts
         script_manager.load_all()  # Load scripts
 
         script_manager.event_handler.monitor_starting()
@@ -789,6 +1863,9 @@ class Core:
         commands.Commands()  # Initialize UCTP commands
         server.start()  # Run UCTP server
 
+        if storage.cache.restore:
+            self.thread_manager.pipe.parsers_hashes = resolver.load()  # Restore schedule (catalogs won't be reset)
+
         analytic.dump(0)  # Create startup report
 
         self.thread_manager.start()  # Start pipeline
@@ -816,7 +1893,14 @@ class Core:
 
             self.thread_manager.join(self.thread_manager.close())  # Stop pipeline and wait
 
+            if storage.cluster.enabled:
+                cluster.member.leave()  # Other members will take scripts of this monitor
+
             provider.proxy_dump()  # Save proxies to ./proxy.json
+            try:
+                resolver.dump()  # Save schedule to cache/schedule.pickle
+            except Exception as e:
+                self.log.error(codes.Code(40302, f'{e.__class__.__name__}: {e!s}'))
             analytic.dump(2)  # Create stop report
 
             script_manager.event_handler.monitor_stopped()
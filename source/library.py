@@ -1,8 +1,15 @@
+import asyncio
+import bisect
 import collections
+import heapq
+import itertools
+import queue
 import threading
+import time
+import weakref
 from dataclasses import dataclass, field
 from io import BytesIO, StringIO
-from typing import Any, List, Dict, Union, Tuple
+from typing import Any, List, Dict, Union, Tuple, Iterator, Set, Optional, Callable
 from urllib.parse import urlencode
 
 import pycurl
@@ -40,70 +47,390 @@ class SubProviderError(Exception):
 class PrioritizedItem:
     priority: int
     content: Any = field(compare=False)
+    weight: float = field(compare=False, default=1.)  # Share of script inside group (fair mode)
+    group: Optional[int] = field(compare=False, default=None)  # Base priority of task class (priority if None)
+
+
+class CancellableQueue(queue.Queue):
+    # Priority queue (FIFO for equal priorities) where all tasks of a script can be cancelled,
+    # cancelled entries are left in heap as tombstones and skipped by get().
+    # In fair mode tasks of the same group (base priority of class, before reuse is added) are ordered by start-time
+    # fair queueing tag of their script and then by priority, so scripts get executions in proportion to their
+    # weights instead of order of insertion
+    queue: List[list]  # [group, tag, priority, id, item, put time]
+    _counter: Iterator[int]
+    _scripts: Dict[str, Dict[int, list]]
+    _size: int
+    _clock: Dict[int, float]  # Virtual time of group (tag of last got task)
+    _finish: Dict[Tuple[int, str], float]  # Finish tag of last task of script in group
+
+    def _init(self, maxsize: int) -> None:
+        self.queue = []
+        self._counter = itertools.count()
+        self._scripts = {}
+        self._size = 0
+        self._clock = {}
+        self._finish = {}
+
+    def _qsize(self) -> int:
+        return self._size
+
+    def _put(self, item: PrioritizedItem) -> None:
+        if storage.queues.fair:
+            group = item.priority if item.group is None else item.group
+            key = (group, item.content.script)
+            tag = max(self._clock.get(group, 0.), self._finish.get(key, 0.))
+            self._finish[key] = tag + 1 / (item.weight if item.weight > 0 else 1.)
+        else:
+            group, tag = item.priority, 0.
+
+        entry = [group, tag, item.priority, next(self._counter), item, time.time()]
+        heapq.heappush(self.queue, entry)
+        self._scripts.setdefault(item.content.script, {})[entry[3]] = entry
+        self._size += 1
+
+    def _get(self) -> PrioritizedItem:
+        while True:
+            group, tag, priority, id_, item, time_ = heapq.heappop(self.queue)
+            if item is not None:
+                break
+
+        if tag:
+            self._clock[group] = tag
+        entries = self._scripts[item.content.script]
+        del entries[id_]
+        if not entries:
+            del self._scripts[item.content.script]
+        self._size -= 1
+        return item
+
+    def cancel(self, script: str, predicate: Optional[Callable[[Any], bool]] = None) -> int:
+        # Cancel all tasks of script (or only tasks which content matches predicate)
+        with self.mutex:
+            if predicate is None:
+                entries = self._scripts.pop(script, {})
+                for i in [i for i in self._finish if i[1] == script]:
+                    del self._finish[i]
+            else:
+                entries = {k: v for k, v in self._scripts.get(script, {}).items() if predicate(v[4].content)}
+                for i in entries:
+                    del self._scripts[script][i]
+                if script in self._scripts and not self._scripts[script]:
+                    del self._scripts[script]
+
+            for i in entries.values():
+                i[4] = None
+
+            if entries:
+                self._size -= len(entries)
+                self.unfinished_tasks -= len(entries)
+                if self.unfinished_tasks <= 0:
+                    self.unfinished_tasks = 0
+                    self.all_tasks_done.notify_all()
+                self.not_full.notify(len(entries))
+
+                if len(self.queue) > 2 * self._size + 64:  # Drop tombstones
+                    self.queue = [i for i in self.queue if i[4] is not None]
+                    heapq.heapify(self.queue)
+
+            return len(entries)
+
+    def pop_last(self, predicate: Callable[[Any], bool]) -> Optional[PrioritizedItem]:
+        # Remove the lowest-priority (and the newest among equal) task which content matches predicate
+        with self.mutex:
+            last = None
+            for i in self.queue:
+                if i[4] is not None and predicate(i[4].content) and (last is None or i[:4] > last[:4]):
+                    last = i
+
+            if last is None:
+                return None
+
+            item, last[4] = last[4], None
+            entries = self._scripts[item.content.script]
+            del entries[last[3]]
+            if not entries:
+                del self._scripts[item.content.script]
+            self._size -= 1
+            self.unfinished_tasks = max(self.unfinished_tasks - 1, 0)
+            self.not_full.notify()
+            return item
+
+    def head(self) -> Optional[Tuple[int, float]]:  # Priority and put time of next task
+        with self.mutex:
+            while self.queue and self.queue[0][4] is None:
+                heapq.heappop(self.queue)
+            return (self.queue[0][2], self.queue[0][5]) if self.queue else None
+
+    def items(self) -> List[PrioritizedItem]:
+        with self.mutex:
+            return [i[4] for i in sorted(self.queue, key=lambda i: i[:4]) if i[4] is not None]
+
+
+class Histogram:
+    # Counts of values by buckets (upper bounds), last bucket is for values more than last bound
+    bounds: Tuple[float, ...] = (.001, .005, .01, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.)
+    counts: List[int]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> float:  # Upper bound of bucket which contains percentile
+        rank = self.count * percent / 100
+        for i, v in enumerate(self.counts):
+            rank -= v
+            if rank <= 0:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 6) if self.count else 0.,
+            'max': round(self.max, 6),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': {
+                **{f'<={v}': self.counts[i] for i, v in enumerate(self.bounds)},
+                f'>{self.bounds[-1]}': self.counts[-1]
+            }
+        }
+
+
+class Limiter:
+    # Per-script in-flight counter and token bucket (tasks per second with burst)
+    _lock: threading.Lock
+    _in_flight: Dict[str, int]
+    _buckets: Dict[str, List[float]]  # [tokens, last update time]
+    _released: Optional[Callable[[str], None]]  # Called (without lock) when slots or tokens of script are freed
+
+    def __init__(self, released: Optional[Callable[[str], None]] = None):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._buckets = {}
+        self._released = released
+
+    def acquire(self, script: str, in_flight: int = 0, rate: float = 0., burst: int = 0) -> Optional[float]:
+        # Returns 0 if task can be executed, delay if rate exceeded, None if in-flight limit reached
+        with self._lock:
+            if 0 < in_flight <= self._in_flight.get(script, 0):
+                return None
+
+            if rate > 0:
+                capacity = burst if burst > 0 else max(rate, 1.)
+                now = time.time()
+                bucket = self._buckets.setdefault(script, [capacity, now])
+                bucket[0] = min(bucket[0] + (now - bucket[1]) * rate, capacity)
+                bucket[1] = now
+                if bucket[0] < 1:
+                    return (1 - bucket[0]) / rate
+                bucket[0] -= 1
+            elif script in self._buckets:
+                del self._buckets[script]
+
+            self._in_flight[script] = self._in_flight.get(script, 0) + 1
+            return 0.
+
+    def release(self, script: str, count: int = 1, refund: bool = False) -> None:
+        with self._lock:
+            if script in self._in_flight:
+                if (in_flight := self._in_flight[script] - count) > 0:
+                    self._in_flight[script] = in_flight
+                else:
+                    del self._in_flight[script]
+            if refund and script in self._buckets:
+                self._buckets[script][0] += count
+        if self._released and count > 0:
+            self._released(script)
+
+    def usage(self) -> Dict[str, Tuple[int, Optional[float]]]:
+        with self._lock:
+            return {
+                i: (self._in_flight.get(i, 0), self._buckets[i][0] if i in self._buckets else None)
+                for i in set(self._in_flight) | set(self._buckets)
+            }
 
 
 class Schedule(dict):
-    def __setitem__(self, time_: Union[float, int], value):
-        if isinstance(time_, float) or isinstance(time_, int):
-            super().__setitem__(round(time_, 7), value)
-        else:
-            raise KeyError('Key must be int or float')
+    _heap: List[Tuple[float, int]]  # Same key tuples as in dict (values are not duplicated in heap)
+    _counter: Iterator[int]
+
+    def __init__(self):
+        super().__init__()
+        self._heap = []
+        self._counter = itertools.count()
 
-    def __getitem__(self, time_: Union[float, int, slice]):
-        if isinstance(time_, slice):
-            if time_.start:
-                return (i for i in self.items() if i[0] >= time_.start)
-            elif time_.stop:
-                return (i for i in self.items() if i[0] <= time_.stop)
+    def __setitem__(self, time_: Union[float, int], value):
+        self.insert(time_, value)
+
+    def __getitem__(self, key: Union[Tuple[float, int], slice]):
+        if isinstance(key, slice):
+            if key.start:
+                return ((k[0], v) for k, v in sorted(self.items()) if k[0] >= key.start)
+            elif key.stop:
+                return self._due(key.stop)
             else:
                 return []
         else:
-            return super().__getitem__(time_)
+            return super().__getitem__(key)
+
+    def __delitem__(self, key: Union[Tuple[float, int], slice]):
+        if isinstance(key, slice):
+            if key.start:
+                for i in self.key_list(key):
+                    self._removed(i, super().pop(i))
+                self._compact()
+            elif key.stop:
+                self.pop_due(key.stop)
+        else:
+            self._removed(key, super().pop(key))
+            self._compact()
 
-    def __delitem__(self, time_: Union[float, int, slice]):
-        if isinstance(time_, slice):
-            for i in self.key_list(time_):
-                super().__delitem__(i)
+    def _added(self, key: Tuple[float, int], value: Any) -> None:
+        pass
+
+    def _removed(self, key: Tuple[float, int], value: Any) -> None:
+        pass
+
+    def _alive(self, key: Tuple[float, int]) -> bool:  # Counter makes keys unique, so stale keys are just missing
+        return super().__contains__(key)
+
+    def _compact(self) -> None:  # Drop entries left in heap by deleting from the middle
+        if len(self._heap) > 2 * len(self) + 64:
+            self._heap = [i for i in self._heap if self._alive(i)]
+            heapq.heapify(self._heap)
+
+    def _due(self, time_: float) -> Iterator[Tuple[float, Any]]:
+        # Walk the heap as a tree, visiting only entries which are due (O(k log k) for k due entries)
+        visit = [(self._heap[0], 0)] if self._heap else []
+        while visit:
+            entry, i = heapq.heappop(visit)
+            if entry[0] > time_:
+                continue
+            if self._alive(entry):
+                yield entry[0], super().__getitem__(entry)
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < len(self._heap):
+                    heapq.heappush(visit, (self._heap[j], j))
+
+    def insert(self, time_: Union[float, int], value) -> Tuple[float, int]:
+        if isinstance(time_, float) or isinstance(time_, int):
+            key = (round(time_, 7), next(self._counter))
+            super().__setitem__(key, value)
+            self._added(key, value)
+            heapq.heappush(self._heap, key)
+            return key
         else:
-            super().__delitem__(time_)
+            raise KeyError('Key must be int or float')
 
-    def __contains__(self, time_) -> bool:
-        if isinstance(time_, float):
-            time_ = round(time_, 7)
-        return super().__contains__(time_)
+    def pop(self, key: Tuple[float, int], *default):
+        if super().__contains__(key):
+            value = super().pop(key)
+            self._removed(key, value)
+            self._compact()
+            return value
+        else:
+            return super().pop(key, *default)
+
+    def clear(self) -> None:
+        super().clear()
+        self._heap.clear()
+
+    def next_time(self) -> Optional[float]:
+        while self._heap and not self._alive(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, time_: Union[float, int]) -> List[Tuple[float, Any]]:
+        items = []
+        while self._heap and self._heap[0][0] <= time_:
+            key = heapq.heappop(self._heap)
+            if self._alive(key):
+                value = super().pop(key)
+                self._removed(key, value)
+                items.append((key[0], value))
+        return items
 
-    def pop_time(self, time_: Union[float, int, slice]) -> List[Any]:
+    def pop_time(self, time_: slice) -> List[Any]:
         items = list(self.__getitem__(time_))
         del self[time_]
         return items
 
     def pop_first(self, time_: slice) -> Any:
         try:
-            item = next(self.__getitem__(time_))
-            del self[item[0]]
-            return item
-        except StopIteration:
+            key = self.key_list(time_)[0]
+            return key[0], self.pop(key)
+        except IndexError:
             return ()
 
     def key_list(self, time_: slice) -> list:
         if time_.start:
-            return list(i for i in self if i >= time_.start)
+            return sorted(i for i in self if i[0] >= time_.start)
         elif time_.stop:
-            return list(i for i in self if i <= time_.stop)
+            return sorted(i for i in self._heap if i[0] <= time_.stop and self._alive(i))
         else:
             return []
 
 
 class UniqueSchedule(Schedule):
-    def __setitem__(self, time_: Union[float, int], value):
-        if value not in self.values():
-            super().__setitem__(time_, value)
+    _index: Dict[bytes, Tuple[float, int]]
+    _scripts: Dict[str, Set[bytes]]
+
+    def __init__(self):
+        super().__init__()
+        self._index = {}
+        self._scripts = {}
+
+    def _added(self, key: Tuple[float, int], value: Any) -> None:
+        self._index[hash_ := value.hash()] = key
+        self._scripts.setdefault(value.script, set()).add(hash_)
+
+    def _removed(self, key: Tuple[float, int], value: Any) -> None:
+        self._index.pop(hash_ := value.hash(), None)
+        if (hashes := self._scripts.get(value.script)) is not None:
+            hashes.discard(hash_)
+            if not hashes:
+                del self._scripts[value.script]
+
+    def insert(self, time_: Union[float, int], value) -> Tuple[float, int]:
+        if value.hash() not in self._index:
+            return super().insert(time_, value)
         else:
             raise IndexError('Non-unique value')
 
+    def clear(self) -> None:
+        super().clear()
+        self._index.clear()
+        self._scripts.clear()
+
+    def unique(self, value) -> bool:
+        return value.hash() not in self._index
+
+    def discard(self, value) -> Any:
+        if (hash_ := value.hash()) in self._index:
+            return self.pop(self._index[hash_])
+
+    def pop_script(self, script: str) -> List[Any]:
+        return [self.pop(self._index[i]) for i in tuple(self._scripts.get(script, ()))]
+
 
 @dataclass
 class Interval:
+    __slots__ = ()
     interval: float = field(compare=False)
 
     def __post_init__(self):
@@ -116,6 +443,7 @@ class Interval:
 
 @dataclass
 class Scheduled:
+    __slots__ = ()
     timestamp: float = field(compare=False)
 
     def __post_init__(self):
@@ -128,6 +456,7 @@ class Scheduled:
 
 @dataclass
 class Smart:
+    __slots__ = ()
     gen: SmartGenType = field(compare=False, repr=False)
     expired: bool = field(init=False)
 
@@ -218,6 +547,36 @@ class ProviderCore:
     lock: threading.RLock = threading.RLock()
     _proxies: Dict[str, Proxy] = {}
 
+    @classmethod
+    def proxy_snapshot(cls) -> List[Tuple[str, Optional[str], Optional[str], int]]:  # Proxies sent to pool process
+        with cls.lock:
+            return [(i.address, i.login, i.password, i.bad) for i in cls._proxies.values()]
+
+    @classmethod
+    def proxy_restore(cls, proxies: List[Tuple[str, Optional[str], Optional[str], int]]) -> None:
+        # Replace proxies of pool process by snapshot of monitor
+        with cls.lock:
+            cls._proxies.clear()
+            for address, login, password, bad in proxies:
+                cls._proxies[address] = Proxy(address, login, password, bad)
+
+    @classmethod
+    def proxy_usage(cls, proxies: List[Tuple[str, Optional[str], Optional[str], int]]) -> Dict[str, Tuple[int, list]]:
+        # Bad requests and request times of proxies since proxy_restore(proxies), returned by pool process
+        bad = {i[0]: i[3] for i in proxies}
+        with cls.lock:
+            usage = {k: (v.bad - bad.get(k, 0), v.stats) for k, v in cls._proxies.items()}
+        return {k: v for k, v in usage.items() if v[0] or v[1]}
+
+    @classmethod
+    def proxy_merge(cls, usage: Dict[str, Tuple[int, list]]) -> None:  # Add usage of proxies from pool process
+        with cls.lock:
+            for k, (bad, stats) in usage.items():
+                if proxy := cls._proxies.get(k):  # Proxy could be removed while parser was executed
+                    proxy.bad += bad
+                    for i in reversed(stats):  # Stats are newest first
+                        proxy.stats = i
+
 
 # Functional classes
 
@@ -413,16 +772,15 @@ class SubProvider(ProviderCore):
             else:
                 return Proxy('')
 
-    def request(
+    def _curl(
             self,
             url: str,
             proxy: bool = False,
-            *,
             params: Dict[str, Union[str, int, float, bool]] = None,
             headers: Dict[str, str] = None,
             data: Union[str, bytes] = '',
             method: str = 'GET'
-    ) -> Tuple[bool, Union[Response, Exception]]:
+    ) -> Tuple[pycurl.Curl, Proxy, Dict[str, str]]:
         c = pycurl.Curl()
 
         if isinstance(url, str):
@@ -502,17 +860,134 @@ class SubProvider(ProviderCore):
         c.setopt(c.CONNECTTIMEOUT, ct := storage.sub_provider.connect_timeout)
         c.setopt(c.TIMEOUT, storage.sub_provider.read_timeout + ct)
 
+        return c, proxy_, resp_headers
+
+    def _failed(self, proxy_: Proxy, error: pycurl.error) -> Tuple[bool, Exception]:
+        if proxy_.address:
+            proxy_.bad += 1
+            proxy_.stats = -1
+        self._log.error(Code(41301, f'{type(error)}: {error!s}'), threading.current_thread().name)
+        return False, error
+
+    def request(
+            self,
+            url: str,
+            proxy: bool = False,
+            *,
+            params: Dict[str, Union[str, int, float, bool]] = None,
+            headers: Dict[str, str] = None,
+            data: Union[str, bytes] = '',
+            method: str = 'GET'
+    ) -> Tuple[bool, Union[Response, Exception]]:
+        c, proxy_, resp_headers = self._curl(url, proxy, params, headers, data, method)
+
         try:
             resp = Response(c.perform_rb(), url, c.getinfo(c.TOTAL_TIME), c.getinfo(c.RESPONSE_CODE), resp_headers)
         except pycurl.error as e:
-            if proxy:
-                proxy_.bad += 1
-                proxy_.stats = -1
-            self._log.error(Code(41301, f'{type(e)}: {e!s}'), threading.current_thread().name)
-            return False, e
+            return self._failed(proxy_, e)
+        else:
+            proxy_.stats = resp.elapsed
+            return True, resp
+        finally:
+            c.close()
+
+
+class CurlLoop:
+    # pycurl.CurlMulti driven by asyncio event loop (sockets are watched by loop, timeouts are loop timers)
+    _loops: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, CurlLoop]' = weakref.WeakKeyDictionary()
+
+    loop: asyncio.AbstractEventLoop
+    multi: pycurl.CurlMulti
+    futures: Dict[pycurl.Curl, asyncio.Future]
+    timer: Optional[asyncio.TimerHandle]
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket)
+        self.multi.setopt(pycurl.M_TIMERFUNCTION, self._timer)
+        self.futures = {}
+        self.timer = None
+
+    @classmethod
+    def get(cls) -> 'CurlLoop':  # CurlLoop of running event loop
+        loop = asyncio.get_running_loop()
+        if loop not in cls._loops:
+            cls._loops[loop] = cls(loop)
+        return cls._loops[loop]
+
+    def _socket(self, event: int, fd: int, multi: pycurl.CurlMulti, data: Any) -> None:
+        if event in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self.loop.add_reader(fd, self._action, fd, pycurl.CSELECT_IN)
+        else:
+            self.loop.remove_reader(fd)
+
+        if event in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self.loop.add_writer(fd, self._action, fd, pycurl.CSELECT_OUT)
+        else:
+            self.loop.remove_writer(fd)
+
+    def _timer(self, timeout: int) -> None:  # timeout in milliseconds, -1 to delete timer
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if timeout >= 0:
+            self.timer = self.loop.call_later(timeout / 1000, self._action, pycurl.SOCKET_TIMEOUT, 0)
+
+    def _action(self, fd: int, flags: int) -> None:
+        while self.multi.socket_action(fd, flags)[0] == pycurl.E_CALL_MULTI_PERFORM:
+            pass
+
+        while True:
+            queued, succeeded, failed = self.multi.info_read()
+            for i in succeeded:
+                self.multi.remove_handle(i)
+                if not (future := self.futures.pop(i)).done():
+                    future.set_result(None)
+            for i, errno, message in failed:
+                self.multi.remove_handle(i)
+                if not (future := self.futures.pop(i)).done():
+                    future.set_exception(pycurl.error(errno, message))
+            if not queued:
+                break
+
+    def perform(self, c: pycurl.Curl) -> asyncio.Future:
+        self.futures[c] = self.loop.create_future()
+        self.multi.add_handle(c)
+        return self.futures[c]
+
+    def discard(self, c: pycurl.Curl) -> None:  # Stop transfer (if request was cancelled)
+        if self.futures.pop(c, None) is not None:
+            self.multi.remove_handle(c)
+
+
+class AsyncSubProvider(SubProvider):
+    # Requests are performed by CurlLoop of running event loop, so thousands of requests can be in flight
+    # without thread per request
+    async def request(
+            self,
+            url: str,
+            proxy: bool = False,
+            *,
+            params: Dict[str, Union[str, int, float, bool]] = None,
+            headers: Dict[str, str] = None,
+            data: Union[str, bytes] = '',
+            method: str = 'GET'
+    ) -> Tuple[bool, Union[Response, Exception]]:
+        c, proxy_, resp_headers = self._curl(url, proxy, params, headers, data, method)
+        c.setopt(c.WRITEDATA, buffer := BytesIO())
+
+        try:
+            await CurlLoop.get().perform(c)
+            resp = Response(buffer.getvalue(), url, c.getinfo(c.TOTAL_TIME), c.getinfo(c.RESPONSE_CODE), resp_headers)
+        except pycurl.error as e:
+            return self._failed(proxy_, e)
         else:
             proxy_.stats = resp.elapsed
             return True, resp
+        finally:
+            CurlLoop.get().discard(c)
+            c.close()
 
 
 class Keywords:
@@ -0,0 +1,63 @@
+# Process pool (parsers of scripts with "process: true" are executed in pool processes)
+# Pool processes import only this module, so nothing of monitor (providers, scripts index, uctp peer) is created.
+# Each call gets proxies of monitor (and keywords of parser if script has "keep: true"), usage of proxies is returned
+# and added to proxies of monitor. Parser with "keep: true" is kept by each pool process separately, so its attributes
+# are not shared with monitor or other pool processes, changes must be saved to ScriptStorage (files) instead.
+
+import asyncio
+import importlib
+import inspect
+import sys
+from typing import Dict, Any, Tuple, Optional, Type
+
+from . import api
+from . import logger
+from . import storage
+from .library import Keywords, ProviderCore
+from .tools import ScriptStorage
+
+_parsers: Dict[str, Tuple[str, Type[api.Parser], Optional[api.Parser]]] = {}  # name: (hash, class, kept parser)
+
+
+def init(config: dict) -> None:
+    for k, v in config.items():
+        setattr(storage, k, getattr(storage, k)._replace(**v))
+
+
+def _parser(name: str, class_: Type[api.Parser]) -> api.Parser:
+    return class_(
+        name,
+        logger.Logger(f'parser/{name}'),
+        api.AsyncSubProvider(name) if issubclass(class_, api.AsyncParser) else api.SubProvider(name),
+        ScriptStorage(name),
+        Keywords(name)
+    )
+
+
+def execute(
+        name: str,
+        module: str,
+        hash_: str,
+        keep: bool,
+        func: str,
+        args: tuple,
+        proxies: list,
+        keywords: Optional[dict]
+) -> Tuple[Any, Dict[str, Tuple[int, list]], Optional[Exception]]:
+    # Returns result, usage of proxies and exception of parser (usage must be returned even if parser failed)
+    if name not in _parsers or _parsers[name][0] != hash_:  # First call or script was changed
+        sys.modules.pop(module, None)
+        class_ = getattr(importlib.import_module(module), 'Parser')
+        _parsers[name] = (hash_, class_, _parser(name, class_) if keep else None)
+    parser = _parsers[name][2] or _parser(name, _parsers[name][1])  # New parser for each call as in monitor
+    if keywords is not None:
+        parser.kw.abs, parser.kw.pos, parser.kw.neg = keywords['absolute'], keywords['positive'], keywords['negative']
+
+    ProviderCore.proxy_restore(proxies)
+    try:
+        result = getattr(parser, func)(*args)
+        if inspect.iscoroutine(result):
+            result = asyncio.run(result)
+        return result, ProviderCore.proxy_usage(proxies), None
+    except Exception as e:
+        return None, ProviderCore.proxy_usage(proxies), e
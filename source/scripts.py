@@ -1,20 +1,27 @@
+import asyncio
 import importlib
+import inspect
+import multiprocessing
 import os
 import queue
 import sys
 import threading
 import time
 import traceback
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from types import ModuleType
-from typing import Dict, Any, Tuple, List, Type
+from typing import Dict, Any, Tuple, List, Type, Optional, Set
 
 import yaml
 from checksumdir import dirhash
 from packaging.version import Version, InvalidVersion
 
 from . import api
+from . import cluster
 from . import codes
 from . import logger
+from . import process
 from . import storage
 from . import version
 from .library import Keywords
@@ -136,6 +143,24 @@ class ScriptIndex:
             else:
                 self.log.debug('"version" not specified in ' + file)
                 good = False
+            if 'max-in-flight' in config and not isinstance(config['max-in-flight'], int):
+                self.log.debug('"max-in-flight" must be int in ' + file)
+                good = False
+            if 'rate' in config and not isinstance(config['rate'], (int, float)):
+                self.log.debug('"rate" must be float in ' + file)
+                good = False
+            if 'burst' in config and not isinstance(config['burst'], int):
+                self.log.debug('"burst" must be int in ' + file)
+                good = False
+            if 'weight' in config and not (isinstance(config['weight'], (int, float)) and config['weight'] > 0):
+                self.log.debug('"weight" must be positive float in ' + file)
+                good = False
+            if 'deadline' in config and not (isinstance(config['deadline'], (int, float)) and config['deadline'] >= 0):
+                self.log.debug('"deadline" must be non-negative float in ' + file)
+                good = False
+            if 'process' in config and not isinstance(config['process'], bool):
+                self.log.debug('"process" must be bool in ' + file)
+                good = False
             if good:
                 return True
         return False
@@ -163,6 +188,30 @@ class ScriptIndex:
             config['max-errors'] = raw['max-errors'] if config['can_be_unloaded'] else -1
         else:
             config['max-errors'] = -1
+        if 'max-in-flight' in raw:
+            config['max-in-flight'] = raw['max-in-flight']
+        else:
+            config['max-in-flight'] = 0
+        if 'rate' in raw:
+            config['rate'] = raw['rate']
+        else:
+            config['rate'] = 0.
+        if 'burst' in raw:
+            config['burst'] = raw['burst']
+        else:
+            config['burst'] = 0
+        if 'weight' in raw:
+            config['weight'] = raw['weight']
+        else:
+            config['weight'] = 1.
+        if 'deadline' in raw:
+            config['deadline'] = raw['deadline']
+        else:
+            config['deadline'] = None  # Global deadline of thread manager is used
+        if 'process' in raw:
+            config['process'] = raw['process']
+        else:
+            config['process'] = False
         return config
 
     def reindex(self) -> int:
@@ -377,6 +426,8 @@ class ScriptManager:
     scripts: Dict[str, dict]
     parsers: Dict[str, api.Parser]
     event_handler: EventHandler
+    pool: Optional[ProcessPoolExecutor]
+    owned: Set[str]  # Indexed scripts owned by this monitor at last load_all or rebalance (cluster mode)
 
     def __init__(self):
         self.log = logger.Logger('SM')
@@ -385,8 +436,12 @@ class ScriptManager:
         self.scripts = {}
         self.parsers = {}
         self.event_handler = EventHandler()
+        self.pool = None
+        self.owned = set()
 
     def del_(self):
+        if self.pool:
+            self.pool.shutdown(False)
         del self.parsers
         del self.event_handler
         del self.scripts
@@ -408,7 +463,8 @@ class ScriptManager:
                 self.parsers[script['name']] = getattr(module, 'Parser')(
                     script['name'],
                     logger.Logger('Parser/' + script['name']),
-                    api.SubProvider(script['name']),
+                    api.AsyncSubProvider(script['name']) if issubclass(getattr(module, 'Parser'), api.AsyncParser)
+                    else api.SubProvider(script['name']),
                     ScriptStorage(script['name']),
                     Keywords(script['name'])
                 )
@@ -515,9 +571,8 @@ class ScriptManager:
             self.log.error(codes.Code(40504, name))
         return False, 40504
 
-    def load_all(self) -> Tuple[bool, int]:
-        self.log.info(codes.Code(20504))
-        for i in [i for i in [i['name'] for i in self.index.index] if i not in self.scripts]:
+    def _load_owned(self, names: List[str]) -> None:
+        for i in names:
             try:
                 if self._load(i):
                     self.log.info(codes.Code(20501, i))
@@ -526,9 +581,36 @@ class ScriptManager:
                     self.log.error(codes.Code(40501, i))
                 else:
                     self.log.fatal(e)
+
+    def load_all(self) -> Tuple[bool, int]:  # Loads only scripts owned by this monitor if cluster is enabled
+        self.log.info(codes.Code(20504))
+        with self.lock:
+            self.owned = {i['name'] for i in self.index.index if cluster.member.owns(i['name'])}
+        if skipped := [i['name'] for i in self.index.index if i['name'] not in self.owned]:
+            self.log.info(codes.Code(20510, str(len(skipped))))
+        self._load_owned([i['name'] for i in self.index.index if i['name'] in self.owned - set(self.scripts)])
         self.log.info(codes.Code(20505))
         return True, 20505
 
+    def pinned(self) -> List[str]:  # Loaded scripts which can't be unloaded, they stay on this cluster member
+        with self.lock:
+            return [k for k, v in self.scripts.items() if not v['can_be_unloaded']]
+
+    def rebalance(self) -> List[str]:
+        # Unload scripts moved to other cluster members and load only newly owned ones (scripts unloaded manually
+        # or by errors stay unloaded), returns unloaded
+        with self.lock:
+            owned = {i['name'] for i in self.index.index if cluster.member.owns(i['name'])}
+            lost, gained, self.owned = self.owned - owned, owned - self.owned, owned
+            unloaded = []
+            for i in [i for i in lost if i in self.scripts]:
+                if self._unload(i):
+                    self.log.info(codes.Code(20502, i))
+                    unloaded.append(i)
+            self._load_owned([i for i in gained if i not in self.scripts])
+        self.log.info(codes.Code(20511, f'{len(unloaded)} unloaded, {len(gained)} gained, {len(owned)} owned'))
+        return unloaded
+
     def unload_all(self) -> Tuple[bool, int]:
         self.log.info(codes.Code(20506))
         for i in self.scripts.copy():
@@ -572,25 +654,101 @@ class ScriptManager:
         if keep:
             return parser
         else:
-            return parser.__init__(
+            return parser(
                 name,
                 logger.Logger(f'parser/{name}'),
-                api.SubProvider(name),
+                api.AsyncSubProvider(name) if issubclass(parser, api.AsyncParser) else api.SubProvider(name),
                 ScriptStorage(name),
                 Keywords(name)
             )
 
+    def _parser_failed(self, name: str) -> None:
+        with self.lock:
+            scripts = self.scripts[name]
+            scripts['_errors'] += 1
+            if scripts['max-errors'] < 0 or \
+                    scripts['_errors'] >= scripts['max-errors']:
+                self.log.warn(codes.Code(30507, name))
+                self.unload(name)
+
+    def _submit(self, name: str, func: str, args: tuple) -> Optional[Future]:
+        # Execute parser in process pool (returns None if script doesn't use process pool)
+        with self.lock:
+            try:
+                script = self.scripts[name]
+            except KeyError:
+                raise ScriptNotFound
+
+            if not script['process']:
+                return None
+            elif name not in self.parsers:
+                raise ParserImplementationError
+
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    storage.process_pool.workers or None,
+                    multiprocessing.get_context('spawn'),  # Forking of multithreaded process is unsafe
+                    process.init,
+                    (storage.snapshot(),)
+                )
+
+            try:
+                return self.pool.submit(
+                    process.execute,
+                    name,
+                    script['_module'],
+                    script['_hash'],
+                    script['keep'],
+                    func,
+                    args,
+                    api.SubProvider.proxy_snapshot(),
+                    self.parsers[name].kw.export() if script['keep'] else None  # Keywords edited by commands
+                )
+            except BrokenProcessPool:
+                self.pool = None
+                raise
+
+    @staticmethod
+    def _collect(reply: Tuple[Any, Dict[str, Tuple[int, list]], Optional[Exception]]) -> Any:
+        # Add usage of proxies by pool process and return result of parser
+        result, usage, error = reply
+        api.SubProvider.proxy_merge(usage)
+        if error:
+            raise error
+        return result
+
     def execute_parser(self, name: str, func: str, args: tuple) -> Any:
         try:
-            return getattr(self.get_parser(name), func)(*args)
+            if future := self._submit(name, func, args):
+                return self._collect(future.result())
+
+            result = getattr(self.get_parser(name), func)(*args)
+            if inspect.iscoroutine(result):  # AsyncParser executed outside of async engine
+                result = asyncio.run(result)
+            return result
         except (ParserImplementationError, ScriptNotFound) as e:
             raise e
         except Exception as e:
-            with self.lock:
-                scripts = self.scripts[name]
-                scripts['_errors'] += 1
-                if scripts['max-errors'] < 0 or \
-                        scripts['_errors'] >= scripts['max-errors']:
-                    self.log.warn(codes.Code(30507, name))
-                    self.unload(name)
-                raise e
+            if isinstance(e, BrokenProcessPool):
+                with self.lock:
+                    self.pool = None
+            self._parser_failed(name)
+            raise e
+
+    async def execute_parser_async(self, name: str, func: str, args: tuple, executor: Executor = None) -> Any:
+        # Coroutines of AsyncParser are awaited in running loop, sync parsers are executed by executor
+        try:
+            if future := self._submit(name, func, args):
+                return self._collect(await asyncio.wrap_future(future))
+            elif inspect.iscoroutinefunction(function := getattr(self.get_parser(name), func)):
+                return await function(*args)
+            else:
+                return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        except (ParserImplementationError, ScriptNotFound) as e:
+            raise e
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                with self.lock:
+                    self.pool = None
+            self._parser_failed(name)
+            raise e
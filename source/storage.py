@@ -55,6 +55,21 @@ class Cache(NamedTuple):
     path: str = 'cache'
     item_time: int = 1209600
     target_time: int = 604800  # How long save hashes of success & failed targets
+    snapshot: float = 300.  # Period of schedule snapshot (in seconds, 0 - only on stop)
+    restore: bool = True  # If True schedule snapshot will be restored on start
+    backend: str = 'sqlite'  # "sqlite" - hashes are known only to this monitor, "daemon" - shared by dedup daemon
+    daemon: str = '127.0.0.1:7701'  # Address of dedup daemon (host:port), run it by "python -m source.cache"
+    daemon_batch: int = 256  # Max requests sent to daemon at once
+    daemon_cache: int = 65536  # Max hashes confirmed by daemon which are cached locally
+    daemon_timeout: float = 2.
+    # If True only local hashes are checked while dedup daemon is unavailable (duplicates are possible), otherwise
+    # hashes are treated as claimed by other monitor (nothing is announced until daemon is back)
+    daemon_fail_open: bool = True
+    filter: bool = True  # If True hashes will be checked by counting Bloom filters before querying database
+    filter_size: int = 1048576  # Counters in each filter (1 byte each)
+    filter_hashes: int = 4  # Hash functions count of filters
+    wal: bool = False  # If True hashes are kept in cache/hash.db (WAL mode) instead of memory, reads don't block
+    wal_batch: int = 256  # Max writes committed in one transaction by writer of WAL mode
 
 
 class Analytics(NamedTuple):
@@ -62,35 +77,104 @@ class Analytics(NamedTuple):
     datetime: bool = True  # True - all output time will presented as , False - all output time as timestamps
     datetime_format: str = '%Y-%m-%d %H:%M:%S.%f'
     beautify: bool = False
+    forecast_window: float = 10.  # Width of time window for schedule forecast (in seconds)
+    forecast_count: int = 30  # Count of windows in schedule forecast
 
 
 class ThreadManager(NamedTuple):
     tick: float = 1.
     lock_ticks: int = 16  # How much ticks lock can be acquired, then it will released
+    autoscale: bool = False  # If True workers count will be changed (in min-max range) depending on load
+    scale_queue: float = 4.  # Pool is overloaded if queue has more tasks than this value per worker
+    scale_lateness: float = 1.  # Pool is overloaded if average dispatch lateness more than this value (in seconds)
+    scale_idle: float = .5  # Pool is underloaded if workers idle ratio more than this value
+    scale_up_ticks: int = 3  # How much ticks in a row pool must be overloaded to add workers
+    scale_down_ticks: int = 60  # How much ticks in a row pool must be underloaded to remove worker
+    watchdog: bool = True  # If True workers stuck on task longer than deadline will be replaced
+    deadline: float = 300.  # Max execution time of task if script doesn't set "deadline" (in seconds, 0 - unlimited)
+
+
+class Cluster(NamedTuple):
+    enabled: bool = False  # If True scripts will be sharded between monitors of cluster
+    name: str = ''  # Unique name of member (hostname:pid if empty, set it to keep shards stable between restarts)
+    coordinator: str = '127.0.0.1:7700'  # Address of coordinator (host:port)
+    serve: bool = False  # If True this monitor will run coordinator
+    replicas: int = 64  # Virtual nodes of each member on hash ring
+    heartbeat: float = 2.  # Period of heartbeats to coordinator (in seconds)
+    timeout: float = 10.  # Member will be removed from cluster if there are no heartbeats for this time (in seconds)
+    connect_timeout: float = 2.
 
 
 class Pipe(NamedTuple):
-    tick: float = .5  # Delta time for queue manage (in seconds)
+    tick: float = .5  # Max delta time for queue manage, also period of cache cleanup and parsers check (in seconds)
     wait: float = 10.  # Timeout to join() when turning off monitor (in seconds)
+    defer: float = .1  # Delay for tasks which were not sent because of full queue (in seconds)
+    shed_after: float = 5.  # How long queue must be full to start shedding of Interval tasks (in seconds)
 
 
 class Worker(NamedTuple):
     count: int = 5  # Max workers count in normal condition
-    tick: float = 1.  # Delta time for worker run loop
+    tick: float = 1.  # Delta time for worker run loop (max time to wait for task in blocking mode)
     wait: float = 5.
+    blocking: bool = True  # If True worker will wait for tasks and execute them continuously, otherwise one per tick
+    speed_window: float = 10.  # Period for speed measurement (in seconds)
+    min: int = 2  # Min workers count (autoscale)
+    max: int = 32  # Max workers count (autoscale)
+    assist: bool = False  # If True worker can execute tasks from other queue (catalogs for worker)
+    assist_weight: float = 0.  # Other queue urgency multiplier (0 - assist only if own queue is empty)
 
 
 class CatalogWorker(NamedTuple):
     count: int = 5
     tick: float = 1.
     wait: int = 7
+    blocking: bool = True
+    speed_window: float = 10.
+    min: int = 2
+    max: int = 32
+    assist: bool = True
+    assist_weight: float = 0.
+
+
+class Lane(NamedTuple):
+    enabled: bool = False  # If True Smart and Scheduled tasks will be sent to separate queue served by lane workers
+    count: int = 2  # Lane workers count (at least one if enabled)
+    tick: float = 1.  # Max time to wait for task (in seconds)
+    wait: float = 5.
+    queue_size: int = 128  # Size for lane_queue (tasks will be deferred if full)
+    borrow: bool = True  # If True idle lane workers will execute tasks from other queues
+    reserve: int = 1  # Lane workers count which never execute tasks from other queues
+    speed_window: float = 10.
+
+
+class AsyncEngine(NamedTuple):
+    enabled: bool = False  # If True tasks will be executed by asyncio engine instead of workers (AsyncParser support)
+    concurrency: int = 1024  # Max tasks in flight
+    threads: int = 8  # Thread pool size for sync parsers
+    tick: float = .05  # Max time to wait before checking queues for new tasks (in seconds)
+    wait: float = 10.
+    speed_window: float = 10.
+
+
+class ProcessPool(NamedTuple):
+    workers: int = 0  # Process pool size for scripts with "process: true" (0 - CPU count)
+
+
+class Retry(NamedTuple):
+    delay: float = 1.  # Delay before first retry of failed task (in seconds)
+    factor: float = 2.  # Delay multiplier for each next consecutive failure of script
+    max_delay: float = 300.  # Max delay before retry (in seconds)
+    jitter: float = .1  # Random part of delay (fraction of delay)
+    attempts: int = 5  # Max retries of target, then it will be moved to dead-letter list (catalogs retried always)
+    dead_letter_size: int = 256  # Max count of targets in dead-letter list
 
 
 class Queues(NamedTuple):
-    catalog_queue_size: int = 256  # Size for catalog_queue (will be waiting if full)
-    catalog_queue_put_wait: float = 8.
-    target_queue_size: int = 512  # Size for target_queue (will be waiting if full)
-    target_queue_put_wait: float = 8.
+    catalog_queue_size: int = 256  # Size for catalog_queue (tasks will be deferred if full)
+    catalog_queue_put_wait: float = 8.  # Deprecated (Pipe never waits)
+    target_queue_size: int = 512  # Size for target_queue (tasks will be deferred if full)
+    target_queue_put_wait: float = 8.  # Deprecated (Pipe never waits)
+    fair: bool = False  # If True tasks with equal priority will be shared between scripts (by script weight)
 
 
 class Logger(NamedTuple):
@@ -138,9 +222,14 @@ categories: tuple = (
     'cache',
     'analytics',
     'thread_manager',
+    'cluster',
     'pipe',
     'worker',
     'catalog_worker',
+    'lane',
+    'async_engine',
+    'process_pool',
+    'retry',
     'queues',
     'logger',
     'priority',
@@ -154,9 +243,14 @@ main: Main = Main()
 cache: Cache = Cache()
 analytics: Analytics = Analytics()
 thread_manager: ThreadManager = ThreadManager()
+cluster: Cluster = Cluster()
 pipe: Pipe = Pipe()
 worker: Worker = Worker()
 catalog_worker: CatalogWorker = CatalogWorker()
+lane: Lane = Lane()
+async_engine: AsyncEngine = AsyncEngine()
+process_pool: ProcessPool = ProcessPool()
+retry: Retry = Retry()
 queues: Queues = Queues()
 logger: Logger = Logger()
 priority: Priority = Priority()
@@ -1,5 +1,5 @@
 #!/usr/bin/python3.8
-from source import core
+if __name__ == '__main__':  # Spawned pool processes import this module too, they mustn't create monitor
+    from source import core
 
-if __name__ == '__main__':
     core.monitor.run()
@@ -0,0 +1,235 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Log:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, msg, parent=''):
+        self.messages.append(('info', msg.code))
+
+    def warn(self, msg, parent=''):
+        self.messages.append(('warn', msg.code))
+
+
+def test_filter_add_remove():
+    from source.cache import CountingBloomFilter
+
+    filter_ = CountingBloomFilter(1024, 4)
+    hashes = [bytes([i]) * 32 for i in range(50)]
+    for i in hashes:
+        filter_.add(i)
+
+    assert all(i in filter_ for i in hashes)
+    for i in hashes[:25]:
+        filter_.remove(i)
+    assert all(i in filter_ for i in hashes[25:])  # No false negatives after removal of other hashes
+    assert sum(i in filter_ for i in hashes[:25]) < 5
+    assert filter_.stats()['count'] == 25
+
+
+def test_filter_saturated_counters_are_kept():
+    from source.cache import CountingBloomFilter
+
+    filter_ = CountingBloomFilter(8, 2)
+    hash_ = bytes(32)
+    for _ in range(300):
+        filter_.add(hash_)
+    for _ in range(300):
+        filter_.remove(hash_)
+
+    assert hash_ in filter_  # Saturated counters are never decremented
+
+
+def test_daemon_execute():
+    from source.cache import DedupDaemon
+
+    daemon = DedupDaemon('127.0.0.1:0')
+    try:
+        assert daemon.execute('C', 't', b'a')
+        assert daemon.execute('A', 't', b'a')
+        assert not daemon.execute('A', 't', b'a')
+        assert daemon.execute('A', 'i', b'a')  # Kinds are separate
+        assert not daemon.execute('C', 't', b'a')
+        assert daemon.execute('D', 't', b'a') and daemon.execute('C', 't', b'a')
+        with pytest.raises(ValueError):
+            daemon.execute('X', 't', b'a')
+        with pytest.raises(KeyError):
+            daemon.execute('A', 'x', b'a')
+    finally:
+        daemon.server_close()
+
+
+def test_client_rejects_hash_added_by_other_client(monkeypatch):
+    from source import storage
+    from source.cache import DedupClient, DedupDaemon
+
+    daemon = DedupDaemon('127.0.0.1:0')
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(storage, 'cache', storage.cache._replace(daemon='%s:%d' % daemon.server_address))
+        first, second = DedupClient(), DedupClient()
+
+        assert first.add('t', [b'a', b'b']) == [True, True]
+        assert second.add('t', [b'a', b'c']) == [False, True]
+        assert second.check('t', [b'b', b'd']) == [False, True]
+        first.delete('t', [b'a'])
+        assert DedupClient().check('t', [b'a']) == [True]  # Second client keeps confirmed hash in its cache
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
+
+
+def test_client_without_daemon(monkeypatch):
+    from source import storage
+    from source.cache import DedupClient
+
+    with socket.socket() as s:  # Free port without listener
+        s.bind(('127.0.0.1', 0))
+        address = '%s:%d' % s.getsockname()
+
+    for fail_open in (True, False):
+        monkeypatch.setattr(storage, 'cache', storage.cache._replace(daemon=address, daemon_fail_open=fail_open))
+        client = DedupClient()
+        client.log = Log()
+
+        assert client.add('t', [b'a']) == [fail_open]
+        assert client.check('t', [b'a']) == [fail_open]
+        client.failed = 0.  # Retry connection without waiting for daemon_timeout
+        assert client.add('t', [b'b']) == [fail_open]
+        assert client.log.messages == [('warn', 31901)]  # Outage is logged once
+
+
+def test_client_logs_daemon_restore(monkeypatch):
+    from source import storage
+    from source.cache import DedupClient, DedupDaemon
+
+    daemon = DedupDaemon('127.0.0.1:0')
+    address = '%s:%d' % daemon.server_address
+    monkeypatch.setattr(storage, 'cache', storage.cache._replace(daemon=address, daemon_fail_open=False))
+    daemon.server_close()  # Port is known but nothing listens on it
+
+    client = DedupClient()
+    client.log = Log()
+    assert client.add('a', [b'a']) == [False]
+
+    daemon = DedupDaemon(address)
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    try:
+        client.failed = 0.
+        assert client.add('a', [b'a']) == [True]
+        assert client.add('a', [b'a']) == [False]
+        assert client.log.messages == [('warn', 31901), ('info', 21901)]
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
+
+
+def test_writer_rolls_back_only_failed_write(tmp_path):
+    from source.cache import HashWriter
+
+    writer = HashWriter(str(tmp_path / 'hash.db'))
+    writer.execute(lambda c: c.execute('CREATE TABLE T (v INTEGER PRIMARY KEY)'))
+
+    def failed(c):
+        c.execute('INSERT INTO T VALUES (2)')
+        c.execute('INSERT INTO T VALUES (1)')
+
+    writer.execute(lambda c: c.execute('INSERT INTO T VALUES (1)'))
+    with pytest.raises(Exception):
+        writer.execute(failed)
+    writer.execute(lambda c: c.execute('INSERT INTO T VALUES (3)'))
+
+    assert writer.execute(lambda c: c.execute('SELECT v FROM T').fetchall()) == [(1,), (3,)]
+    writer.stop()
+
+
+def test_writer_rejects_writes_after_stop(tmp_path):
+    import sqlite3
+
+    from source.cache import HashWriter
+
+    writer = HashWriter(str(tmp_path / 'hash.db'))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(writer.execute(lambda c: 1)))
+        for _ in range(20)
+    ]
+    for i in threads:
+        i.start()
+    writer.stop()
+    for i in threads:
+        i.join(5)  # Writes queued before stop are executed, later ones fail, none hangs
+
+    assert not any(i.is_alive() for i in threads)
+    assert results == [1] * len(results)
+    with pytest.raises(sqlite3.ProgrammingError):
+        writer.execute(lambda c: 1)
+    writer.stop()  # Second stop does nothing
+
+
+def test_wal_storage_cleanup(tmp_path, monkeypatch):
+    from source import storage
+    from source.cache import HashStorage, UniquenessError
+
+    monkeypatch.setattr(storage, 'cache', storage.cache._replace(
+        path=str(tmp_path), wal=True, filter=True, filter_size=4096, backend='sqlite'
+    ))
+    try:
+        assert not HashStorage.load()
+        HashStorage.add_target(b'new' * 8)
+        with pytest.raises(UniquenessError):
+            HashStorage.add_target(b'new' * 8)
+        HashStorage._write(lambda c: c.execute('INSERT INTO Targets VALUES (?, ?)', (b'old' * 8, 0.)))
+        HashStorage._added('Targets', b'old' * 8)
+        assert not HashStorage.check_target(b'old' * 8)
+
+        HashStorage.cleanup()
+        assert HashStorage.check_target(b'old' * 8)
+        assert not HashStorage.check_target(b'new' * 8)
+        assert b'old' * 8 not in HashStorage._filters['Targets']
+
+        HashStorage.unload()
+        assert HashStorage.load()  # Hashes are kept in cache/hash.db
+        assert not HashStorage.check_target(b'new' * 8)
+    finally:
+        HashStorage.unload()
+        HashStorage._filters = {}
+
+
+@pytest.mark.parametrize('wal', (False, True))
+def test_storage_filter_survives_rollback(tmp_path, monkeypatch, wal):
+    import sqlite3
+
+    from source import storage
+    from source.cache import HashStorage
+
+    monkeypatch.setattr(storage, 'cache', storage.cache._replace(
+        path=str(tmp_path), wal=wal, filter=True, filter_size=4096, backend='sqlite'
+    ))
+    try:
+        HashStorage.load()
+
+        def prepare(c):
+            c.execute('INSERT INTO Targets VALUES (?, ?)', (b'old' * 8, 0.))
+            c.execute('INSERT INTO Items (hash, time) VALUES (?, ?)', (b'item' * 8, 0.))
+            c.execute("CREATE TRIGGER Fail BEFORE DELETE ON Items BEGIN SELECT RAISE(ABORT, 'fail'); END")
+
+        HashStorage._write(prepare)
+        HashStorage._rebuild()
+
+        with pytest.raises(sqlite3.IntegrityError):
+            HashStorage.cleanup()  # Targets are deleted before Items, whole cleanup is rolled back
+        assert not HashStorage.check_target(b'old' * 8)  # Filter isn't changed by rolled back delete
+        assert not HashStorage.check_item(b'item' * 8)
+    finally:
+        HashStorage._clear()
+        HashStorage.unload()
+        HashStorage._filters = {}
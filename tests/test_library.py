@@ -0,0 +1,192 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_schedule_pops_due_in_time_order():
+    from source.library import Schedule
+
+    schedule = Schedule()
+    for i in (30., 10., 20., 40.):
+        schedule[i] = f'at-{i:.0f}'
+
+    assert schedule.next_time() == 10.
+    assert schedule.pop_due(5.) == []
+    assert schedule.pop_due(30.) == [(10., 'at-10'), (20., 'at-20'), (30., 'at-30')]
+    assert list(schedule.values()) == ['at-40']
+    assert schedule.next_time() == 40.
+
+
+def test_schedule_rounds_time_to_7_digits():
+    from source.library import Schedule
+
+    schedule = Schedule()
+    key = schedule.insert(1.000000049, 'a')
+
+    assert key[0] == 1.
+    assert schedule[key] == 'a'
+    assert schedule.pop_due(1.) == [(1., 'a')]
+
+
+def test_schedule_drops_deleted_entries_lazily():
+    from source.library import Schedule
+
+    schedule = Schedule()
+    keys = [schedule.insert(float(i), i) for i in range(200)]
+    for i in keys[:100]:
+        schedule.pop(i)
+
+    assert len(schedule) == 100
+    assert len(schedule._heap) == 200  # Deleted keys are left in heap until it's too big
+    assert schedule.next_time() == 100.
+
+    for i in keys[100:150]:
+        del schedule[i]
+    assert len(schedule._heap) <= 2 * len(schedule) + 64  # Compacted
+    assert [i[1] for i in schedule.pop_due(1000.)] == list(range(150, 200))
+    assert schedule.next_time() is None
+
+
+def test_schedule_slices():
+    from source.library import Schedule
+
+    schedule = Schedule()
+    for i in (1., 2., 3.):
+        schedule[i] = i
+
+    assert list(schedule[:2.]) == [(1., 1.), (2., 2.)]
+    assert schedule.pop_first(slice(None, 3.)) == (1., 1.)
+    assert schedule.pop_time(slice(None, 2.)) == [(2., 2.)]
+    del schedule[:3.]
+    assert not schedule
+
+
+def test_unique_schedule_rejects_same_target():
+    import pytest
+    from source import api
+    from source.library import UniqueSchedule
+
+    schedule = UniqueSchedule()
+    schedule[10.] = api.TInterval('target', 'script', 'data', 5)
+
+    assert not schedule.unique(api.TInterval('target', 'script', 'data', 60))  # Interval isn't part of hash
+    with pytest.raises(IndexError):
+        schedule[20.] = api.TInterval('target', 'script', 'data', 5)
+    assert schedule.unique(api.TInterval('target', 'script', 'other', 5))
+
+
+def test_unique_schedule_index_follows_removal():
+    from source import api
+    from source.library import UniqueSchedule
+
+    schedule = UniqueSchedule()
+    targets = [api.TInterval(f'target-{i}', 'a' if i % 2 else 'b', 'data', 5) for i in range(6)]
+    for i, target in enumerate(targets):
+        schedule[float(i)] = target
+
+    assert schedule.discard(targets[0]) is targets[0]
+    assert schedule.discard(targets[0]) is None
+    assert sorted(schedule.pop_script('a'), key=lambda i: i.name) == targets[1::2]
+    assert schedule.pop_script('a') == []
+    assert [i[1] for i in schedule.pop_due(10.)] == targets[2::2]
+    assert schedule.unique(targets[2]) and schedule._index == {} and schedule._scripts == {}
+
+
+def test_schedule_keeps_entries_of_same_time():
+    from source.library import Schedule
+
+    schedule = Schedule()
+    keys = [schedule.insert(5., i) for i in range(3)]
+    schedule.insert(5.00000001, 'rounded')  # Same time after rounding, so it's after the others
+
+    assert [i[0] for i in keys] == [5., 5., 5.] and len(set(keys)) == 3
+    schedule.pop(keys[1])
+    assert schedule.pop_due(5.) == [(5., 0), (5., 2), (5., 'rounded')]  # Ties are broken by insertion order
+
+
+def test_queue_cancels_tasks_of_script():
+    from source import api
+    from source.library import CancellableQueue, PrioritizedItem
+
+    queue_ = CancellableQueue()
+    for i in range(4):
+        queue_.put_nowait(PrioritizedItem(i, api.TInterval(f'a-{i}', 'a', 'data', 5)))
+        queue_.put_nowait(PrioritizedItem(i, api.TInterval(f'b-{i}', 'b', 'data', 5)))
+
+    assert queue_.cancel('a', lambda i: i.name == 'a-0') == 1
+    assert queue_.cancel('a') == 3
+    assert queue_.cancel('a') == 0
+    assert queue_.qsize() == 4 and queue_.unfinished_tasks == 4
+    assert len(queue_.queue) == 8  # Cancelled tasks are left as tombstones
+    assert [queue_.get_nowait().content.name for _ in range(4)] == [f'b-{i}' for i in range(4)]
+    assert queue_.empty() and queue_._scripts == {}
+
+
+def test_queue_drops_tombstones():
+    from source import api
+    from source.library import CancellableQueue, PrioritizedItem
+
+    queue_ = CancellableQueue()
+    for i in range(100):
+        queue_.put_nowait(PrioritizedItem(0, api.TInterval(f'a-{i}', 'a', 'data', 5)))
+    queue_.put_nowait(PrioritizedItem(0, api.TInterval('b', 'b', 'data', 5)))
+
+    queue_.cancel('a')
+    assert len(queue_.queue) == 1
+    assert queue_.get_nowait().content.name == 'b'
+
+
+def test_queue_head_and_pop_last():
+    from source import api
+    from source.library import CancellableQueue, PrioritizedItem
+
+    queue_ = CancellableQueue()
+    items = [PrioritizedItem(p, api.TInterval(f'{p}-{i}', 's', 'data', 5)) for p, i in ((1, 0), (3, 0), (3, 1), (2, 0))]
+    for i in items:
+        queue_.put_nowait(i)
+
+    assert queue_.pop_last(lambda i: i.name.endswith('-0')) is items[1]  # Lowest priority, newest among equal
+    assert queue_.pop_last(lambda i: True) is items[2]
+    assert queue_.pop_last(lambda i: i.name == 'missing') is None
+    queue_.cancel('s', lambda i: i.name == '1-0')
+    assert queue_.head()[0] == 2  # Tombstone at the top is skipped
+    assert queue_.items() == [items[3]] and queue_.qsize() == 1
+
+
+def test_queue_fair_mode_shares_by_weight(monkeypatch):
+    from source import api, storage
+    from source.library import CancellableQueue, PrioritizedItem
+
+    monkeypatch.setattr(storage, 'queues', storage.queues._replace(fair=True))
+    queue_ = CancellableQueue()
+    for i in range(6):
+        queue_.put_nowait(PrioritizedItem(100, api.TInterval(f'big-{i}', 'big', 'data', 5), 2., 100))
+    for i in range(3):  # Reuse puts priority of small script after big one, but group is the same
+        queue_.put_nowait(PrioritizedItem(105, api.TInterval(f'small-{i}', 'small', 'data', 5), 1., 100))
+    queue_.put_nowait(PrioritizedItem(50, api.TInterval('urgent', 'small', 'data', 5), 1., 50))
+
+    order = [queue_.get_nowait().content.script for _ in range(10)]
+    assert order[0] == 'small'  # Group of higher priority class goes first
+    assert order[1:] == ['big', 'small', 'big', 'big', 'small', 'big', 'big', 'small', 'big']  # Weights 2:1
+
+    monkeypatch.setattr(storage, 'queues', storage.queues._replace(fair=False))
+    queue_ = CancellableQueue()
+    for i in ((100, 'big'), (105, 'small'), (100, 'big')):
+        queue_.put_nowait(PrioritizedItem(i[0], api.TInterval(str(i), i[1], 'data', 5), 1., 100))
+    assert [queue_.get_nowait().content.script for _ in range(3)] == ['big', 'big', 'small']
+
+
+def test_target_hashes_are_kept_for_stored_entries():
+    import hashlib
+    from source import api
+
+    data = {'url': 'https://x/1', 'sku': [1, 2]}
+    target = api.TInterval('name', 'script', data, 5)
+    restock = api.RTInterval('script', (1, 2), 5)
+
+    # Same formula as before hashes were cached, otherwise targets stored by HashStorage would be new after upgrade
+    assert target.hash() == hashlib.blake2s(b'name' + str(data).encode() + b'script').digest()
+    assert restock.hash() == hashlib.blake2s(b'script' + b'(1, 2)' + str(restock.item).encode()).digest()
+    assert api.TInterval('name', 'script', [1, 2], 5).hash() != api.TInterval('name', 'script', (1, 2), 5).hash()
+    assert api.TInterval('name', 'script', b'data', 5).hash() == api.TInterval('name', 'script', 'data', 5).hash()
@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PARSER = '''
+from source import api
+
+
+class Parser(api.Parser):
+    def execute(self, mode, content):
+        proxy = self.provider._proxy()
+        proxy.bad += 1
+        proxy.stats = .5
+        if content == 'fail':
+            raise ValueError('Bad response')
+        return [proxy.address, self.kw.abs]
+'''
+
+
+def test_execute_returns_proxy_usage(tmp_path, monkeypatch):
+    from source import process
+    from source.library import ProviderCore, Proxy
+
+    (tmp_path / 'pooled_parser.py').write_text(PARSER)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(ProviderCore, '_proxies', {'1.1.1.1:80': Proxy('1.1.1.1:80', bad=1)})
+    keywords = {'absolute': ['shoe'], 'positive': [], 'negative': []}
+
+    proxies = ProviderCore.proxy_snapshot()
+    monkeypatch.setattr(ProviderCore, '_proxies', {})  # Pool process has no proxies of its own
+    result, usage, error = process.execute(
+        'pooled', 'pooled_parser', 'h', True, 'execute', (1, 'ok'), proxies, keywords
+    )
+    assert (result, usage, error) == (['1.1.1.1:80', ['shoe']], {'1.1.1.1:80': (1, [.5])}, None)
+
+    result, usage, error = process.execute('pooled', 'pooled_parser', 'h', True, 'execute', (1, 'fail'), proxies, None)
+    assert isinstance(error, ValueError) and usage == {'1.1.1.1:80': (1, [.5])}  # Usage is kept for failed parser
+
+    monkeypatch.setattr(ProviderCore, '_proxies', {'1.1.1.1:80': Proxy('1.1.1.1:80', bad=1)})
+    ProviderCore.proxy_merge(usage)
+    assert ProviderCore._proxies['1.1.1.1:80'].bad == 2 and ProviderCore._proxies['1.1.1.1:80'].stats == [.5]
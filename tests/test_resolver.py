@@ -0,0 +1,281 @@
+import importlib
+import os
+import sys
+
+import pytest
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def core(tmp_path_factory):
+    # Core creates its files at import and needs key of monitor, so it's imported inside of temporary directory
+    path = tmp_path_factory.mktemp('monitor')
+    (path / 'storage' / 'main').mkdir(parents=True)
+    (path / 'storage' / 'main' / 'monitor.pem').write_bytes(RSA.generate(2048).export_key())
+    (path / 'storage' / 'main' / 'authority.yaml').write_text('aliases: {}\ntrusted: []\n')
+
+    mp = pytest.MonkeyPatch()
+    mp.chdir(path)
+    yield importlib.import_module('source.core')
+    mp.undo()
+
+
+def test_release_with_restock(core, monkeypatch):
+    from source import api
+
+    sent = []
+    monkeypatch.setattr(core.script_manager.event_handler, 'item', sent.append)
+    restock = api.RTInterval('test', 'data', 60)
+    release = api.IRelease('https://example.com/1', 'test', 'Item', restock=restock)
+
+    assert core.Resolver._result(1, api.TInterval('target', 'test', 'data', 10), [release]) == (5, 'test')
+    assert sent == [release]
+    assert restock.item > 0  # Id of release in HashStorage
+
+
+def test_rebase_expired_smart(core):
+    import time
+    from source import api
+    from source.tools import ExponentialSmart
+
+    drop = time.time() + 600.
+    target = api.TSmart('target', 'test', 'data', ExponentialSmart(drop, 3))
+    target.expired = True  # Final slot is already scheduled
+
+    assert core.Resolver.rebase(target, drop, 30.) == drop
+    catalog = api.CSmart('test', ExponentialSmart(drop, 3))
+    catalog.expired = True
+    assert core.Resolver.rebase(catalog, drop, 30.) == drop
+
+    target.gen.time = time.time() - 1.  # Drop has passed
+    assert core.Resolver.rebase(target, target.gen.time, 30.) is None
+
+
+def test_held_until_limits_free(core, monkeypatch):
+    import time
+    from source import api
+
+    config = {'max-in-flight': 1, 'rate': 0., 'burst': 0, 'weight': 1.}
+    monkeypatch.setitem(core.script_manager.scripts, 'limited', config)
+    pipe = core.Pipe()
+    due = time.time() - 5.
+    targets = [api.TInterval(f'target-{i}', 'limited', 'data', 10) for i in range(3)]
+    for i in targets:
+        pipe.dispatch(1, due, i)
+
+    assert [i[1] for i in core.Resolver.held['limited']] == targets[1:]
+    assert core.Resolver.releasable() == []  # Waits for slot, not for time
+
+    core.Resolver.target_queue.get_nowait()
+    core.Resolver.limiter.release('limited')
+    assert core.Resolver.releasable() == ['limited']
+    assert core.Resolver.unhold('limited') == (due, targets[1])  # Due time is kept for lateness
+    assert core.Resolver.unhold('limited') is None  # Slot is taken by the second target again
+
+    core.Resolver.remove_targets('limited')
+    assert 'limited' not in core.Resolver.held
+
+
+def test_idle_counts_running_task(core):
+    import time
+    from types import SimpleNamespace
+
+    manager = core.ThreadManager()
+    worker = SimpleNamespace(name='W-0', busy=0., task_start=time.time() - 10.)  # Stuck in long task
+
+    assert manager._idle({0: worker}, 10.) < .01
+    worker.busy, worker.task_start = 12., 0.  # Task ended, only the rest of it is counted
+    assert manager._idle({0: worker}, 10.) > .7
+
+
+def test_rebalance_keeps_unloaded_and_pinned(core, monkeypatch):
+    from source import cluster
+
+    coordinator = cluster.Coordinator('127.0.0.1:0')
+    coordinator.request('a', pinned=['fixed'])
+    assert coordinator.request('b', pinned=['fixed'])['pinned'] == {'fixed': 'a'}  # First claim wins
+    assert coordinator.request('a', leave=True)['pinned'] == {}
+    coordinator.server_close()
+
+    manager = core.script_manager
+    monkeypatch.setattr(manager.index, 'index', [{'name': 'kept'}, {'name': 'off'}, {'name': 'moved'}])
+    monkeypatch.setattr(manager, 'owned', {'kept', 'off', 'moved'})
+    monkeypatch.setattr(manager, 'scripts', {'kept': {}, 'moved': {}})  # 'off' was unloaded manually
+    monkeypatch.setattr(cluster.member, 'owns', lambda script: script != 'moved')
+    monkeypatch.setattr(manager, '_unload', lambda name: manager.scripts.pop(name) is not None)
+    monkeypatch.setattr(manager, '_load', lambda name: pytest.fail(f'{name} loaded'))
+
+    assert manager.rebalance() == ['moved']
+    assert manager.owned == {'kept', 'off'}
+
+
+def test_member_owns_nothing_until_coordinator_answers(core, monkeypatch):
+    import socket
+    from source import analytics, cluster, storage
+
+    with socket.socket() as s:  # Free port, coordinator isn't started yet
+        s.bind(('127.0.0.1', 0))
+        address = '%s:%d' % s.getsockname()
+    monkeypatch.setattr(storage, 'cluster', storage.cluster._replace(
+        enabled=True, name='a', coordinator=address, serve=False, connect_timeout=.5
+    ))
+    member = cluster.Member()
+    monkeypatch.setattr(cluster, 'member', member)
+    names = [f'script-{i}' for i in range(20)]
+    monkeypatch.setattr(core.script_manager.index, 'index', [{'name': i} for i in names])
+
+    member.join()
+    assert not any(member.owns(i) for i in names)  # Restarted member doesn't run scripts of whole cluster
+    assert analytics.Analytics.info_cluster()['owned'] == []
+
+    coordinator = cluster.Coordinator(address)
+    coordinator.start()
+    try:
+        coordinator.request('b')
+        assert member.heartbeat() and member.members == ('a', 'b')
+        mine = next(i for i in names if member.ring.owner(i) == 'b')
+        other = next(i for i in names if member.ring.owner(i) == 'a')
+        coordinator.request('b', pinned=[other])
+        assert member.heartbeat([mine])  # Pinned scripts stay on members which loaded them, whatever ring says
+
+        owned = analytics.Analytics.info_cluster()['owned']
+        assert mine in owned and other not in owned
+        assert owned == [i for i in names if i == mine or (i != other and member.ring.owner(i) == 'a')]
+    finally:
+        coordinator.stop()
+
+
+def test_remove_catalog_while_waiting(core, monkeypatch):
+    import threading
+    import time
+    from source import api
+    from source.library import PrioritizedItem
+
+    resolver = core.Resolver
+    catalog = api.CInterval('locked', 60.)
+    resolver.limiter.acquire('locked')
+    resolver.catalog_queue.put_nowait(PrioritizedItem(0, catalog))
+    resolver.hold(time.time(), api.TInterval('target', 'locked', 'data', 10), None)  # Release wakes pipe
+
+    in_lock, waiting = threading.Event(), threading.Event()
+    pop_script = resolver.catalogs.pop_script
+
+    def paused(script):  # Keep catalog lock until wait() holds its condition
+        in_lock.set()
+        waiting.wait(5.)
+        return pop_script(script)
+
+    monkeypatch.setattr(resolver.catalogs, 'pop_script', paused)
+    remover = threading.Thread(target=resolver.remove_catalog, args=('locked',), daemon=True)
+    waiter = threading.Thread(target=resolver.wait, args=(5.,), daemon=True)
+    remover.start()
+    assert in_lock.wait(5.)
+    waiter.start()
+    time.sleep(.2)  # Waiter takes condition and blocks on catalog lock
+    waiting.set()
+
+    remover.join(5.)
+    waiter.join(5.)
+    assert not remover.is_alive() and not waiter.is_alive()
+    resolver.remove_targets('locked')
+
+
+def test_script_deadline_zero_is_unlimited(core, monkeypatch):
+    from source import api, storage
+
+    target = api.TInterval('target', 'timed', 'data', 10)
+    monkeypatch.setitem(core.script_manager.scripts, 'timed', {'deadline': None})
+    assert core.Resolver.deadline(target) == storage.thread_manager.deadline
+    monkeypatch.setitem(core.script_manager.scripts, 'timed', {'deadline': 0.})
+    assert core.Resolver.deadline(target) == 0.
+
+
+def test_engine_replaces_hung_pool(core, monkeypatch):
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from source import api
+
+    release = threading.Event()
+
+    async def process_async(mode, task, executor):  # Sync parser which outlives its deadline
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(executor, release.wait, 5.), .05)
+        except asyncio.TimeoutError:
+            return 6, task.script
+
+    monkeypatch.setattr(core.resolver, 'process_async', process_async)
+    engine = core.AsyncEngine()
+    engine.executor = hung = ThreadPoolExecutor(1, 'AE')
+    asyncio.run(engine.process(1, api.TInterval('target', 'slow', 'data', 10)))
+
+    assert list(engine.hung.values()) == [hung]
+    engine.check_executor()
+    assert engine.executor is not hung and engine.replaced == 1
+    assert engine.executor.submit(lambda: True).result(1.)  # New pool isn't blocked by hung thread
+
+    release.set()
+    hung.shutdown()  # Waits for parser to return
+    engine.executor.shutdown()
+    engine.check_executor()
+    assert engine.hung == {} and engine.replaced == 1
+
+
+def test_smart_targets_with_same_time_are_kept(core):
+    import time
+    from source import api
+    from source.tools import ExponentialSmart
+
+    drop = time.time() + 600.
+    targets = [api.TSmart(f'target-{i}', 'smart', 'data', ExponentialSmart(drop, 3)) for i in range(3)]
+    for i in targets:
+        core.Resolver.insert_target(i)
+
+    assert len([i for i in core.Resolver.targets.values() if i.script == 'smart']) == 3
+    assert len(core.Resolver.targets.pop_script('smart')) == 3
+
+
+def test_retry_backoff_is_limited(core, monkeypatch):
+    from source import api, storage
+
+    monkeypatch.setattr(storage, 'retry', storage.retry._replace(delay=1., factor=2., max_delay=5., jitter=0.))
+    resolver = core.Resolver
+
+    assert [resolver.backoff('failing') for _ in range(5)] == [1., 2., 4., 5., 5.]
+    resolver.succeed(api.CInterval('failing', 60.))
+    assert resolver.backoff('failing') == 1.
+    resolver.remove_catalog('failing')
+    assert 'failing' not in resolver.failures
+
+
+def test_retry_moves_target_to_dead_letter(core, monkeypatch):
+    from source import api, storage
+
+    monkeypatch.setattr(storage, 'retry', storage.retry._replace(attempts=2, jitter=0.))
+    resolver = core.Resolver
+    resolver.clear_dead_letters()
+    target = api.TInterval('target', 'retried', 'data', 10)
+
+    for _ in range(2):
+        resolver.retry(target, 'Parser failed')
+        assert resolver.targets.pop_script('retried') == [target]
+    resolver.retry(target, 'Parser failed')
+    assert resolver.targets.pop_script('retried') == []
+    assert [i[1:] for i in resolver.dead_letter] == [(target, 'Parser failed')]
+    assert 'retried' not in resolver.attempts or target.hash() not in resolver.attempts['retried']
+
+    assert resolver.revive(0) == 1 and not resolver.dead_letter
+    assert resolver.targets.pop_script('retried') == [target]
+
+    catalog = api.CInterval('retried', 60.)
+    for _ in range(3):  # Catalogs are never moved to dead-letter list
+        resolver.retry(catalog, 'Parser failed')
+        assert resolver.catalogs.pop_script('retried') == [catalog]
+    resolver.retry(target, 'Parser failed')
+    resolver.retry(target, 'Parser failed')
+    resolver.retry(target, 'Parser failed')
+    assert resolver.clear_dead_letters() == 1 and not resolver.dead_letter
+    resolver.remove_targets('retried')
+    resolver.remove_catalog('retried')